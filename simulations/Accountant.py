@@ -1,8 +1,6 @@
+from lazy_pyplot import load_pyplot
+from LogHistogram import LogHistogram
 from datetime import datetime, timedelta
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 import math
@@ -10,6 +8,95 @@ import os
 
 ##################################################
 
+## Columns of the snapshot store: the raw counters at each snapshot, rates are derived from them when saving
+SNAPSHOT_COLUMNS = [
+                        ("time", "f8"),
+                        ("totalOccupancy", "i8"),
+                        ("totalPacketsProcessed", "i8"),
+                        ("totalSEQPacketsProcessed", "i8"),
+                        ("totalACKPacketsProcessed", "i8"),
+                        ("totalPacketsDropped", "i8"),
+                        ("totalSEQPacketsDropped", "i8"),
+                        ("totalACKPacketsDropped", "i8"),
+                        ("totalInsertAttempts", "i8"),
+                        ("totalInsertSuccesses", "i8"),
+                        ("totalInsertFailures", "i8"),
+                        ("totalRecirculations", "i8"),
+                        ("totalEvictions", "i8"),
+                        ("totalUpdateAttempts", "i8"),
+                        ("totalUpdateSuccesses", "i8"),
+                        ("totalUpdateFailures", "i8"),
+                        ("intervalOccupancy", "i8"),
+                        ("intervalPacketsProcessed", "i8"),
+                        ("intervalPacketsDropped", "i8"),
+                        ("intervalInsertAttempts", "i8"),
+                        ("intervalInsertSuccesses", "i8"),
+                        ("intervalInsertFailures", "i8"),
+                        ("intervalRecirculations", "i8"),
+                        ("intervalEvictions", "i8"),
+                        ("intervalUpdateAttempts", "i8"),
+                        ("intervalUpdateSuccesses", "i8"),
+                        ("intervalUpdateFailures", "i8"),
+                    ]
+SNAPSHOT_INITIAL_ROWS = 1024
+
+## Single-file export of all snapshot series and distributions of a table (snapshot_format "npz")
+SNAPSHOT_NPZ_FILE = "snapshots.npz"
+
+## Snapshot data files: (data dir, file name, snapshot series)
+SNAPSHOT_FILES = [
+                    ## Cumulative rates
+                    ("cumulative_data", "cumulative_rate_occupancy", "totalOccupancyRate"),
+                    ("cumulative_data", "cumulative_rate_packets_processed", "totalPacketsProcessedRate"),
+                    ("cumulative_data", "cumulative_rate_packets_dropped", "totalPacketsDroppedRate"),
+                    ("cumulative_data", "cumulative_rate_insert_attempts", "totalInsertAttemptRate"),
+                    ("cumulative_data", "cumulative_rate_insert_successes", "totalInsertSuccessRate"),
+                    ("cumulative_data", "cumulative_rate_insert_failures", "totalInsertFailureRate"),
+                    ("cumulative_data", "cumulative_rate_recirculations", "totalRecirculationRate"),
+                    ("cumulative_data", "cumulative_rate_evictions", "totalEvictionRate"),
+                    ("cumulative_data", "cumulative_rate_update_attempts", "totalUpdateAttemptRate"),
+                    ("cumulative_data", "cumulative_rate_update_successes", "totalUpdateSuccessRate"),
+                    ("cumulative_data", "cumulative_rate_update_failures", "totalUpdateFailureRate"),
+                    ## Discrete rates
+                    ("discrete_data", "discrete_rate_occupancy", "intervalOccupancyRate"),
+                    ("discrete_data", "discrete_rate_packets_processed", "intervalPacketsProcessedRate"),
+                    ("discrete_data", "discrete_rate_packets_dropped", "intervalPacketsDroppedRate"),
+                    ("discrete_data", "discrete_rate_insert_attempts", "intervalInsertAttemptRate"),
+                    ("discrete_data", "discrete_rate_insert_successes", "intervalInsertSuccessRate"),
+                    ("discrete_data", "discrete_rate_insert_failures", "intervalInsertFailureRate"),
+                    ("discrete_data", "discrete_rate_recirculations", "intervalRecirculationRate"),
+                    ("discrete_data", "discrete_rate_evictions", "intervalEvictionRate"),
+                    ("discrete_data", "discrete_rate_update_attempts", "intervalUpdateAttemptRate"),
+                    ("discrete_data", "discrete_rate_update_successes", "intervalUpdateSuccessRate"),
+                    ("discrete_data", "discrete_rate_update_failures", "intervalUpdateFailureRate"),
+                    ## Cumulative counts
+                    ("cumulative_data", "cumulative_count_occupancy", "totalOccupancyCount"),
+                    ("cumulative_data", "cumulative_count_packets_processed", "totalPacketsProcessedCount"),
+                    ("cumulative_data", "cumulative_count_packets_dropped", "totalPacketsDroppedCount"),
+                    ("cumulative_data", "cumulative_count_insert_attempts", "totalInsertAttemptCount"),
+                    ("cumulative_data", "cumulative_count_insert_successes", "totalInsertSuccessCount"),
+                    ("cumulative_data", "cumulative_count_insert_failures", "totalInsertFailureCount"),
+                    ("cumulative_data", "cumulative_count_recirculations", "totalRecirculationCount"),
+                    ("cumulative_data", "cumulative_count_evictions", "totalEvictionCount"),
+                    ("cumulative_data", "cumulative_count_update_attempts", "totalUpdateAttemptCount"),
+                    ("cumulative_data", "cumulative_count_update_successes", "totalUpdateSuccessCount"),
+                    ("cumulative_data", "cumulative_count_update_failures", "totalUpdateFailureCount"),
+                    ## Discrete counts
+                    ("discrete_data", "discrete_count_occupancy", "intervalOccupancyCount"),
+                    ("discrete_data", "discrete_count_packets_processed", "intervalPacketsProcessedCount"),
+                    ("discrete_data", "discrete_count_packets_dropped", "intervalPacketsDroppedCount"),
+                    ("discrete_data", "discrete_count_insert_attempts", "intervalInsertAttemptCount"),
+                    ("discrete_data", "discrete_count_insert_successes", "intervalInsertSuccessCount"),
+                    ("discrete_data", "discrete_count_insert_failures", "intervalInsertFailureCount"),
+                    ("discrete_data", "discrete_count_recirculations", "intervalRecirculationCount"),
+                    ("discrete_data", "discrete_count_evictions", "intervalEvictionCount"),
+                    ("discrete_data", "discrete_count_update_attempts", "intervalUpdateAttemptCount"),
+                    ("discrete_data", "discrete_count_update_successes", "intervalUpdateSuccessCount"),
+                    ("discrete_data", "discrete_count_update_failures", "intervalUpdateFailureCount"),
+                ]
+
+##################################################
+
 class Accountant():
 
     def __init__(self, tab_type, tab_params, test=True):
@@ -72,65 +159,34 @@ class Accountant():
             os.makedirs(self._resultsPath)
         ## Timing
         self._logInterval       = tab_params["log_interval"] # in ms
+        ## Export format of saved snapshots (text/npz)
+        self._snapshotFormat    = tab_params.get("snapshot_format", "text")
+        if self._snapshotFormat not in ["text", "npz"]:
+            self._custom_print("Round {}/{}: Invalid option for snapshot format, reset to text".format(self._round_number, self._max_round_number))
+            self._snapshotFormat = "text"
+        ## Eviction/reinsertion durations: every sample (samples) or a fixed-size log-bucketed histogram (histogram)
+        self._distributionMode  = tab_params.get("distribution_mode", "samples")
+        if self._distributionMode not in ["samples", "histogram"]:
+            self._custom_print("Round {}/{}: Invalid option for distribution mode, reset to samples".format(self._round_number, self._max_round_number))
+            self._distributionMode = "samples"
         self._firstEntryTime    = None
         self._latestEntryRound  = 0
-        self._snapshotTime      = []
-        ## Total Rates
-        self._snapshots_totalOccupancyRate        = []
-        self._snapshots_totalPacketsProcessedRate = []
-        self._snapshots_totalPacketsDroppedRate   = []
-        self._snapshots_totalInsertAttemptRate    = []
-        self._snapshots_totalInsertSuccessRate    = []
-        self._snapshots_totalInsertFailureRate    = []
-        self._snapshots_totalRecirculationRate    = []
-        self._snapshots_totalEvictionRate         = []
-        self._snapshots_totalUpdateAttemptRate    = []
-        self._snapshots_totalUpdateSuccessRate    = []
-        self._snapshots_totalUpdateFailureRate    = []
-        ## Interval Rates
-        self._snapshots_intervalOccupancyRate        = []
-        self._snapshots_intervalPacketsProcessedRate = []
-        self._snapshots_intervalPacketsDroppedRate   = []
-        self._snapshots_intervalInsertAttemptRate    = []
-        self._snapshots_intervalInsertSuccessRate    = []
-        self._snapshots_intervalInsertFailureRate    = []
-        self._snapshots_intervalRecirculationRate    = []
-        self._snapshots_intervalEvictionRate         = []
-        self._snapshots_intervalUpdateAttemptRate    = []
-        self._snapshots_intervalUpdateSuccessRate    = []
-        self._snapshots_intervalUpdateFailureRate    = []
-        ## Total Counts
-        self._snapshots_totalOccupancyCount           = []
-        self._snapshots_totalPacketsProcessedCount    = []
-        self._snapshots_totalSEQPacketsProcessedCount = []
-        self._snapshots_totalACKPacketsProcessedCount = []
-        self._snapshots_totalPacketsDroppedCount      = []
-        self._snapshots_totalSEQPacketsDroppedCount   = []
-        self._snapshots_totalACKPacketsDroppedCount   = []
-        self._snapshots_totalInsertAttemptCount       = []
-        self._snapshots_totalInsertSuccessCount       = []
-        self._snapshots_totalInsertFailureCount       = []
-        self._snapshots_totalRecirculationCount       = []
-        self._snapshots_totalEvictionCount            = []
-        self._snapshots_totalUpdateAttemptCount       = []
-        self._snapshots_totalUpdateSuccessCount       = []
-        self._snapshots_totalUpdateFailureCount       = []
-        ## Interval Counts
-        self._snapshots_intervalOccupancyCount        = []
-        self._snapshots_intervalPacketsProcessedCount = []
-        self._snapshots_intervalPacketsDroppedCount   = []
-        self._snapshots_intervalInsertAttemptCount    = []
-        self._snapshots_intervalInsertSuccessCount    = []
-        self._snapshots_intervalInsertFailureCount    = []
-        self._snapshots_intervalRecirculationCount    = []
-        self._snapshots_intervalEvictionCount         = []
-        self._snapshots_intervalUpdateAttemptCount    = []
-        self._snapshots_intervalUpdateSuccessCount    = []
-        self._snapshots_intervalUpdateFailureCount    = []
-        ## Distribution Data Points
-        self._distribution_validEvictionDuration      = []
-        self._distribution_reinsertionDuration        = []
-        self._distribution_sampledEvictionDuration    = []
+        ## Snapshot clock (see SnapshotClock); without one, every table operation checks for a snapshot
+        self._snapshotClock     = None
+        self._snapshotDue       = True
+        self._nextSnapshotTime  = None
+        ## Snapshot store: one row of raw counters per snapshot, grown by doubling
+        self._snapshots         = np.zeros(SNAPSHOT_INITIAL_ROWS, dtype=SNAPSHOT_COLUMNS)
+        self._numSnapshots      = 0
+        ## Distribution Data Points (the tables append to these in either mode)
+        if self._distributionMode == "histogram":
+            self._distribution_validEvictionDuration      = LogHistogram()
+            self._distribution_reinsertionDuration        = LogHistogram()
+            self._distribution_sampledEvictionDuration    = LogHistogram()
+        else:
+            self._distribution_validEvictionDuration      = []
+            self._distribution_reinsertionDuration        = []
+            self._distribution_sampledEvictionDuration    = []
 
     ##################################################
 
@@ -144,119 +200,6 @@ class Accountant():
 
     ##################################################
 
-    def _getTotalOccupancyRate(self):
-        return round(self._numRecords * 100 / (self._stageSize * self._numStages), 2)
-
-    ##################################################
-
-    def _getTotalPacketsProcessedRate(self):
-        return round(self._totalPacketsProcessed * 100 / self._total_packets, 2)
-    
-    ##################################################
-
-    def _getTotalPacketsDroppedRate(self):
-        return round(self._totalPacketsDropped * 100 / self._totalPacketsProcessed, 2)
-    
-    ##################################################
-
-    def _getTotalInsertAttemptRate(self):
-        return round(self._totalInsertAttempts * 100 / self._totalPacketsProcessed, 2)
-    
-    ##################################################
-
-    def _getTotalInsertSuccessRate(self):
-        return round(self._totalInsertSuccesses * 100 / self._totalInsertAttempts, 2)
-    
-    ##################################################
-
-    def _getTotalInsertFailureRate(self):
-        return round(self._totalInsertFailures * 100 / self._totalInsertAttempts, 2)
-    
-    ##################################################
-
-    def _getTotalRecirculationRate(self):
-        return round( (self._totalRecirculations * 100) / (self._totalInsertAttempts * self._recirculations), 2)
-
-    ##################################################
-
-    def _getTotalEvictionRate(self):
-        return round(self._totalEvictions * 100 / self._totalInsertAttempts, 2)
-
-    ##################################################
-
-    def _getTotalUpdateAttemptRate(self):
-        return round(self._totalUpdateAttempts * 100 / self._totalPacketsProcessed, 2)
-
-    ##################################################
-
-    def _getTotalUpdateSuccessRate(self):
-        return round(self._totalUpdateSuccesses * 100 / self._totalUpdateAttempts, 2)
-
-    ##################################################
-
-    def _getTotalUpdateFailureRate(self):
-        return round(self._totalUpdateFailures * 100 / self._totalUpdateAttempts, 2)
-
-    ##################################################
-
-    def _getIntervalOccupancyRate(self):
-        if len(self._snapshots_totalOccupancyRate) < 2:
-            return self._getTotalOccupancyRate()
-        else:
-            return self._getTotalOccupancyRate() - self._snapshots_totalOccupancyRate[-2]
-
-    ##################################################
-
-    def _getIntervalPacketsProcessedRate(self):
-        return round(self._intervalPacketsProcessed * 100 / self._total_packets, 2)
-    
-    ##################################################
-
-    def _getIntervalPacketsDroppedRate(self):
-        return round(self._intervalPacketsDropped * 100 / self._intervalPacketsProcessed, 2)
-    
-    ##################################################
-
-    def _getIntervalInsertAttemptRate(self):
-        return round(self._intervalInsertAttempts * 100 / self._intervalPacketsProcessed, 2)
-    
-    ##################################################
-
-    def _getIntervalInsertSuccessRate(self):
-        return round(self._intervalInsertSuccesses * 100 / self._intervalInsertAttempts, 2)
-    
-    ##################################################
-
-    def _getIntervalInsertFailureRate(self):
-        return round(self._intervalInsertFailures * 100 / self._intervalInsertAttempts, 2)
-    
-    ##################################################
-
-    def _getIntervalRecirculationRate(self):
-        return round( (self._intervalRecirculations * 100) / (self._intervalInsertAttempts * self._recirculations), 2)
-
-    ##################################################
-
-    def _getIntervalEvictionRate(self):
-        return round(self._intervalEvictions * 100 / self._intervalInsertAttempts, 2)
-
-    ##################################################
-
-    def _getIntervalUpdateAttemptRate(self):
-        return round(self._intervalUpdateAttempts * 100 / self._intervalPacketsProcessed, 2)
-
-    ##################################################
-
-    def _getIntervalUpdateSuccessRate(self):
-        return round(self._intervalUpdateSuccesses * 100 / self._intervalUpdateAttempts, 2)
-
-    ##################################################
-
-    def _getIntervalUpdateFailureRate(self):
-        return round(self._intervalUpdateFailures * 100 / self._intervalUpdateAttempts, 2)
-
-    ##################################################
-
     def accountForProcessing(self, pkt_type="SEQ"):
         self._totalPacketsProcessed += 1
         if pkt_type == "SEQ": self._totalSEQPacketsProcessed += 1
@@ -339,12 +282,65 @@ class Accountant():
 
     ##################################################
 
+    def setSnapshotClock(self, snapshot_clock):
+        self._snapshotClock = snapshot_clock
+        self._snapshotDue   = False
+        snapshot_clock.register(self._onSnapshotClock)
+
+    ##################################################
+
+    def setFirstEntryTime(self, t):
+        self._firstEntryTime = t
+        self._scheduleSnapshot()
+
+    ##################################################
+
+    def _snapshotCutoff(self):
+        ## ms after the first entry from which the next snapshot is taken
+        if self._numSnapshots == 0:
+            return (self._latestEntryRound + 1) * self._logInterval
+        else:
+            return max(self._snapshots["time"][self._numSnapshots-1] + self._logInterval, (self._latestEntryRound + 1) * self._logInterval)
+
+    ##################################################
+
+    def _scheduleSnapshot(self):
+
+        if self._snapshotClock is None:
+            return
+
+        ## 1 us early, so that rounding the ms cutoff to us never delays a snapshot; createSnapshot checks the exact cutoff
+        self._nextSnapshotTime = self._firstEntryTime + int(self._snapshotCutoff() * 1000) - 1
+
+        ## Operations on this table may carry timestamps older than the current packet (approx. flow table)
+        current_time = self._snapshotClock.current_time()
+        if current_time is not None and self._nextSnapshotTime <= current_time:
+            self._snapshotDue = True
+        else:
+            self._snapshotDue = False
+            self._snapshotClock.schedule(self._nextSnapshotTime)
+
+    ##################################################
+
+    def _onSnapshotClock(self, t):
+
+        if self._nextSnapshotTime is None or self._snapshotDue:
+            return
+
+        if t >= self._nextSnapshotTime:
+            self._snapshotDue = True
+        else:
+            self._snapshotClock.schedule(self._nextSnapshotTime)
+
+    ##################################################
+
     def explicitSnapshot(self, latest_tstamp):
         self.createSnapshot(latest_tstamp, True)
 
     ##################################################
 
     def createSnapshot(self, t, explicit=False):
+        ## With a snapshot clock, table operations only call this once the clock marked the snapshot as due
 
         if self._firstEntryTime is None or self._intervalPacketsProcessed == 0:
             return
@@ -352,129 +348,36 @@ class Accountant():
         if self._test:
             self._custom_print("Interval packets: {}, Total packets: {}".format(self._intervalPacketsProcessed, self._totalPacketsProcessed))
 
-        ms_elapsed = (t - self._firstEntryTime)/timedelta(milliseconds=1)
-        if len(self._snapshotTime) == 0:
-            ms_cutoff  = (self._latestEntryRound + 1) * self._logInterval
-        else:
-            ms_cutoff  = max(self._snapshotTime[-1] + self._logInterval, (self._latestEntryRound + 1) * self._logInterval)
+        ms_elapsed = (t - self._firstEntryTime)/1000
+        ms_cutoff  = self._snapshotCutoff()
 
         # self._custom_print("In createSnapshot:: Entry round: {}; Cutoff: {}, Check for snapshot at time: {} ms".format(self._latestEntryRound, ms_cutoff, ms_elapsed))
 
         if ms_elapsed >= ms_cutoff or explicit:
             if self._test:
                 self._custom_print("Create snapshot check successful:: Entry round: {}; Cutoff: {}, Take snapshot at time: {} ms".format(self._latestEntryRound, ms_cutoff, ms_elapsed))
-            ## Record time
-            self._snapshotTime.append(ms_elapsed)
 
             self._totalOccupancy = int(self._numRecords)
 
-            ## Packets Processed
-            self._snapshots_totalPacketsProcessedRate.append(self._getTotalPacketsProcessedRate())
-            self._snapshots_intervalPacketsProcessedRate.append(self._getIntervalPacketsProcessedRate())
-            self._snapshots_totalPacketsProcessedCount.append(self._totalPacketsProcessed)
-            self._snapshots_totalSEQPacketsProcessedCount.append(self._totalSEQPacketsProcessed)
-            self._snapshots_totalACKPacketsProcessedCount.append(self._totalACKPacketsProcessed)
-            self._snapshots_intervalPacketsProcessedCount.append(self._intervalPacketsProcessed)
-
-            ## Packets Dropped
-            self._snapshots_totalPacketsDroppedRate.append(self._getTotalPacketsDroppedRate())
-            self._snapshots_intervalPacketsDroppedRate.append(self._getIntervalPacketsDroppedRate())
-            self._snapshots_totalPacketsDroppedCount.append(self._totalPacketsDropped)
-            self._snapshots_totalSEQPacketsDroppedCount.append(self._totalSEQPacketsDropped)
-            self._snapshots_totalACKPacketsDroppedCount.append(self._totalACKPacketsDropped)
-            self._snapshots_intervalPacketsDroppedCount.append(self._intervalPacketsDropped)
-
-            ## Occupancy
-            self._snapshots_totalOccupancyRate.append(self._getTotalOccupancyRate())
-            self._snapshots_intervalOccupancyRate.append(self._getIntervalOccupancyRate())
-            self._snapshots_totalOccupancyCount.append(self._totalOccupancy)
-            self._snapshots_intervalOccupancyCount.append(self._intervalOccupancy)
-
-            ## Insert Attempts, Successes, Failures, Recirculations, Evictions
-            ### Totals
-            #### Rates
-            self._snapshots_totalInsertAttemptRate.append(self._getTotalInsertAttemptRate())
-            if self._totalInsertAttempts > 0:
-                self._snapshots_totalInsertSuccessRate.append(self._getTotalInsertSuccessRate())
-                self._snapshots_totalInsertFailureRate.append(self._getTotalInsertFailureRate())
-                self._snapshots_totalRecirculationRate.append(self._getTotalRecirculationRate())
-                self._snapshots_totalEvictionRate.append(self._getTotalEvictionRate())
-            elif len(self._snapshots_totalInsertSuccessRate) == 0:
-                self._snapshots_totalInsertSuccessRate.append(0.0)
-                self._snapshots_totalInsertFailureRate.append(0.0)
-                self._snapshots_totalRecirculationRate.append(0.0)
-                self._snapshots_totalEvictionRate.append(0.0)
-            else:
-                self._snapshots_totalInsertSuccessRate.append(self._snapshots_totalInsertSuccessRate[-1])
-                self._snapshots_totalInsertFailureRate.append(self._snapshots_totalInsertFailureRate[-1])
-                self._snapshots_totalRecirculationRate.append(self._snapshots_totalRecirculationRate[-1])
-                self._snapshots_totalEvictionRate.append(self._snapshots_totalEvictionRate[-1])
-            #### Counts
-            self._snapshots_totalInsertAttemptCount.append(self._totalInsertAttempts)
-            self._snapshots_totalInsertSuccessCount.append(self._totalInsertSuccesses)
-            self._snapshots_totalInsertFailureCount.append(self._totalInsertFailures)
-            self._snapshots_totalRecirculationCount.append(self._totalRecirculations)
-            self._snapshots_totalEvictionCount.append(self._totalEvictions)
-
-            ### Intervals
-            self._snapshots_intervalInsertAttemptRate.append(self._getIntervalInsertAttemptRate())
-            if self._intervalInsertAttempts > 0:
-                self._snapshots_intervalInsertSuccessRate.append(self._getIntervalInsertSuccessRate())
-                self._snapshots_intervalInsertFailureRate.append(self._getIntervalInsertFailureRate())
-                self._snapshots_intervalRecirculationRate.append(self._getIntervalRecirculationRate())
-                self._snapshots_intervalEvictionRate.append(self._getIntervalEvictionRate())
-            elif len(self._snapshots_intervalInsertSuccessRate) == 0:
-                self._snapshots_intervalInsertSuccessRate.append(0.0)
-                self._snapshots_intervalInsertFailureRate.append(0.0)
-                self._snapshots_intervalRecirculationRate.append(0.0)
-                self._snapshots_intervalEvictionRate.append(0.0)
-            else:
-                self._snapshots_intervalInsertSuccessRate.append(self._snapshots_intervalInsertSuccessRate[-1])
-                self._snapshots_intervalInsertFailureRate.append(self._snapshots_intervalInsertFailureRate[-1])
-                self._snapshots_intervalRecirculationRate.append(self._snapshots_intervalRecirculationRate[-1])
-                self._snapshots_intervalEvictionRate.append(self._snapshots_intervalEvictionRate[-1])
-            #### Counts
-            self._snapshots_intervalInsertAttemptCount.append(self._intervalInsertAttempts)
-            self._snapshots_intervalInsertSuccessCount.append(self._intervalInsertSuccesses)
-            self._snapshots_intervalInsertFailureCount.append(self._intervalInsertFailures)
-            self._snapshots_intervalRecirculationCount.append(self._intervalRecirculations)
-            self._snapshots_intervalEvictionCount.append(self._intervalEvictions)
-
-            ## Update Attempts, Successes, Failures
-            ### Totals
-            #### Rates
-            self._snapshots_totalUpdateAttemptRate.append(self._getTotalUpdateAttemptRate())
-            if self._totalUpdateAttempts > 0:
-                self._snapshots_totalUpdateSuccessRate.append(self._getTotalUpdateSuccessRate())
-                self._snapshots_totalUpdateFailureRate.append(self._getTotalUpdateFailureRate())
-            elif len(self._snapshots_totalUpdateSuccessRate) == 0:
-                self._snapshots_totalUpdateSuccessRate.append(0.0)
-                self._snapshots_totalUpdateFailureRate.append(0.0)
-            else:
-                self._snapshots_totalUpdateSuccessRate.append(self._snapshots_totalUpdateSuccessRate[-1])
-                self._snapshots_totalUpdateFailureRate.append(self._snapshots_totalUpdateFailureRate[-1])
-            #### Counts
-            self._snapshots_totalUpdateAttemptCount.append(self._totalUpdateAttempts)
-            self._snapshots_totalUpdateSuccessCount.append(self._totalUpdateSuccesses)
-            self._snapshots_totalUpdateFailureCount.append(self._totalUpdateFailures)
-
-            ### Intervals
-            #### Rates
-            self._snapshots_intervalUpdateAttemptRate.append(self._getIntervalUpdateAttemptRate())
-            if self._intervalUpdateAttempts > 0:
-                self._snapshots_intervalUpdateSuccessRate.append(self._getIntervalUpdateSuccessRate())
-                self._snapshots_intervalUpdateFailureRate.append(self._getIntervalUpdateFailureRate())
-            elif len(self._snapshots_intervalUpdateSuccessRate) == 0:
-                self._snapshots_intervalUpdateSuccessRate.append(0.0)
-                self._snapshots_intervalUpdateFailureRate.append(0.0)
-            else:
-                self._snapshots_intervalUpdateSuccessRate.append(self._snapshots_intervalUpdateSuccessRate[-1])
-                self._snapshots_intervalUpdateFailureRate.append(self._snapshots_intervalUpdateFailureRate[-1])
-            #### Counts
-            self._snapshots_intervalUpdateAttemptCount.append(self._intervalUpdateAttempts)
-            self._snapshots_intervalUpdateSuccessCount.append(self._intervalUpdateSuccesses)
-            self._snapshots_intervalUpdateFailureCount.append(self._intervalUpdateFailures)
-            
+            if self._numSnapshots == len(self._snapshots):
+                self._snapshots = np.concatenate((self._snapshots, np.zeros(len(self._snapshots), dtype=SNAPSHOT_COLUMNS)))
+
+            ## Record counters
+            self._snapshots[self._numSnapshots] = (
+                ms_elapsed,
+                self._totalOccupancy,
+                self._totalPacketsProcessed, self._totalSEQPacketsProcessed, self._totalACKPacketsProcessed,
+                self._totalPacketsDropped, self._totalSEQPacketsDropped, self._totalACKPacketsDropped,
+                self._totalInsertAttempts, self._totalInsertSuccesses, self._totalInsertFailures, self._totalRecirculations, self._totalEvictions,
+                self._totalUpdateAttempts, self._totalUpdateSuccesses, self._totalUpdateFailures,
+                self._intervalOccupancy,
+                self._intervalPacketsProcessed,
+                self._intervalPacketsDropped,
+                self._intervalInsertAttempts, self._intervalInsertSuccesses, self._intervalInsertFailures, self._intervalRecirculations, self._intervalEvictions,
+                self._intervalUpdateAttempts, self._intervalUpdateSuccesses, self._intervalUpdateFailures,
+            )
+            self._numSnapshots += 1
+
             ## Reset interval counters
             self._intervalOccupancy        = 0
             self._intervalPacketsProcessed = 0
@@ -491,173 +394,156 @@ class Accountant():
             ## Increment round
             self._latestEntryRound += 1
 
+            self._scheduleSnapshot()
+
     ##################################################
 
-    def saveSnapshots(self):
+    def _rate(self, count, base):
+        return round(count * 100 / base, 2)
 
-        if not os.path.exists(self._resultsPath):
-            os.makedirs(self._resultsPath)
-        cumulative_data_path = os.path.join(self._resultsPath, "cumulative_data")
+    ##################################################
+
+    def _attemptRates(self, attempts, counts, bases):
+        ## Rates relative to attempts; snapshots without attempts repeat the previous rate (0.0 before the first one)
+
+        rates = []
+        for i in range(len(attempts)):
+            if attempts[i] > 0:
+                rates.append(self._rate(counts[i], bases[i]))
+            elif i == 0:
+                rates.append(0.0)
+            else:
+                rates.append(rates[-1])
+
+        return rates
+
+    ##################################################
+
+    def _snapshotSeries(self):
+        ## Per-snapshot series (as plain Python numbers) derived from the snapshot store
+
+        snapshots = {name: self._snapshots[name][:self._numSnapshots].tolist() for name, _ in SNAPSHOT_COLUMNS}
+        series = {"snapshotTime": snapshots["time"]}
+
+        for prefix in ["total", "interval"]:
+            processed = snapshots[prefix + "PacketsProcessed"]
+            insert_attempts = snapshots[prefix + "InsertAttempts"]
+            update_attempts = snapshots[prefix + "UpdateAttempts"]
+
+            ## Rates
+            series[prefix + "PacketsProcessedRate"] = [self._rate(n, self._total_packets) for n in processed]
+            series[prefix + "PacketsDroppedRate"]   = [self._rate(n, m) for n, m in zip(snapshots[prefix + "PacketsDropped"], processed)]
+            series[prefix + "InsertAttemptRate"]    = [self._rate(n, m) for n, m in zip(insert_attempts, processed)]
+            series[prefix + "InsertSuccessRate"]    = self._attemptRates(insert_attempts, snapshots[prefix + "InsertSuccesses"], insert_attempts)
+            series[prefix + "InsertFailureRate"]    = self._attemptRates(insert_attempts, snapshots[prefix + "InsertFailures"], insert_attempts)
+            series[prefix + "RecirculationRate"]    = self._attemptRates(insert_attempts, snapshots[prefix + "Recirculations"],
+                                                                         [n * self._recirculations for n in insert_attempts])
+            series[prefix + "EvictionRate"]         = self._attemptRates(insert_attempts, snapshots[prefix + "Evictions"], insert_attempts)
+            series[prefix + "UpdateAttemptRate"]    = [self._rate(n, m) for n, m in zip(update_attempts, processed)]
+            series[prefix + "UpdateSuccessRate"]    = self._attemptRates(update_attempts, snapshots[prefix + "UpdateSuccesses"], update_attempts)
+            series[prefix + "UpdateFailureRate"]    = self._attemptRates(update_attempts, snapshots[prefix + "UpdateFailures"], update_attempts)
+
+            ## Counts
+            series[prefix + "OccupancyCount"]        = snapshots[prefix + "Occupancy"]
+            series[prefix + "PacketsProcessedCount"] = processed
+            series[prefix + "PacketsDroppedCount"]   = snapshots[prefix + "PacketsDropped"]
+            series[prefix + "InsertAttemptCount"]    = insert_attempts
+            series[prefix + "InsertSuccessCount"]    = snapshots[prefix + "InsertSuccesses"]
+            series[prefix + "InsertFailureCount"]    = snapshots[prefix + "InsertFailures"]
+            series[prefix + "RecirculationCount"]    = snapshots[prefix + "Recirculations"]
+            series[prefix + "EvictionCount"]         = snapshots[prefix + "Evictions"]
+            series[prefix + "UpdateAttemptCount"]    = update_attempts
+            series[prefix + "UpdateSuccessCount"]    = snapshots[prefix + "UpdateSuccesses"]
+            series[prefix + "UpdateFailureCount"]    = snapshots[prefix + "UpdateFailures"]
+
+        for direction in ["SEQ", "ACK"]:
+            series["total" + direction + "PacketsProcessedCount"] = snapshots["total" + direction + "PacketsProcessed"]
+            series["total" + direction + "PacketsDroppedCount"]   = snapshots["total" + direction + "PacketsDropped"]
+
+        ## Occupancy; the discrete rate is the change of the cumulative rate since the previous snapshot
+        occupancy_rate = [self._rate(n, self._stageSize * self._numStages) for n in snapshots["totalOccupancy"]]
+        series["totalOccupancyRate"]    = occupancy_rate
+        series["intervalOccupancyRate"] = occupancy_rate[:1] + [occupancy_rate[i] - occupancy_rate[i-1] for i in range(1, len(occupancy_rate))]
+
+        return series
+
+    ##################################################
+
+    def saveSnapshots(self, results_path=None):
+        ## results_path: simulation directory to save into instead of this table's own (used by lockstep lanes sharing a table)
+
+        if results_path is None:
+            table_results_path = self._resultsPath
+        else:
+            table_results_path = os.path.join(results_path, self._tab_type + "_table")
+
+        if not os.path.exists(table_results_path):
+            os.makedirs(table_results_path)
+
+        if self._snapshotFormat == "npz":
+            self._saveSnapshotsNpz(table_results_path)
+        else:
+            self._saveSnapshotsText(table_results_path)
+
+    ##################################################
+
+    def _saveSnapshotsText(self, table_results_path):
+
+        cumulative_data_path = os.path.join(table_results_path, "cumulative_data")
         if not os.path.exists(cumulative_data_path):
             os.makedirs(cumulative_data_path)
-        discrete_data_path = os.path.join(self._resultsPath, "discrete_data")
+        discrete_data_path = os.path.join(table_results_path, "discrete_data")
         if not os.path.exists(discrete_data_path):
             os.makedirs(discrete_data_path)
-        cumulative_plot_path = os.path.join(self._resultsPath, "cumulative_plot")
+        cumulative_plot_path = os.path.join(table_results_path, "cumulative_plot")
         if not os.path.exists(cumulative_plot_path):
             os.makedirs(cumulative_plot_path)
-        discrete_plot_path = os.path.join(self._resultsPath, "discrete_plot")
+        discrete_plot_path = os.path.join(table_results_path, "discrete_plot")
         if not os.path.exists(discrete_plot_path):
             os.makedirs(discrete_plot_path)
         
-        ## Cumulative rates
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_occupancy.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalOccupancyRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_packets_processed.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalPacketsProcessedRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_packets_dropped.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalPacketsDroppedRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_insert_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertAttemptRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_insert_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertSuccessRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_insert_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertFailureRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_recirculations.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalRecirculationRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_evictions.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalEvictionRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_update_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateAttemptRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_update_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateSuccessRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_rate_update_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateFailureRate)]
-            fp.write("\n".join(lines))
-        
-        ## Discrete rates
-        with open(os.path.join(discrete_data_path, "discrete_rate_occupancy.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalOccupancyRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_packets_processed.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalPacketsProcessedRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_packets_dropped.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalPacketsDroppedRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_insert_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertAttemptRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_insert_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertSuccessRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_insert_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertFailureRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_recirculations.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalRecirculationRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_evictions.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalEvictionRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_update_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateAttemptRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_update_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateSuccessRate)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_rate_update_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateFailureRate)]
-            fp.write("\n".join(lines))
+        series = self._snapshotSeries()
+        for data_dir, filename, name in SNAPSHOT_FILES:
+            with open(os.path.join(table_results_path, data_dir, filename + ".txt"), "w") as fp:
+                lines = ["{},{}".format(t, point) for t, point in zip(series["snapshotTime"], series[name])]
+                fp.write("\n".join(lines))
+
+        ## Distributions; histograms are written as "bucket lower bound,count" lines
+        for filename, distribution in [("distribution_valid_evictions_duration", self._distribution_validEvictionDuration),
+                                       ("distribution_reinsertions_duration", self._distribution_reinsertionDuration)]:
+            if self._distributionMode == "histogram":
+                with open(os.path.join(cumulative_data_path, filename + "_histogram.txt"), "w") as fp:
+                    lines = ["{},{}".format(lower, count) for lower, count in distribution.to_array().tolist()]
+                    fp.write("\n".join(lines))
+            else:
+                with open(os.path.join(cumulative_data_path, filename + ".txt"), "w") as fp:
+                    lines = ["{}".format(point) for point in distribution]
+                    fp.write("\n".join(lines))
 
+    ##################################################
 
-        ## Cumulative counts
-        with open(os.path.join(cumulative_data_path, "cumulative_count_occupancy.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalOccupancyCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_packets_processed.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalPacketsProcessedCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_packets_dropped.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalPacketsDroppedCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_insert_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertAttemptCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_insert_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertSuccessCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_insert_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalInsertFailureCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_recirculations.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalRecirculationCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_evictions.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalEvictionCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_update_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateAttemptCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_update_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateSuccessCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "cumulative_count_update_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_totalUpdateFailureCount)]
-            fp.write("\n".join(lines))
+    def _saveSnapshotsNpz(self, table_results_path):
+        ## One compressed file per table; arrays are named after the text files they replace (see snapshot_loader)
 
-        ## Discrete counts
-        with open(os.path.join(discrete_data_path, "discrete_count_occupancy.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalOccupancyCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_packets_processed.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalPacketsProcessedCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_packets_dropped.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalPacketsDroppedCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_insert_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertAttemptCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_insert_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertSuccessCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_insert_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalInsertFailureCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_recirculations.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalRecirculationCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_evictions.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalEvictionCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_update_attempts.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateAttemptCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_update_successes.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateSuccessCount)]
-            fp.write("\n".join(lines))
-        with open(os.path.join(discrete_data_path, "discrete_count_update_failures.txt"), "w") as fp:
-            lines = ["{},{}".format(t, point) for t, point in zip(self._snapshotTime, self._snapshots_intervalUpdateFailureCount)]
-            fp.write("\n".join(lines))
-        
-        ## Distributions
-        with open(os.path.join(cumulative_data_path, "distribution_valid_evictions_duration.txt"), "w") as fp:
-            lines = ["{}".format(point) for point in self._distribution_validEvictionDuration]
-            fp.write("\n".join(lines))
-        with open(os.path.join(cumulative_data_path, "distribution_reinsertions_duration.txt"), "w") as fp:
-            lines = ["{}".format(point) for point in self._distribution_reinsertionDuration]
-            fp.write("\n".join(lines))
+        series = self._snapshotSeries()
+        arrays = {"time": np.array(series["snapshotTime"], dtype=np.float64)}
+        for _, filename, name in SNAPSHOT_FILES:
+            arrays[filename] = np.array(series[name], dtype=np.float64 if "_rate_" in filename else np.int64)
+
+        ## Distributions; histograms as [bucket lower bound, count] rows
+        for name, distribution in [("distribution_valid_evictions_duration", self._distribution_validEvictionDuration),
+                                   ("distribution_reinsertions_duration", self._distribution_reinsertionDuration),
+                                   ("distribution_sampled_evictions_duration", self._distribution_sampledEvictionDuration)]:
+            if self._distributionMode == "histogram":
+                arrays[name + "_histogram"] = distribution.to_array()
+            else:
+                arrays[name] = np.array(distribution, dtype=np.int64)
+
+        ## Write to a temporary file first so that an interrupted round never leaves a truncated archive behind
+        npz_path = os.path.join(table_results_path, SNAPSHOT_NPZ_FILE)
+        with open(npz_path + ".tmp", "wb") as fp:
+            np.savez_compressed(fp, **arrays)
+        os.replace(npz_path + ".tmp", npz_path)
 
     ##################################################
 
@@ -678,8 +564,11 @@ class Accountant():
 
     def _plotMetric(self, y, plot_filename, color, linestyle, title):
 
+        plt, sns = load_pyplot()
+        snapshots = self._snapshotSeries()
+
         plt.figure(figsize=(6,4))
-        time_x = [t/1000 for t in self._snapshotTime]
+        time_x = [t/1000 for t in snapshots["snapshotTime"]]
         plt.plot(time_x, y, color=color, linestyle=linestyle)
         plt.xlabel("Time (sec.)")
         if "rate" in plot_filename:
@@ -701,16 +590,29 @@ class Accountant():
 
     ##################################################
 
-    def _plotMetricCDF(self, x, plot_filename, color, linestyle, title):
-    
+    def _durationCDF(self, distribution):
+        ## (durations in ms, CDF) of a duration distribution, from the samples or the histogram buckets
+
+        if isinstance(distribution, LogHistogram):
+            x, cdf_y = distribution.cdf()
+            return x/1000, cdf_y
+
+        x = np.sort([dur/1000 for dur in distribution])
+        return x, np.arange(1, len(x)+1)/len(x)
+
+    ##################################################
+
+    def _plotMetricCDF(self, distribution, plot_filename, color, linestyle, title):
+
+        plt, sns = load_pyplot()
+
         plt.figure(figsize=(6,4))
-        x = np.sort(x)
-        cdf_y = np.arange(1, len(x)+1)/len(x)
+        x, cdf_y = self._durationCDF(distribution)
         plt.plot(x, cdf_y, color=color, linestyle=linestyle)
         plt.xlabel("Time (ms)")
         plt.ylabel("CDF")
         plt.xscale("log")
-        plt.title(self._tab_type.capitalize() + " Table: " + title.format(len(x)))
+        plt.title(self._tab_type.capitalize() + " Table: " + title.format(len(distribution)))
         plt.tight_layout()
         if "cumulative" in plot_filename:
             plot_path = os.path.join(self._resultsPath, "cumulative_plot", plot_filename + ".png")
@@ -727,46 +629,49 @@ class Accountant():
 
     def _plotPacketFate(self):
 
+        plt, sns = load_pyplot()
+        snapshots = self._snapshotSeries()
+
         ## Cumulative
         sns_colors = itertools.cycle(sns.color_palette("bright"))
 
         plt.figure(figsize=(6,4))
-        time_x = [t/1000 for t in self._snapshotTime]
+        time_x = [t/1000 for t in snapshots["snapshotTime"]]
 
         ## SEQ Packets Processed/Dropped
         color = next(sns_colors)
         linestyles = itertools.cycle(["-", "--"])
-        plt.plot(time_x, self._snapshots_totalSEQPacketsProcessedCount, color=color, alpha=0.5, linestyle=next(linestyles), label="SEQ Packets Processed ({})".format(
+        plt.plot(time_x, snapshots["totalSEQPacketsProcessedCount"], color=color, alpha=0.5, linestyle=next(linestyles), label="SEQ Packets Processed ({})".format(
                     self._humanReadableStr(self._totalSEQPacketsProcessed)))
-        plt.plot(time_x, self._snapshots_totalSEQPacketsDroppedCount, color=color, linestyle=next(linestyles), label="SEQ Packets Dropped ({})".format(
+        plt.plot(time_x, snapshots["totalSEQPacketsDroppedCount"], color=color, linestyle=next(linestyles), label="SEQ Packets Dropped ({})".format(
                     self._humanReadableStr(self._totalSEQPacketsDropped)))
         
         ## ACK Packets Processed/Dropped
         color = next(sns_colors)
         linestyles = itertools.cycle(["-", "--"])
-        plt.plot(time_x, self._snapshots_totalACKPacketsProcessedCount, color=color, alpha=0.5, linestyle=next(linestyles), label="ACK Packets Processed ({})".format(
+        plt.plot(time_x, snapshots["totalACKPacketsProcessedCount"], color=color, alpha=0.5, linestyle=next(linestyles), label="ACK Packets Processed ({})".format(
                     self._humanReadableStr(self._totalACKPacketsProcessed)))
-        plt.plot(time_x, self._snapshots_totalACKPacketsDroppedCount, color=color, linestyle=next(linestyles), label="ACK Packets Dropped ({})".format(
+        plt.plot(time_x, snapshots["totalACKPacketsDroppedCount"], color=color, linestyle=next(linestyles), label="ACK Packets Dropped ({})".format(
                     self._humanReadableStr(self._totalACKPacketsDropped)))
 
         ## Insertion Stats
         color = next(sns_colors)
         linestyles = itertools.cycle(["-", "--", ":"])
-        plt.plot(time_x, self._snapshots_totalInsertAttemptCount, color=color, alpha=0.5, linestyle=next(linestyles), label="Attempted Insertions ({})".format(
+        plt.plot(time_x, snapshots["totalInsertAttemptCount"], color=color, alpha=0.5, linestyle=next(linestyles), label="Attempted Insertions ({})".format(
                     self._humanReadableStr(self._totalInsertAttempts)))
-        plt.plot(time_x, self._snapshots_totalInsertSuccessCount, color=color, linestyle=next(linestyles), label="Successful Insertions ({})".format(
+        plt.plot(time_x, snapshots["totalInsertSuccessCount"], color=color, linestyle=next(linestyles), label="Successful Insertions ({})".format(
                     self._humanReadableStr(self._totalInsertSuccesses)))
-        # plt.plot(time_x, self._snapshots_totalInsertFailureCount, color=color, linestyle=next(linestyles), label="Failed Insertions ({})".format(
+        # plt.plot(time_x, snapshots["totalInsertFailureCount"], color=color, linestyle=next(linestyles), label="Failed Insertions ({})".format(
         #             self._humanReadableStr(self._totalInsertFailures)))
 
         ## Update Stats
         color = next(sns_colors)
         linestyles = itertools.cycle(["-", "--", ":"])
-        plt.plot(time_x, self._snapshots_totalUpdateAttemptCount, color=color, alpha=0.5, linestyle=next(linestyles), label="Attempted Updates ({})".format(
+        plt.plot(time_x, snapshots["totalUpdateAttemptCount"], color=color, alpha=0.5, linestyle=next(linestyles), label="Attempted Updates ({})".format(
                     self._humanReadableStr(self._totalUpdateAttempts)))
-        plt.plot(time_x, self._snapshots_totalUpdateSuccessCount, color=color, linestyle=next(linestyles), label="Successful Updates ({})".format(
+        plt.plot(time_x, snapshots["totalUpdateSuccessCount"], color=color, linestyle=next(linestyles), label="Successful Updates ({})".format(
                     self._humanReadableStr(self._totalUpdateSuccesses)))
-        # plt.plot(time_x, self._snapshots_totalUpdateFailureCount, color=color, linestyle=next(linestyles), label="Failed Updates ({})".format(
+        # plt.plot(time_x, snapshots["totalUpdateFailureCount"], color=color, linestyle=next(linestyles), label="Failed Updates ({})".format(
         #             self._humanReadableStr(self._totalUpdateFailures)))
 
         # plt.yscale("log")
@@ -785,23 +690,26 @@ class Accountant():
 
     def _plotInsertionStats(self):
 
+        plt, sns = load_pyplot()
+        snapshots = self._snapshotSeries()
+
         ## Cumulative
         sns_colors = itertools.cycle(sns.color_palette("bright"))
         linestyles = itertools.cycle(["-", "--", "-.", ":"])
 
         plt.figure(figsize=(6,4))
-        time_x = [t/1000 for t in self._snapshotTime]
-        plt.plot(time_x, self._snapshots_totalInsertSuccessRate, color=next(sns_colors), alpha=0.5, linestyle=next(linestyles), label="Successful Insertions ({})".format(
+        time_x = [t/1000 for t in snapshots["snapshotTime"]]
+        plt.plot(time_x, snapshots["totalInsertSuccessRate"], color=next(sns_colors), alpha=0.5, linestyle=next(linestyles), label="Successful Insertions ({})".format(
                     self._humanReadableStr(self._totalInsertSuccesses)))
-        # plt.plot(time_x, self._snapshots_totalInsertFailureRate, color=next(sns_colors), alpha=0.7, linestyle=next(linestyles), label="Failed Insertions ({})".format(
+        # plt.plot(time_x, snapshots["totalInsertFailureRate"], color=next(sns_colors), alpha=0.7, linestyle=next(linestyles), label="Failed Insertions ({})".format(
                     # self._humanReadableStr(self._totalInsertFailures)))
-        plt.plot(time_x, self._snapshots_totalRecirculationRate, color=next(sns_colors), alpha=0.65, linestyle=next(linestyles), label="Recirculations ({})".format(
+        plt.plot(time_x, snapshots["totalRecirculationRate"], color=next(sns_colors), alpha=0.65, linestyle=next(linestyles), label="Recirculations ({})".format(
                     self._humanReadableStr(self._totalRecirculations)))
-        plt.plot(time_x, self._snapshots_totalEvictionRate, color=next(sns_colors), alpha=0.8, linestyle=next(linestyles), label="Valid Evictions ({})".format(
+        plt.plot(time_x, snapshots["totalEvictionRate"], color=next(sns_colors), alpha=0.8, linestyle=next(linestyles), label="Valid Evictions ({})".format(
                     self._humanReadableStr(self._totalEvictions)))
-        plt.plot(time_x, self._snapshots_totalUpdateSuccessRate, color=next(sns_colors), alpha=0.95, linestyle=next(linestyles), label="Successful Updates ({})".format(
+        plt.plot(time_x, snapshots["totalUpdateSuccessRate"], color=next(sns_colors), alpha=0.95, linestyle=next(linestyles), label="Successful Updates ({})".format(
                 self._humanReadableStr(self._totalUpdateSuccesses)))
-        # plt.plot(time_x, self._snapshots_totalUpdateFailureRate, color=next(sns_colors), alpha=0.7, linestyle=next(linestyles), label="Failed Updates ({})".format(
+        # plt.plot(time_x, snapshots["totalUpdateFailureRate"], color=next(sns_colors), alpha=0.7, linestyle=next(linestyles), label="Failed Updates ({})".format(
                     # self._humanReadableStr(self._totalUpdateFailures)))
 
         plt.xlabel("Time (sec.)")
@@ -819,23 +727,25 @@ class Accountant():
 
     def _plotDuration(self):
 
+        plt, sns = load_pyplot()
+
         sns_colors = itertools.cycle(sns.color_palette("bright"))
         linestyles = itertools.cycle(["-", "--", "-.", ":"])
 
         plt.figure(figsize=(6,4))
 
-        x = np.sort([dur/1000 for dur in self._distribution_validEvictionDuration])
-        cdf_y = np.arange(1, len(x)+1)/len(x)
-        plt.plot(x, cdf_y, color=next(sns_colors), alpha=0.5, linestyle=next(linestyles), label="Valid Evictions ({})".format(self._humanReadableStr(len(x))))
+        x, cdf_y = self._durationCDF(self._distribution_validEvictionDuration)
+        plt.plot(x, cdf_y, color=next(sns_colors), alpha=0.5, linestyle=next(linestyles),
+                    label="Valid Evictions ({})".format(self._humanReadableStr(len(self._distribution_validEvictionDuration))))
 
-        x = np.sort([dur/1000 for dur in self._distribution_reinsertionDuration])
-        cdf_y = np.arange(1, len(x)+1)/len(x)
-        plt.plot(x, cdf_y, color=next(sns_colors), alpha=0.75, linestyle=next(linestyles), label="Reinsertions ({})".format(self._humanReadableStr(len(x))))
+        x, cdf_y = self._durationCDF(self._distribution_reinsertionDuration)
+        plt.plot(x, cdf_y, color=next(sns_colors), alpha=0.75, linestyle=next(linestyles),
+                    label="Reinsertions ({})".format(self._humanReadableStr(len(self._distribution_reinsertionDuration))))
 
         if self._tab_type == "packet":
-            x = np.sort([dur/1000 for dur in self._distribution_sampledEvictionDuration])
-            cdf_y = np.arange(1, len(x)+1)/len(x)
-            plt.plot(x, cdf_y, color=next(sns_colors), alpha=1.0, linestyle=next(linestyles), label="Sampled Evictions ({})".format(self._humanReadableStr(len(x))))
+            x, cdf_y = self._durationCDF(self._distribution_sampledEvictionDuration)
+            plt.plot(x, cdf_y, color=next(sns_colors), alpha=1.0, linestyle=next(linestyles),
+                        label="Sampled Evictions ({})".format(self._humanReadableStr(len(self._distribution_sampledEvictionDuration))))
 
         plt.xlabel("Time (ms)")
         plt.ylabel("CDF")
@@ -853,71 +763,74 @@ class Accountant():
 
     def plotSnapshots(self):
 
+        plt, sns = load_pyplot()
+        snapshots = self._snapshotSeries()
+
         self._custom_print("Round {}/{}: Plot {} table snapshots...".format(self._round_number, self._max_round_number, self._tab_type))
+        for plot_dir in ["cumulative_plot", "discrete_plot"]:
+            if not os.path.exists(os.path.join(self._resultsPath, plot_dir)):
+                os.makedirs(os.path.join(self._resultsPath, plot_dir))
         
         sns_colors = itertools.cycle(sns.color_palette("bright"))
         linestyles = itertools.cycle(["-"])
 
         ## Cumulative rates
-        self._plotMetric(self._snapshots_totalOccupancyRate, "cumulative_rate_occupancy", next(sns_colors), next(linestyles), "Cumulative Occupancy Rate")
-        self._plotMetric(self._snapshots_totalPacketsProcessedRate, "cumulative_rate_packets_processed", next(sns_colors), next(linestyles), "Cumulative Packets Processed Rate")
-        self._plotMetric(self._snapshots_totalPacketsDroppedRate, "cumulative_rate_packets_dropped", next(sns_colors), next(linestyles), "Cumulative Packets Dropped Rate")
-        self._plotMetric(self._snapshots_totalInsertAttemptRate, "cumulative_rate_insert_attempts", next(sns_colors), next(linestyles), "Cumulative Insertion Attempt Rate")
-        self._plotMetric(self._snapshots_totalInsertSuccessRate, "cumulative_rate_insert_successes", next(sns_colors), next(linestyles), "Cumulative Insertion Success Rate")
-        self._plotMetric(self._snapshots_totalInsertFailureRate, "cumulative_rate_insert_failures", next(sns_colors), next(linestyles), "Cumulative Insertion Failure Rate")
-        self._plotMetric(self._snapshots_totalRecirculationRate, "cumulative_rate_recirculations", next(sns_colors), next(linestyles), "Cumulative Recirculation Rate")
-        self._plotMetric(self._snapshots_totalEvictionRate, "cumulative_rate_evictions", next(sns_colors), next(linestyles), "Cumulative Eviction Rate")
-        self._plotMetric(self._snapshots_totalUpdateAttemptRate, "cumulative_rate_update_attempts", next(sns_colors), next(linestyles), "Cumulative Update Attempt Rate")
-        self._plotMetric(self._snapshots_totalUpdateSuccessRate, "cumulative_rate_update_successes", next(sns_colors), next(linestyles), "Cumulative Update Success Rate")
-        self._plotMetric(self._snapshots_totalUpdateFailureRate, "cumulative_rate_update_failures", next(sns_colors), next(linestyles), "Cumulative Update Failure Rate")
+        self._plotMetric(snapshots["totalOccupancyRate"], "cumulative_rate_occupancy", next(sns_colors), next(linestyles), "Cumulative Occupancy Rate")
+        self._plotMetric(snapshots["totalPacketsProcessedRate"], "cumulative_rate_packets_processed", next(sns_colors), next(linestyles), "Cumulative Packets Processed Rate")
+        self._plotMetric(snapshots["totalPacketsDroppedRate"], "cumulative_rate_packets_dropped", next(sns_colors), next(linestyles), "Cumulative Packets Dropped Rate")
+        self._plotMetric(snapshots["totalInsertAttemptRate"], "cumulative_rate_insert_attempts", next(sns_colors), next(linestyles), "Cumulative Insertion Attempt Rate")
+        self._plotMetric(snapshots["totalInsertSuccessRate"], "cumulative_rate_insert_successes", next(sns_colors), next(linestyles), "Cumulative Insertion Success Rate")
+        self._plotMetric(snapshots["totalInsertFailureRate"], "cumulative_rate_insert_failures", next(sns_colors), next(linestyles), "Cumulative Insertion Failure Rate")
+        self._plotMetric(snapshots["totalRecirculationRate"], "cumulative_rate_recirculations", next(sns_colors), next(linestyles), "Cumulative Recirculation Rate")
+        self._plotMetric(snapshots["totalEvictionRate"], "cumulative_rate_evictions", next(sns_colors), next(linestyles), "Cumulative Eviction Rate")
+        self._plotMetric(snapshots["totalUpdateAttemptRate"], "cumulative_rate_update_attempts", next(sns_colors), next(linestyles), "Cumulative Update Attempt Rate")
+        self._plotMetric(snapshots["totalUpdateSuccessRate"], "cumulative_rate_update_successes", next(sns_colors), next(linestyles), "Cumulative Update Success Rate")
+        self._plotMetric(snapshots["totalUpdateFailureRate"], "cumulative_rate_update_failures", next(sns_colors), next(linestyles), "Cumulative Update Failure Rate")
 
         ## Discrete rates
-        self._plotMetric(self._snapshots_intervalOccupancyRate, "discrete_rate_occupancy", next(sns_colors), next(linestyles), "Discrete Occupancy Rate")
-        self._plotMetric(self._snapshots_intervalPacketsProcessedRate, "discrete_rate_packets_processed", next(sns_colors), next(linestyles), "Discrete Packets Processed Rate")
-        self._plotMetric(self._snapshots_intervalPacketsDroppedRate, "discrete_rate_packets_dropped", next(sns_colors), next(linestyles), "Discrete Packets Dropped Rate")
-        self._plotMetric(self._snapshots_intervalInsertAttemptRate, "discrete_rate_insert_attempts", next(sns_colors), next(linestyles), "Discrete Insertion Attempt Rate")
-        self._plotMetric(self._snapshots_intervalInsertSuccessRate, "discrete_rate_insert_successes", next(sns_colors), next(linestyles), "Discrete Insertion Success Rate")
-        self._plotMetric(self._snapshots_intervalInsertFailureRate, "discrete_rate_insert_failures", next(sns_colors), next(linestyles), "Discrete Insertion Failure Rate")
-        self._plotMetric(self._snapshots_intervalRecirculationRate, "discrete_rate_recirculations", next(sns_colors), next(linestyles), "Discrete Recirculation Rate")
-        self._plotMetric(self._snapshots_intervalEvictionRate, "discrete_rate_evictions", next(sns_colors), next(linestyles), "Discrete Eviction Rate")
-        self._plotMetric(self._snapshots_intervalUpdateAttemptRate, "discrete_rate_update_attempts", next(sns_colors), next(linestyles), "Discrete Update Attempt Rate")
-        self._plotMetric(self._snapshots_intervalUpdateSuccessRate, "discrete_rate_update_successes", next(sns_colors), next(linestyles), "Discrete Update Success Rate")
-        self._plotMetric(self._snapshots_intervalUpdateFailureRate, "discrete_rate_update_failures", next(sns_colors), next(linestyles), "Discrete Update Failure Rate")
+        self._plotMetric(snapshots["intervalOccupancyRate"], "discrete_rate_occupancy", next(sns_colors), next(linestyles), "Discrete Occupancy Rate")
+        self._plotMetric(snapshots["intervalPacketsProcessedRate"], "discrete_rate_packets_processed", next(sns_colors), next(linestyles), "Discrete Packets Processed Rate")
+        self._plotMetric(snapshots["intervalPacketsDroppedRate"], "discrete_rate_packets_dropped", next(sns_colors), next(linestyles), "Discrete Packets Dropped Rate")
+        self._plotMetric(snapshots["intervalInsertAttemptRate"], "discrete_rate_insert_attempts", next(sns_colors), next(linestyles), "Discrete Insertion Attempt Rate")
+        self._plotMetric(snapshots["intervalInsertSuccessRate"], "discrete_rate_insert_successes", next(sns_colors), next(linestyles), "Discrete Insertion Success Rate")
+        self._plotMetric(snapshots["intervalInsertFailureRate"], "discrete_rate_insert_failures", next(sns_colors), next(linestyles), "Discrete Insertion Failure Rate")
+        self._plotMetric(snapshots["intervalRecirculationRate"], "discrete_rate_recirculations", next(sns_colors), next(linestyles), "Discrete Recirculation Rate")
+        self._plotMetric(snapshots["intervalEvictionRate"], "discrete_rate_evictions", next(sns_colors), next(linestyles), "Discrete Eviction Rate")
+        self._plotMetric(snapshots["intervalUpdateAttemptRate"], "discrete_rate_update_attempts", next(sns_colors), next(linestyles), "Discrete Update Attempt Rate")
+        self._plotMetric(snapshots["intervalUpdateSuccessRate"], "discrete_rate_update_successes", next(sns_colors), next(linestyles), "Discrete Update Success Rate")
+        self._plotMetric(snapshots["intervalUpdateFailureRate"], "discrete_rate_update_failures", next(sns_colors), next(linestyles), "Discrete Update Failure Rate")
 
         ## Cumulative counts
-        self._plotMetric(self._snapshots_totalOccupancyCount, "cumulative_count_occupancy", next(sns_colors), next(linestyles), "Cumulative Occupancy Count")
-        self._plotMetric(self._snapshots_totalPacketsProcessedCount, "cumulative_count_packets_processed", next(sns_colors), next(linestyles), "Cumulative Packets Processed Count")
-        self._plotMetric(self._snapshots_totalPacketsDroppedCount, "cumulative_count_packets_dropped", next(sns_colors), next(linestyles), "Cumulative Packets Dropped Count")
-        self._plotMetric(self._snapshots_totalInsertAttemptCount, "cumulative_count_insert_attempts", next(sns_colors), next(linestyles), "Cumulative Insertion Attempt Count")
-        self._plotMetric(self._snapshots_totalInsertSuccessCount, "cumulative_count_insert_successes", next(sns_colors), next(linestyles), "Cumulative Insertion Success Count")
-        self._plotMetric(self._snapshots_totalInsertFailureCount, "cumulative_count_insert_failures", next(sns_colors), next(linestyles), "Cumulative Insertion Failure Count")
-        self._plotMetric(self._snapshots_totalRecirculationCount, "cumulative_count_recirculations", next(sns_colors), next(linestyles), "Cumulative Recirculation Count")
-        self._plotMetric(self._snapshots_totalEvictionCount, "cumulative_count_evictions", next(sns_colors), next(linestyles), "Cumulative Eviction Count")
-        self._plotMetric(self._snapshots_totalUpdateAttemptCount, "cumulative_count_update_attempts", next(sns_colors), next(linestyles), "Cumulative Update Attempt Count")
-        self._plotMetric(self._snapshots_totalUpdateSuccessCount, "cumulative_count_update_successes", next(sns_colors), next(linestyles), "Cumulative Update Success Count")
-        self._plotMetric(self._snapshots_totalUpdateFailureCount, "cumulative_count_update_failures", next(sns_colors), next(linestyles), "Cumulative Update Failure Count")
+        self._plotMetric(snapshots["totalOccupancyCount"], "cumulative_count_occupancy", next(sns_colors), next(linestyles), "Cumulative Occupancy Count")
+        self._plotMetric(snapshots["totalPacketsProcessedCount"], "cumulative_count_packets_processed", next(sns_colors), next(linestyles), "Cumulative Packets Processed Count")
+        self._plotMetric(snapshots["totalPacketsDroppedCount"], "cumulative_count_packets_dropped", next(sns_colors), next(linestyles), "Cumulative Packets Dropped Count")
+        self._plotMetric(snapshots["totalInsertAttemptCount"], "cumulative_count_insert_attempts", next(sns_colors), next(linestyles), "Cumulative Insertion Attempt Count")
+        self._plotMetric(snapshots["totalInsertSuccessCount"], "cumulative_count_insert_successes", next(sns_colors), next(linestyles), "Cumulative Insertion Success Count")
+        self._plotMetric(snapshots["totalInsertFailureCount"], "cumulative_count_insert_failures", next(sns_colors), next(linestyles), "Cumulative Insertion Failure Count")
+        self._plotMetric(snapshots["totalRecirculationCount"], "cumulative_count_recirculations", next(sns_colors), next(linestyles), "Cumulative Recirculation Count")
+        self._plotMetric(snapshots["totalEvictionCount"], "cumulative_count_evictions", next(sns_colors), next(linestyles), "Cumulative Eviction Count")
+        self._plotMetric(snapshots["totalUpdateAttemptCount"], "cumulative_count_update_attempts", next(sns_colors), next(linestyles), "Cumulative Update Attempt Count")
+        self._plotMetric(snapshots["totalUpdateSuccessCount"], "cumulative_count_update_successes", next(sns_colors), next(linestyles), "Cumulative Update Success Count")
+        self._plotMetric(snapshots["totalUpdateFailureCount"], "cumulative_count_update_failures", next(sns_colors), next(linestyles), "Cumulative Update Failure Count")
 
         ## Discrete counts
-        self._plotMetric(self._snapshots_intervalOccupancyCount, "discrete_count_occupancy", next(sns_colors), next(linestyles), "Discrete Occupancy Count")
-        self._plotMetric(self._snapshots_intervalPacketsProcessedCount, "discrete_count_packets_processed", next(sns_colors), next(linestyles), "Discrete Packets Processed Count")
-        self._plotMetric(self._snapshots_intervalPacketsDroppedCount, "discrete_count_packets_dropped", next(sns_colors), next(linestyles), "Discrete Packets Dropped Count")
-        self._plotMetric(self._snapshots_intervalInsertAttemptCount, "discrete_count_insert_attempts", next(sns_colors), next(linestyles), "Discrete Insertion Attempt Count")
-        self._plotMetric(self._snapshots_intervalInsertSuccessCount, "discrete_count_insert_successes", next(sns_colors), next(linestyles), "Discrete Insertion Success Count")
-        self._plotMetric(self._snapshots_intervalInsertFailureCount, "discrete_count_insert_failures", next(sns_colors), next(linestyles), "Discrete Insertion Failure Count")
-        self._plotMetric(self._snapshots_intervalRecirculationCount, "discrete_count_recirculations", next(sns_colors), next(linestyles), "Discrete Recirculation Count")
-        self._plotMetric(self._snapshots_intervalEvictionCount, "discrete_count_evictions", next(sns_colors), next(linestyles), "Discrete Eviction Count")
-        self._plotMetric(self._snapshots_intervalUpdateAttemptCount, "discrete_count_update_attempts", next(sns_colors), next(linestyles), "Discrete Update Attempt Count")
-        self._plotMetric(self._snapshots_intervalUpdateSuccessCount, "discrete_count_update_successes", next(sns_colors), next(linestyles), "Discrete Update Success Count")
-        self._plotMetric(self._snapshots_intervalUpdateFailureCount, "discrete_count_update_failures", next(sns_colors), next(linestyles), "Discrete Update Failure Count")
+        self._plotMetric(snapshots["intervalOccupancyCount"], "discrete_count_occupancy", next(sns_colors), next(linestyles), "Discrete Occupancy Count")
+        self._plotMetric(snapshots["intervalPacketsProcessedCount"], "discrete_count_packets_processed", next(sns_colors), next(linestyles), "Discrete Packets Processed Count")
+        self._plotMetric(snapshots["intervalPacketsDroppedCount"], "discrete_count_packets_dropped", next(sns_colors), next(linestyles), "Discrete Packets Dropped Count")
+        self._plotMetric(snapshots["intervalInsertAttemptCount"], "discrete_count_insert_attempts", next(sns_colors), next(linestyles), "Discrete Insertion Attempt Count")
+        self._plotMetric(snapshots["intervalInsertSuccessCount"], "discrete_count_insert_successes", next(sns_colors), next(linestyles), "Discrete Insertion Success Count")
+        self._plotMetric(snapshots["intervalInsertFailureCount"], "discrete_count_insert_failures", next(sns_colors), next(linestyles), "Discrete Insertion Failure Count")
+        self._plotMetric(snapshots["intervalRecirculationCount"], "discrete_count_recirculations", next(sns_colors), next(linestyles), "Discrete Recirculation Count")
+        self._plotMetric(snapshots["intervalEvictionCount"], "discrete_count_evictions", next(sns_colors), next(linestyles), "Discrete Eviction Count")
+        self._plotMetric(snapshots["intervalUpdateAttemptCount"], "discrete_count_update_attempts", next(sns_colors), next(linestyles), "Discrete Update Attempt Count")
+        self._plotMetric(snapshots["intervalUpdateSuccessCount"], "discrete_count_update_successes", next(sns_colors), next(linestyles), "Discrete Update Success Count")
+        self._plotMetric(snapshots["intervalUpdateFailureCount"], "discrete_count_update_failures", next(sns_colors), next(linestyles), "Discrete Update Failure Count")
         
         ## Distributions
-        dur_ms = [d/1000 for d in self._distribution_validEvictionDuration]
-        self._plotMetricCDF(dur_ms, "cdf_cumulative_valid_evictions_duration", next(sns_colors), next(linestyles), "Valid Evictions Duration CDF ({} Samples)")
-        dur_ms = [d/1000 for d in self._distribution_reinsertionDuration]
-        self._plotMetricCDF(dur_ms, "cdf_cumulative_reinsertion_duration", next(sns_colors), next(linestyles), "Reinsertions Duration CDF ({} Samples)")
+        self._plotMetricCDF(self._distribution_validEvictionDuration, "cdf_cumulative_valid_evictions_duration", next(sns_colors), next(linestyles), "Valid Evictions Duration CDF ({} Samples)")
+        self._plotMetricCDF(self._distribution_reinsertionDuration, "cdf_cumulative_reinsertion_duration", next(sns_colors), next(linestyles), "Reinsertions Duration CDF ({} Samples)")
         if self._tab_type == "packet":
-            dur_ms = [d/1000 for d in self._distribution_sampledEvictionDuration]
-            self._plotMetricCDF(dur_ms, "cdf_cumulative_sampled_evictions_duration", next(sns_colors), next(linestyles), "Sampled Evictions Duration CDF ({} Samples)")
+            self._plotMetricCDF(self._distribution_sampledEvictionDuration, "cdf_cumulative_sampled_evictions_duration", next(sns_colors), next(linestyles), "Sampled Evictions Duration CDF ({} Samples)")
 
         ## Plot custom combinations
         self._plotPacketFate()
@@ -1,12 +1,9 @@
 # from BitHash import BitHash, ResetBitHash
 from CuckooHashTable import CuckooHashTable
+from ArrayStorage import FIELD_KEY, FIELD_INTERVAL, FIELD_TIME, FIELD_FLAGS
 from SynTable import SynTable
 from datetime import datetime, timedelta
 from random import randint
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 from zlib import crc32
@@ -20,6 +17,10 @@ MAX_SEQNUM = 2**32
 
 class ApproxFlowTable(CuckooHashTable):
 
+    ## Record: (flow_key, (lo, hi), entry_tstamp, update_tstamp, entry_flags, update_flags)
+    _recordSchema       = (FIELD_KEY, FIELD_INTERVAL, FIELD_TIME, FIELD_TIME, FIELD_FLAGS, FIELD_FLAGS)
+    _recordUpdateFields = (1, 3, 5)
+
     ##################################################
 
     def __init__(self, approx_flowtab_params, test=True):
@@ -135,10 +136,11 @@ class ApproxFlowTable(CuckooHashTable):
             self._custom_print("\nAFT:: Insert into or update Approx. Flow Table")
 
         if self.accountant._firstEntryTime is None:
-            self.accountant._firstEntryTime = timestamp
+            self.accountant.setFirstEntryTime(timestamp)
 
         ## Create snapshot (if interval is complete)
-        self.accountant.createSnapshot(timestamp)
+        if self.accountant._snapshotDue:
+            self.accountant.createSnapshot(timestamp)
         
         return self._insert_or_update(record, timestamp)
 
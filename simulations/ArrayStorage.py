@@ -0,0 +1,192 @@
+from array import array
+
+##################################################
+
+## Sentinel for None in integer columns
+NONE_VALUE = -2**63
+
+## Field kinds understood by ArrayStage
+FIELD_KEY      = "key"       # Tuple of ints (packed flow/packet key)
+FIELD_INTERVAL = "interval"  # (lo, hi) tuple of ints
+FIELD_TIME     = "time"      # Timestamp in integer microseconds, stored relative to the table's first timestamp
+FIELD_FLAGS    = "flags"     # Small set of hashable values (TCP flag bitmasks), stored as codes
+FIELD_INT      = "int"
+
+##################################################
+
+class TimeCodec(object):
+    ''' Maps timestamps to int64 microsecond offsets; shared by all stages of a table '''
+
+    ##################################################
+
+    def __init__(self):
+        self._reference = None
+
+    ##################################################
+
+    def encode(self, tstamp):
+        if tstamp is None:
+            return NONE_VALUE
+        if self._reference is None:
+            self._reference = tstamp
+        return tstamp - self._reference
+
+    ##################################################
+
+    def decode(self, value):
+        if value == NONE_VALUE:
+            return None
+        return self._reference + value
+
+##################################################
+
+class ValueCodec(object):
+    ''' Interns a small set of values (e.g. flag strings) as codes; code 0 is None '''
+
+    ##################################################
+
+    def __init__(self):
+        self._values = [None]
+        self._codes  = {None: 0}
+
+    ##################################################
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    ##################################################
+
+    def decode(self, code):
+        return self._values[code]
+
+##################################################
+
+class ArrayStage(object):
+    ''' One stage of a cuckoo hash table with one preallocated column per record field;
+        indexing returns/accepts record tuples, so it can stand in for a list of tuples '''
+
+    ##################################################
+
+    def __init__(self, size, schema, time_codec, value_codec):
+
+        self._size        = size
+        self._schema      = schema
+        self._time_codec  = time_codec
+        self._value_codec = value_codec
+        self._key_arity   = None
+
+        self._used    = array("b", [0]) * size
+        self._columns = []
+        for kind in schema:
+            if kind == FIELD_KEY:
+                ## Allocated on first insertion, once the key width is known
+                self._columns.append(None)
+            elif kind == FIELD_INTERVAL:
+                self._columns.append((array("q", [NONE_VALUE]) * size, array("q", [NONE_VALUE]) * size))
+            elif kind == FIELD_FLAGS:
+                self._columns.append(array("H", [0]) * size)
+            elif kind in (FIELD_TIME, FIELD_INT):
+                self._columns.append(array("q", [NONE_VALUE]) * size)
+            else:
+                raise Exception("Unknown record field kind: {}".format(kind))
+
+    ##################################################
+
+    def __len__(self):
+        return self._size
+
+    ##################################################
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    ##################################################
+
+    def _readField(self, field, index):
+
+        kind   = self._schema[field]
+        column = self._columns[field]
+
+        if kind == FIELD_KEY:
+            return tuple([key_column[index] for key_column in column])
+        elif kind == FIELD_INTERVAL:
+            lo, hi = column[0][index], column[1][index]
+            if lo == NONE_VALUE:
+                return None
+            return (lo, hi)
+        elif kind == FIELD_TIME:
+            return self._time_codec.decode(column[index])
+        elif kind == FIELD_FLAGS:
+            return self._value_codec.decode(column[index])
+        else:
+            value = column[index]
+            return None if value == NONE_VALUE else value
+
+    ##################################################
+
+    def _writeField(self, field, index, value):
+
+        kind   = self._schema[field]
+        column = self._columns[field]
+
+        if kind == FIELD_KEY:
+            if column is None:
+                self._key_arity = len(value)
+                column = self._columns[field] = [array("q", [0]) * self._size for _ in range(self._key_arity)]
+            elif len(value) != self._key_arity:
+                raise Exception("Key width changed from {} to {}: {}".format(self._key_arity, len(value), value))
+            for key_column, key_value in zip(column, value):
+                key_column[index] = key_value
+        elif kind == FIELD_INTERVAL:
+            if value is None:
+                column[0][index], column[1][index] = NONE_VALUE, NONE_VALUE
+            else:
+                column[0][index], column[1][index] = value
+        elif kind == FIELD_TIME:
+            column[index] = self._time_codec.encode(value)
+        elif kind == FIELD_FLAGS:
+            column[index] = self._value_codec.encode(value)
+        else:
+            column[index] = NONE_VALUE if value is None else value
+
+    ##################################################
+
+    def __getitem__(self, index):
+
+        if not self._used[index]:
+            return None
+
+        return tuple([self._readField(field, index) for field in range(len(self._schema))])
+
+    ##################################################
+
+    def __setitem__(self, index, record):
+
+        if record is None:
+            self._used[index] = 0
+            return
+
+        for field in range(len(self._schema)):
+            self._writeField(field, index, record[field])
+        self._used[index] = 1
+
+    ##################################################
+
+    def keyAt(self, index):
+        if not self._used[index]:
+            return None
+        return self._readField(0, index)
+
+    ##################################################
+
+    def updateFields(self, index, new_record, fields):
+        ## Overwrite only the given fields in place
+        for field in fields:
+            self._writeField(field, index, new_record[field])
+
+##################################################
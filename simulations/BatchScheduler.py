@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+import subprocess
+import time
+import os
+
+##################################################
+
+class BatchScheduler(object):
+    ''' Runs simulation commands as child processes on a bounded pool of worker slots.
+        Each slot is pinned to one usable CPU; the number of slots is further capped by an optional memory budget. '''
+
+    ##################################################
+
+    def __init__(self, sched_params, log_file):
+
+        self._log_file         = log_file
+        self._usable_cpus      = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self._max_workers      = sched_params.get("max_workers", None)
+        self._memory_budget_mb = sched_params.get("memory_budget_mb", None)
+        self._round_memory_mb  = sched_params.get("round_memory_mb", None)
+        self._enforce_memory   = sched_params.get("enforce_round_memory", False) # Kill (and retry) rounds whose RSS exceeds round_memory_mb
+        self._timeout          = sched_params.get("timeout", None)         # in secs, per attempt
+        self._retries          = sched_params.get("retries", 0)
+        self._progress_secs    = sched_params.get("progress_interval", 30) # in secs
+        self._poll_secs        = sched_params.get("poll_interval", 0.5)    # in secs
+        self._pin_cpus         = sched_params.get("pin_cpus", True)
+
+        ## Bound the number of concurrent rounds
+        num_workers = len(self._usable_cpus)
+        if self._max_workers is not None:
+            num_workers = min(num_workers, self._max_workers)
+        if self._memory_budget_mb is not None:
+            if self._round_memory_mb is None:
+                raise Exception("A memory budget needs round_memory_mb, the expected peak memory of one round")
+            num_workers = min(num_workers, int(self._memory_budget_mb // self._round_memory_mb))
+        if self._enforce_memory and self._round_memory_mb is None:
+            raise Exception("Enforcing the round memory needs round_memory_mb")
+        if num_workers < 1:
+            raise Exception("Scheduler parameters leave no worker slot: {}".format(sched_params))
+
+        self._num_workers = num_workers
+        self._free_cpus   = self._usable_cpus[:num_workers]
+
+    ##################################################
+
+    def _custom_print(self, text, flush=True):
+        print(text, flush=flush)
+
+    ##################################################
+
+    def _start(self, job, cpu):
+
+        ## No address-space limit: it would count the memory-mapped trace and reserved (not resident) memory; see _rss_mb
+        def preexec():
+            if self._pin_cpus and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, {cpu})
+
+        log_fp = open(self._log_file, "a")
+        proc = subprocess.Popen(job["command"], stdout=log_fp, stderr=subprocess.STDOUT, preexec_fn=preexec)
+        log_fp.close()
+
+        job["attempts"] += 1
+        job["started"]   = time.time()
+        job["cpu"]       = cpu
+        job["proc"]      = proc
+
+    ##################################################
+
+    def _rss_mb(self, proc):
+        ## Resident memory of a round's process (MB), None once it is gone
+
+        try:
+            with open("/proc/{}/status".format(proc.pid)) as fp:
+                for line in fp:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+
+        return None
+
+    ##################################################
+
+    def _print_progress(self, jobs, running, t_start):
+
+        num_done   = len([job for job in jobs if job["status"] == "done"])
+        num_failed = len([job for job in jobs if job["status"] == "failed"])
+        num_queued = len([job for job in jobs if job["status"] == "queued"])
+        elapsed    = round((datetime.now() - t_start)/timedelta(minutes=1), 2)
+        self._custom_print("Scheduler: {}/{} done, {} running, {} queued, {} failed; time elapsed: {} mins.".format(
+                            num_done, len(jobs), len(running), num_queued, num_failed, elapsed))
+
+    ##################################################
+
+    def run(self, commands):
+        ## commands: list of (label, argv); returns {label: "done" | "failed"}
+
+        t_start = datetime.now()
+        jobs    = [{"label": label, "command": command, "status": "queued", "attempts": 0} for label, command in commands]
+        queue   = list(jobs)
+        running = []
+
+        self._custom_print("Scheduler: {} simulations on {} worker slots (usable CPUs: {})".format(len(jobs), self._num_workers, len(self._usable_cpus)))
+
+        last_progress = time.time()
+        try:
+            self._schedule(jobs, queue, running, t_start, last_progress)
+        finally:
+            ## Do not leave orphaned rounds behind (e.g., on KeyboardInterrupt)
+            for job in running:
+                job["proc"].kill()
+
+        self._print_progress(jobs, running, t_start)
+
+        return {job["label"]: job["status"] for job in jobs}
+
+    ##################################################
+
+    def _schedule(self, jobs, queue, running, t_start, last_progress):
+
+        while queue or running:
+
+            ## Fill free slots
+            while queue and self._free_cpus:
+                job = queue.pop(0)
+                job["status"] = "running"
+                self._start(job, self._free_cpus.pop(0))
+                running.append(job)
+
+            time.sleep(self._poll_secs)
+
+            for job in list(running):
+                return_code = job["proc"].poll()
+                timed_out   = return_code is None and self._timeout is not None and time.time() - job["started"] > self._timeout
+                rss_mb      = self._rss_mb(job["proc"]) if return_code is None and self._enforce_memory else None
+                over_memory = rss_mb is not None and rss_mb > self._round_memory_mb
+                if return_code is None and not timed_out and not over_memory:
+                    continue
+
+                if timed_out or over_memory:
+                    job["proc"].kill()
+                    job["proc"].wait()
+                    if timed_out:
+                        self._custom_print("Scheduler: {} timed out after {} secs (attempt {})".format(job["label"], self._timeout, job["attempts"]))
+                    else:
+                        self._custom_print("Scheduler: {} exceeded {} MB of resident memory ({} MB; attempt {})".format(
+                                            job["label"], self._round_memory_mb, round(rss_mb), job["attempts"]))
+                elif return_code != 0:
+                    self._custom_print("Scheduler: {} exited with code {} (attempt {})".format(job["label"], return_code, job["attempts"]))
+
+                running.remove(job)
+                self._free_cpus.append(job["cpu"])
+
+                if return_code == 0 and not timed_out and not over_memory:
+                    job["status"] = "done"
+                elif job["attempts"] <= self._retries:
+                    job["status"] = "queued"
+                    queue.append(job)
+                else:
+                    job["status"] = "failed"
+
+            if time.time() - last_progress >= self._progress_secs:
+                self._print_progress(jobs, running, t_start)
+                last_progress = time.time()
+
+##################################################
@@ -0,0 +1,389 @@
+from ipaddress import IPv4Address
+from datetime import datetime, timedelta
+from collections import namedtuple
+import numpy as np
+import pickle
+import json
+import os
+
+##################################################
+
+TRACE_FORMAT       = "columnar_trace"
+TRACE_VERSION      = 1
+TRACE_META_FILE    = "trace_meta.json"
+DEFAULT_CHUNK_SIZE = 65536
+
+## Column name -> dtype; one raw little-endian file per column
+TRACE_COLUMNS = [
+                    ("ts_us",    "<i8"),  # Microseconds since the epoch
+                    ("ipsrc",    "<u4"),  # Packed IPv4 source address
+                    ("ipdst",    "<u4"),  # Packed IPv4 destination address
+                    ("tcpsrc",   "<u2"),
+                    ("tcpdst",   "<u2"),
+                    ("tcpflags", "u1"),   # Bitmask, see TCP_* below
+                    ("seqno",    "<u4"),
+                    ("ackno",    "<u4"),
+                    ("pktsize",  "<u4"),  # TCP payload length
+                ]
+
+## TCP flag bits (same positions as in the TCP header)
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+
+## Traffic direction labels (bitmask): which of the SEQ/ACK handlers a packet goes through
+DIRECTION_NONE = 0x00
+DIRECTION_SEQ  = 0x01
+DIRECTION_ACK  = 0x02
+DIRECTION_BOTH = DIRECTION_SEQ | DIRECTION_ACK
+
+## Flags string layout used by preprocess_trace.get_flags(): "--UAPRSF"
+_FLAG_POSITIONS = [(2, "U", TCP_URG), (3, "A", TCP_ACK), (4, "P", TCP_PSH), (5, "R", TCP_RST), (6, "S", TCP_SYN), (7, "F", TCP_FIN)]
+
+##################################################
+
+def flags_str_to_mask(flags_str):
+
+    mask = 0
+    for position, letter, bit in _FLAG_POSITIONS:
+        if flags_str[position] == letter:
+            mask |= bit
+
+    return mask
+
+##################################################
+
+def flags_mask_to_str(mask):
+
+    flags_str = list("--------")
+    for position, letter, bit in _FLAG_POSITIONS:
+        if mask & bit:
+            flags_str[position] = letter
+
+    return "".join(flags_str)
+
+##################################################
+
+_FLAGS_STRINGS = [flags_mask_to_str(mask) for mask in range(64)]
+_FLAGS_MASKS   = {}
+
+##################################################
+
+## Packet as seen by the simulation: timestamp is in integer microseconds since the epoch, tcpflags is a TCP_* bitmask,
+## IPv4 addresses are packed ints, direction is a DIRECTION_* label (both directions unless the trace is filtered)
+Packet = namedtuple("Packet", ["pktno", "timestamp", "ipsrc", "ipdst", "tcpsrc", "tcpdst", "tcpflags", "seqno", "ackno", "pktsize", "direction"],
+                    defaults=[DIRECTION_BOTH])
+
+##################################################
+
+def packet_from_record(record, packed_addresses=True):
+    ## record: preprocess_trace pickle layout; the few distinct flags strings are encoded once
+    ## and the timestamp becomes integer microseconds since the epoch
+
+    flags_str = record[6]
+    tcpflags = _FLAGS_MASKS.get(flags_str)
+    if tcpflags is None:
+        tcpflags = _FLAGS_MASKS[flags_str] = flags_str_to_mask(flags_str)
+
+    tstamp = record[1]
+    if isinstance(tstamp, datetime):
+        tstamp = datetime_to_epoch_us(tstamp)
+
+    if packed_addresses:
+        return Packet(record[0], tstamp, int(record[2]), int(record[3]), record[4], record[5], tcpflags, record[7], record[8], record[9])
+    else:
+        return Packet(record[0], tstamp, record[2], record[3], record[4], record[5], tcpflags, record[7], record[8], record[9])
+
+##################################################
+
+def datetime_to_epoch_us(tstamp):
+    ## Inverse of datetime.fromtimestamp(sec) + timedelta(microseconds=us) as done in preprocess_trace
+    return int(tstamp.replace(microsecond=0).timestamp()) * 1000000 + tstamp.microsecond
+
+##################################################
+
+def epoch_us_to_datetime(ts_us):
+    ## Human-readable time of an integer-microsecond timestamp, only needed when reporting
+    sec, usec = divmod(ts_us, 1000000)
+    return datetime.fromtimestamp(sec) + timedelta(microseconds=usec)
+
+##################################################
+
+def is_columnar_trace(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, TRACE_META_FILE))
+
+##################################################
+
+class ColumnarTraceWriter(object):
+
+    ##################################################
+
+    def __init__(self, trace_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+
+        self._trace_dir  = trace_dir
+        self._chunk_size = chunk_size
+        self._count      = 0
+        self._buffers    = {name: [] for name, _ in TRACE_COLUMNS}
+
+        if not os.path.exists(self._trace_dir):
+            os.makedirs(self._trace_dir)
+
+        ## Truncate column files
+        self._column_paths = {}
+        for name, _ in TRACE_COLUMNS:
+            self._column_paths[name] = os.path.join(self._trace_dir, name + ".bin")
+            with open(self._column_paths[name], "wb"):
+                pass
+
+    ##################################################
+
+    def append(self, ts_us, ipsrc, ipdst, tcpsrc, tcpdst, tcpflags, seqno, ackno, pktsize):
+
+        self._buffers["ts_us"].append(ts_us)
+        self._buffers["ipsrc"].append(ipsrc)
+        self._buffers["ipdst"].append(ipdst)
+        self._buffers["tcpsrc"].append(tcpsrc)
+        self._buffers["tcpdst"].append(tcpdst)
+        self._buffers["tcpflags"].append(tcpflags)
+        self._buffers["seqno"].append(seqno)
+        self._buffers["ackno"].append(ackno)
+        self._buffers["pktsize"].append(pktsize)
+        self._count += 1
+
+        if len(self._buffers["ts_us"]) >= self._chunk_size:
+            self._flush()
+
+    ##################################################
+
+    def append_record(self, record):
+        ## Append a record in the preprocess_trace pickle layout
+        _, pkt_time, src_ip, dst_ip, src_port, dst_port, tcp_flgs, seq_num, ack_num, tcp_len = record
+        self.append(datetime_to_epoch_us(pkt_time), int(src_ip), int(dst_ip), src_port, dst_port,
+                    flags_str_to_mask(tcp_flgs), seq_num, ack_num, tcp_len)
+
+    ##################################################
+
+    def append_columns(self, columns):
+        ## Append whole arrays at once (all columns must have the same length)
+        self._flush()
+        count = len(columns["ts_us"])
+        for name, dtype in TRACE_COLUMNS:
+            with open(self._column_paths[name], "ab") as fp:
+                fp.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        self._count += count
+
+    ##################################################
+
+    def _flush(self):
+
+        if len(self._buffers["ts_us"]) == 0:
+            return
+
+        for name, dtype in TRACE_COLUMNS:
+            with open(self._column_paths[name], "ab") as fp:
+                fp.write(np.asarray(self._buffers[name], dtype=dtype).tobytes())
+            self._buffers[name] = []
+
+    ##################################################
+
+    def close(self):
+
+        self._flush()
+
+        meta = {
+                    "format": TRACE_FORMAT,
+                    "version": TRACE_VERSION,
+                    "count": self._count,
+                    "chunk_size": self._chunk_size,
+                    "columns": [[name, dtype] for name, dtype in TRACE_COLUMNS],
+                }
+        meta_path = os.path.join(self._trace_dir, TRACE_META_FILE)
+        with open(meta_path + ".tmp", "w") as fp:
+            json.dump(meta, fp, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        return self._count
+
+##################################################
+
+class ColumnarTrace(object):
+
+    ##################################################
+
+    def __init__(self, trace_dir):
+
+        self._trace_dir = trace_dir
+
+        with open(os.path.join(self._trace_dir, TRACE_META_FILE)) as fp:
+            self._meta = json.load(fp)
+        if self._meta.get("format") != TRACE_FORMAT:
+            raise Exception("Not a columnar trace: {}".format(self._trace_dir))
+
+        self._count      = self._meta["count"]
+        self._chunk_size = self._meta.get("chunk_size", DEFAULT_CHUNK_SIZE)
+
+        ## Memory-map every column read-only; pages are shared between processes mapping the same trace
+        self._columns = {}
+        for name, dtype in self._meta["columns"]:
+            column_path = os.path.join(self._trace_dir, name + ".bin")
+            if self._count == 0:
+                self._columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(column_path, dtype=dtype, mode="r", shape=(self._count,))
+
+    ##################################################
+
+    def __len__(self):
+        return self._count
+
+    ##################################################
+
+    def column(self, name):
+        return self._columns[name]
+
+    ##################################################
+
+    def has_column(self, name):
+        return name in self._columns
+
+    ##################################################
+
+    def add_column(self, name, dtype, chunks):
+        ## Adds a derived column (e.g., direction labels), written chunk by chunk; chunks: arrays in trace order
+
+        count = 0
+        column_path = os.path.join(self._trace_dir, name + ".bin")
+        with open(column_path, "wb") as fp:
+            for values in chunks:
+                fp.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+                count += len(values)
+        if count != self._count:
+            raise Exception("Column {} has {} values, trace has {} packets".format(name, count, self._count))
+
+        self._meta["columns"] = [[n, d] for n, d in self._meta["columns"] if n != name] + [[name, dtype]]
+        meta_path = os.path.join(self._trace_dir, TRACE_META_FILE)
+        with open(meta_path + ".tmp", "w") as fp:
+            json.dump(self._meta, fp, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        if self._count == 0:
+            self._columns[name] = np.zeros(0, dtype=dtype)
+        else:
+            self._columns[name] = np.memmap(column_path, dtype=dtype, mode="r", shape=(self._count,))
+
+    ##################################################
+
+    def iter_chunks(self, chunk_size=None):
+        ## Yields (offset, {column: array slice}); slices are views into the memory map
+
+        if chunk_size is None:
+            chunk_size = self._chunk_size
+
+        for offset in range(0, self._count, chunk_size):
+            end = min(self._count, offset + chunk_size)
+            yield offset, {name: self._columns[name][offset:end] for name in self._columns}
+
+    ##################################################
+
+    def iter_records(self, chunk_size=None, packed_addresses=False):
+        ## Yields records in the preprocess_trace pickle layout, decoding one chunk at a time
+        return iter_columns_as_records(self.iter_chunks(chunk_size), packed_addresses)
+
+    ##################################################
+
+    def iter_packets(self, chunk_size=None):
+        ## Yields Packet records, decoding one chunk at a time
+        return iter_columns_as_packets(self.iter_chunks(chunk_size))
+
+##################################################
+
+def iter_columns_as_records(chunks, packed_addresses=False):
+    ## chunks: iterable of (offset, {column: array}); yields records in the preprocess_trace pickle layout
+    ## With packed_addresses, IPv4 addresses are yielded as ints instead of IPv4Address objects
+
+    addresses  = {}
+    last_sec   = None
+    last_sec_t = None
+
+    for offset, chunk in chunks:
+
+        ts_us    = chunk["ts_us"].tolist()
+        ipsrc    = chunk["ipsrc"].tolist()
+        ipdst    = chunk["ipdst"].tolist()
+        tcpsrc   = chunk["tcpsrc"].tolist()
+        tcpdst   = chunk["tcpdst"].tolist()
+        tcpflags = chunk["tcpflags"].tolist()
+        seqno    = chunk["seqno"].tolist()
+        ackno    = chunk["ackno"].tolist()
+        pktsize  = chunk["pktsize"].tolist()
+
+        for i in range(len(ts_us)):
+
+            sec, usec = divmod(ts_us[i], 1000000)
+            if sec != last_sec:
+                last_sec   = sec
+                last_sec_t = datetime.fromtimestamp(sec)
+            pkt_time = last_sec_t + timedelta(microseconds=usec)
+
+            if packed_addresses:
+                src_ip = ipsrc[i]
+                dst_ip = ipdst[i]
+            else:
+                src_ip = addresses.get(ipsrc[i])
+                if src_ip is None:
+                    src_ip = addresses[ipsrc[i]] = IPv4Address(ipsrc[i])
+                dst_ip = addresses.get(ipdst[i])
+                if dst_ip is None:
+                    dst_ip = addresses[ipdst[i]] = IPv4Address(ipdst[i])
+
+            yield (offset + i, pkt_time, src_ip, dst_ip, tcpsrc[i], tcpdst[i],
+                    _FLAGS_STRINGS[tcpflags[i] & 0x3f], seqno[i], ackno[i], pktsize[i])
+
+##################################################
+
+def iter_columns_as_packets(chunks):
+    ## chunks: iterable of (offset, {column: array}); yields Packet records without building flags strings or datetimes
+    ## If a chunk has a "direction" column, packets labelled DIRECTION_NONE are skipped without being built
+
+    for offset, chunk in chunks:
+
+        if "direction" in chunk:
+            index     = np.flatnonzero(chunk["direction"])
+            chunk     = {name: column[index] for name, column in chunk.items()}
+            pktno     = (index + offset).tolist()
+            direction = chunk["direction"].tolist()
+        else:
+            pktno     = range(offset, offset + len(chunk["ts_us"]))
+            direction = [DIRECTION_BOTH] * len(chunk["ts_us"])
+
+        ts_us    = chunk["ts_us"].tolist()
+        ipsrc    = chunk["ipsrc"].tolist()
+        ipdst    = chunk["ipdst"].tolist()
+        tcpsrc   = chunk["tcpsrc"].tolist()
+        tcpdst   = chunk["tcpdst"].tolist()
+        tcpflags = (chunk["tcpflags"] & 0x3f).tolist()
+        seqno    = chunk["seqno"].tolist()
+        ackno    = chunk["ackno"].tolist()
+        pktsize  = chunk["pktsize"].tolist()
+
+        for i in range(len(ts_us)):
+            yield Packet(pktno[i], ts_us[i], ipsrc[i], ipdst[i], tcpsrc[i], tcpdst[i],
+                            tcpflags[i], seqno[i], ackno[i], pktsize[i], direction[i])
+
+##################################################
+
+def convert_pickle_to_columnar(pickle_path, trace_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+
+    with open(pickle_path, "rb") as fp:
+        packets = pickle.load(fp)
+
+    writer = ColumnarTraceWriter(trace_dir, chunk_size)
+    for record in packets:
+        writer.append_record(record)
+
+    return writer.close()
+
+##################################################
@@ -1,13 +1,11 @@
 # from BitHash import BitHash, ResetBitHash
 from Accountant import Accountant
+from ArrayStorage import ArrayStage, TimeCodec, ValueCodec
+from ColumnarTrace import TCP_SYN, epoch_us_to_datetime
 from datetime import datetime, timedelta
 from ipaddress import IPv4Address
 from random import randint
 from copy import deepcopy
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 from zlib import crc32
@@ -19,10 +17,59 @@ import math
 MAX_SEQNUM = 2**32
 MILLION    = 1000000
 
+## Stage hashes per key, shared by all tables of a simulation (FT and AFT hash the same flow keys)
+STAGE_HASH_CACHE_LIMIT = 1 << 20
+_stage_hash_cache      = {}
+_address_strings       = {}
+
+##################################################
+
+def _keyToHashString(key):
+    ## Keys are (ipsrc, ipdst, ...) with addresses packed as ints; hash their dotted-quad form as before
+
+    ipsrc, ipdst = key[0], key[1]
+
+    ipsrc_str = _address_strings.get(ipsrc)
+    if ipsrc_str is None:
+        ipsrc_str = _address_strings[ipsrc] = str(IPv4Address(ipsrc))
+    ipdst_str = _address_strings.get(ipdst)
+    if ipdst_str is None:
+        ipdst_str = _address_strings[ipdst] = str(IPv4Address(ipdst))
+
+    return (ipsrc_str + ipdst_str + "".join([str(i) for i in key[2:]])).encode()
+
+##################################################
+
+def computeStageHashes(key, num_stages):
+    ## Returns the chained crc32 of the key for stages 0..num_stages-1, computed once per key
+
+    stage_hashes = _stage_hash_cache.get(key)
+    if stage_hashes is not None and len(stage_hashes) >= num_stages:
+        return stage_hashes
+
+    hash_key     = _keyToHashString(key)
+    running_hash = crc32(hash_key)
+    stage_hashes = [running_hash]
+    for _ in range(1, num_stages):
+        running_hash = crc32(hash_key, running_hash)
+        stage_hashes.append(running_hash)
+
+    if len(_stage_hash_cache) >= STAGE_HASH_CACHE_LIMIT:
+        _stage_hash_cache.clear()
+    if len(_address_strings) >= STAGE_HASH_CACHE_LIMIT:
+        _address_strings.clear()
+    _stage_hash_cache[key] = stage_hashes
+
+    return stage_hashes
+
 ##################################################
 
 class CuckooHashTable(object):
 
+    ## Field kinds of a record (see ArrayStorage) and the fields an update overwrites; set by subclasses
+    _recordSchema       = None
+    _recordUpdateFields = None
+
     ##################################################
 
     def __init__(self, tab_type, tab_params, test=True):
@@ -100,10 +147,25 @@ class CuckooHashTable(object):
         if False:
             self._custom_print("Round {}/{}: RECHECK:: Max size: {}, No. of stages: {}, Stage size: {}, Recirculations: {}".format(
             self._round_number, self._max_round_number, self._maxSize, self._numStages, self._stageSize, self._recirculations))
+        # Set storage backend (tuple/array)
+        self._storageBackend = tab_params.get("storage_backend", "tuple")
+        if self._storageBackend not in ["tuple", "array"]:
+            self._custom_print("Round {}/{}: Invalid option for storage backend, reset to tuple".format(self._round_number, self._max_round_number))
+            self._storageBackend = "tuple"
+        if self._storageBackend == "array" and self._recordSchema is None:
+            self._custom_print("Round {}/{}: No record schema for {} table, reset storage backend to tuple".format(
+                                self._round_number, self._max_round_number, self._tab_type))
+            self._storageBackend = "tuple"
+
         self._numRecords = 0
         self._hashArrays = []
-        for _ in range(self._numStages):
-            self._hashArrays.append([None] * self._stageSize)
+        if self._storageBackend == "array":
+            time_codec, value_codec = TimeCodec(), ValueCodec()
+            for _ in range(self._numStages):
+                self._hashArrays.append(ArrayStage(self._stageSize, self._recordSchema, time_codec, value_codec))
+        else:
+            for _ in range(self._numStages):
+                self._hashArrays.append([None] * self._stageSize)
 
         ## Logging
         self.accountant = Accountant(self._tab_type, tab_params, test=self._test)
@@ -143,24 +205,17 @@ class CuckooHashTable(object):
     ##################################################
 
     def _computeNthStageIndex(self, key, n):
-
-        hash_key = "".join([str(i) for i in key]).encode()
-        running_hash = crc32(hash_key)
-
-        for _ in range(n):
-            running_hash = crc32(hash_key, running_hash)
-        
-        return running_hash
+        return computeStageHashes(key, max(n + 1, self._numStages))[n]
     
     ##################################################
 
     def _getDurationMillisec(self, current_tstamp, record_tstamp):
-        return round((current_tstamp - record_tstamp)/timedelta(milliseconds=1), 3)
+        return round((current_tstamp - record_tstamp)/1000, 3)
 
     ##################################################
 
     def _getDurationMicrosec(self, current_tstamp, record_tstamp):
-        return int((current_tstamp - record_tstamp)/timedelta(microseconds=1))
+        return current_tstamp - record_tstamp
 
     ##################################################
 
@@ -192,7 +247,7 @@ class CuckooHashTable(object):
             self._accountForEviction(current_tstamp, record_update_tstamp, record_entry_tstamp, source="timeout")
             if self._test:
                 self._custom_print("Should be evicted due to timeout; Update time: {}, Current time: {}, Delta: {} ms, Timeout: {} ms".format(
-                                        record_update_tstamp, current_tstamp, duration/1000, timeout))
+                                        epoch_us_to_datetime(record_update_tstamp), epoch_us_to_datetime(current_tstamp), duration/1000, timeout))
             return True
         
         return False
@@ -205,12 +260,12 @@ class CuckooHashTable(object):
     ##################################################
 
     def _hasSYNTimeoutExpired(self, flags, current_tstamp, record_update_tstamp, record_entry_tstamp=None):
-        return "S" in flags and self._synAction == "timeout" and self._hasCustomTimeoutExpired(self._synTimeout_entryTimeout, current_tstamp, record_update_tstamp, record_entry_tstamp)
+        return flags & TCP_SYN and self._synAction == "timeout" and self._hasCustomTimeoutExpired(self._synTimeout_entryTimeout, current_tstamp, record_update_tstamp, record_entry_tstamp)
 
     ##################################################
 
     def _retrieveRecordByKey(self, lookup_key, stage):
-        index = self._computeNthStageIndex(lookup_key, stage) % self._stageSize
+        index = computeStageHashes(lookup_key, self._numStages)[stage] % self._stageSize
         record = self._hashArrays[stage][index]
         return record
 
@@ -247,8 +302,9 @@ class CuckooHashTable(object):
 
         if self._test_lookup: self._custom_print("Lookup:: Lookup key is: {}".format(lookup_key))
 
+        stage_hashes = computeStageHashes(lookup_key, self._numStages)
         for stage in range(self._numStages):
-            index = self._computeNthStageIndex(lookup_key, stage) % self._stageSize
+            index = stage_hashes[stage] % self._stageSize
             record = self._hashArrays[stage][index]
             if self._test_lookup: self._custom_print("Lookup:: Record retrieved from stage {}, index {} is: {}".format(stage, index, record))
             if record is not None:
@@ -302,10 +358,12 @@ class CuckooHashTable(object):
     def delete(self, lookup_key, current_tstamp):
 
         ## Create snapshot (if interval is complete)
-        self.accountant.createSnapshot(current_tstamp)
+        if self.accountant._snapshotDue:
+            self.accountant.createSnapshot(current_tstamp)
 
+        stage_hashes = computeStageHashes(lookup_key, self._numStages)
         for stage in range(self._numStages):
-            index = self._computeNthStageIndex(lookup_key, stage) % self._stageSize
+            index = stage_hashes[stage] % self._stageSize
             record = self._hashArrays[stage][index]
             if record is not None:
                 record_key = record[0]
@@ -324,15 +382,20 @@ class CuckooHashTable(object):
     def update(self, lookup_key, new_record, current_tstamp):
 
         ## Create snapshot (if interval is complete)
-        self.accountant.createSnapshot(current_tstamp)
+        if self.accountant._snapshotDue:
+            self.accountant.createSnapshot(current_tstamp)
 
+        stage_hashes = computeStageHashes(lookup_key, self._numStages)
         for stage in range(self._numStages):
-            index = self._computeNthStageIndex(lookup_key, stage) % self._stageSize
+            index = stage_hashes[stage] % self._stageSize
             record = self._hashArrays[stage][index]
             if record is not None:
                 record_key = record[0]
                 if record_key == lookup_key:
-                    self._hashArrays[stage][index] = self._constructUpdatedRecord(record, new_record)
+                    if self._storageBackend == "array":
+                        self._hashArrays[stage].updateFields(index, new_record, self._recordUpdateFields)
+                    else:
+                        self._hashArrays[stage][index] = self._constructUpdatedRecord(record, new_record)
                     return True
                     
         return False
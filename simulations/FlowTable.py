@@ -1,12 +1,10 @@
 # from BitHash import BitHash, ResetBitHash
 from CuckooHashTable import CuckooHashTable
+from ArrayStorage import FIELD_KEY, FIELD_INTERVAL, FIELD_TIME, FIELD_FLAGS
+from ColumnarTrace import TCP_SYN
 from SynTable import SynTable
 from datetime import datetime, timedelta
 from random import randint
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 from zlib import crc32
@@ -20,6 +18,10 @@ MAX_SEQNUM = 2**32
 
 class FlowTable(CuckooHashTable):
 
+    ## Record: (flow_key, (lo, hi), entry_tstamp, update_tstamp, entry_flags, update_flags)
+    _recordSchema       = (FIELD_KEY, FIELD_INTERVAL, FIELD_TIME, FIELD_TIME, FIELD_FLAGS, FIELD_FLAGS)
+    _recordUpdateFields = (1, 3, 5)
+
     ##################################################
 
     def __init__(self, flowtab_params, test=True):
@@ -57,7 +59,9 @@ class FlowTable(CuckooHashTable):
                                 "entry_timeout": self._synStaging_entryTimeout,
                                 "sampling_threshold": None,
                                 "sampling_rate": None,
-                                "log_interval": self._logInterval   }
+                                "log_interval": self._logInterval,
+                                "snapshot_format": flowtab_params.get("snapshot_format", "text"),
+                                "distribution_mode": flowtab_params.get("distribution_mode", "samples")   }
             # Create SYN staging table if SYN action is "staging"
             self._custom_print("Round {}/{}: Initializing the SYN staging table".format(self._round_number, self._max_round_number))
             self._synTable = SynTable(syntab_params, test)
@@ -114,7 +118,7 @@ class FlowTable(CuckooHashTable):
         ''' Flow table insertion '''
 
         ## Insert into SYN table if it exists (In current implementation, it doesn't)
-        if self._synAction == "staging" and "S" in record[4]:
+        if self._synAction == "staging" and record[4] & TCP_SYN:
             return self._synTable.insert(record, timestamp)
 
         # ## Insert into the last stage if it's empty
@@ -210,12 +214,13 @@ class FlowTable(CuckooHashTable):
             self._custom_print("\nFT:: Insert into Flow Table")
 
         if self.accountant._firstEntryTime is None:
-            self.accountant._firstEntryTime = timestamp
+            self.accountant.setFirstEntryTime(timestamp)
         
         self.accountant.accountForInsertAttempt()
 
         ## Create snapshot (if interval is complete)
-        self.accountant.createSnapshot(timestamp)
+        if self.accountant._snapshotDue:
+            self.accountant.createSnapshot(timestamp)
         
         return self._insert(record, timestamp)
 
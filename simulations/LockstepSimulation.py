@@ -0,0 +1,199 @@
+from Simulation import Simulation
+from ColumnarTrace import DIRECTION_SEQ, DIRECTION_ACK
+from datetime import datetime, timedelta
+from shutil import copy, copytree, rmtree
+from RTTSampleSink import RTT_SINK_DIRS
+import json
+import sys
+import os
+
+##################################################
+
+## Parameters that may differ between the lanes of a lockstep simulation; everything else must be identical
+LANE_PARAMS = ["packettab_params"]
+LANE_SIM_PARAMS = ["round_number"]
+
+##################################################
+
+class LockstepSimulation(object):
+    ''' Runs several simulation rounds that only differ in their packet table parameters in a single pass over the trace.
+        The flow table, approx. flow table, and tcptrace_const only depend on the trace and on each other (never on the
+        packet table), so they are simulated once and shared; each lane only advances its own packet table. '''
+
+    ##################################################
+
+    def __init__(self, simulation_params_list, test=True):
+
+        if len(simulation_params_list) == 0:
+            raise Exception("Lockstep simulation needs at least one set of simulation params")
+
+        self._check_lanes(simulation_params_list)
+
+        ## The first round is a full simulation and owns the shared tables
+        self._primary = Simulation(simulation_params_list[0], test)
+        self._lanes   = [self._primary]
+        for simulation_params in simulation_params_list[1:]:
+            lane = Simulation(simulation_params, test, lane=True)
+            lane._attach_snapshot_clock(self._primary._snapshot_clock)
+            lane._flow_table     = self._primary._flow_table
+            lane._apxflow_table  = self._primary._apxflow_table
+            lane._tcptrace_const = self._primary._tcptrace_const
+            self._lanes.append(lane)
+
+    ##################################################
+
+    def _check_lanes(self, simulation_params_list):
+
+        def shared_part(simulation_params):
+            shared = {k: v for k, v in simulation_params.items() if k not in LANE_PARAMS}
+            shared["sim_params"] = {k: v for k, v in simulation_params["sim_params"].items() if k not in LANE_SIM_PARAMS}
+            return json.dumps(shared, sort_keys=True)
+
+        reference = shared_part(simulation_params_list[0])
+        for simulation_params in simulation_params_list[1:]:
+            if shared_part(simulation_params) != reference:
+                raise Exception("Lockstep lanes may only differ in their packet table params (round {} differs from round {})".format(
+                                    simulation_params["sim_params"]["round_number"], simulation_params_list[0]["sim_params"]["round_number"]))
+
+    ##################################################
+
+    def _custom_print(self, text="", flush=True):
+        print(text, flush=flush)
+
+    ##################################################
+
+    def run_p4rtt_simulation(self):
+
+        primary = self._primary
+        lanes   = self._lanes
+        rounds  = ", ".join([str(lane._round_number) for lane in lanes])
+
+        t_format = "%Y-%m-%d %H:%M:%S"
+        t_start  = datetime.now()
+        self._custom_print("{} Round {}/{}: Start lockstep simulation for rounds {} at time {}".format(
+                            primary._time_elapsed(), primary._round_number, primary._max_round_number, rounds, t_start.strftime(t_format)))
+
+        packets = primary._iterate_packets()
+        if primary._profiler is not None:
+            packets = primary._profiler.iterate(packets)
+
+        for packet in packets:
+
+            primary._snapshot_clock.advance(packet.timestamp)
+
+            ## Handle SEQ direction
+            if packet.direction & DIRECTION_SEQ:
+                if primary._tcptrace_const is not None:
+                    primary._tcptrace_const.process_tcptrace_SEQ(packet)
+                flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft = primary._handle_SEQ_flow_tables(packet)
+                actionables_pt2aft = None
+                for lane in lanes:
+                    lane_actionables_pt2aft = lane._handle_SEQ_packet_table(packet, flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft)
+                    if actionables_pt2aft is None:
+                        actionables_pt2aft = lane_actionables_pt2aft
+                primary._handle_SEQ_approx_flow_table(flow_key, actionables_pt2aft)
+
+            ## Handle ACK direction
+            if packet.direction & DIRECTION_ACK:
+                if primary._tcptrace_const is not None:
+                    primary._tcptrace_const.process_tcptrace_ACK(packet)
+                flow_key, actionables_ft2pt, actionables_ft2aft = primary._handle_ACK_flow_table(packet)
+                for lane in lanes:
+                    lane._handle_ACK_packet_table(packet, flow_key, actionables_ft2pt)
+                primary._handle_ACK_approx_flow_table(flow_key, actionables_ft2aft)
+
+        latest_tstamp = primary._latest_tstamp
+        self._custom_print("{} Round {}/{}: Processing complete; processed {}M/{}M packets in this simulation".format(
+                                primary._time_elapsed(), primary._round_number, primary._max_round_number,
+                                round((primary._packets_count+1)/1000000, 2), round(primary._total_packets_count/1000000, 2)))
+
+        ## Last snapshot is explicit
+        self._custom_print("{} Round {}/{}: Trigger last snapshot explicitly".format(primary._time_elapsed(), primary._round_number, primary._max_round_number))
+        primary._flow_table.accountant.explicitSnapshot(latest_tstamp)
+        if primary._flow_table._synAction == "staging":
+            primary._flow_table._syn_table.accountant.explicitSnapshot(latest_tstamp)
+        for lane in lanes:
+            lane._packet_table.accountant.explicitSnapshot(latest_tstamp)
+
+        ## Save snapshots; the shared flow table is saved into every lane
+        self._custom_print("{} Round {}/{}: Save all snapshots".format(primary._time_elapsed(), primary._round_number, primary._max_round_number))
+        for lane in lanes:
+            primary._flow_table.accountant.saveSnapshots(lane._simulation_dir)
+            if primary._flow_table._synAction == "staging":
+                primary._flow_table._syn_table.accountant.saveSnapshots(lane._simulation_dir)
+            lane._packet_table.accountant.saveSnapshots()
+            if primary._enable_apxft and not os.path.exists(os.path.join(lane._simulation_dir, "approx_flow_table")):
+                os.makedirs(os.path.join(lane._simulation_dir, "approx_flow_table"))
+
+        ## Save RTT samples; with sinks, every lane gets a copy of the shared tcptrace_const sink
+        self._custom_print("{} Round {}/{}: Save RTT samples".format(primary._time_elapsed(), primary._round_number, primary._max_round_number))
+        if primary._p4rtt_sink is not None:
+            for lane in lanes:
+                lane._close_rtt_sinks(lane is primary)
+        if primary._p4rtt_sink is not None and primary._tcptrace_const is not None:
+            tcptrace_sink_dir = os.path.join(primary._simulation_dir, RTT_SINK_DIRS["tcptrace_const"])
+            for lane in lanes[1:]:
+                lane_sink_dir = os.path.join(lane._simulation_dir, RTT_SINK_DIRS["tcptrace_const"])
+                if os.path.exists(lane_sink_dir):
+                    rmtree(lane_sink_dir)
+                copytree(tcptrace_sink_dir, lane_sink_dir)
+        tcptrace_rtt_all = None
+        if primary._tcptrace_const is not None:
+            tcptrace_rtt_all = []
+            for flow_key in primary._tcptrace_const._tcptrace_rtt_samples:
+                tcptrace_rtt_all.extend([t[1] for t in primary._tcptrace_const._tcptrace_rtt_samples[flow_key]])
+            primary._tcptrace_const.concludeRTTDict()
+        for lane in lanes:
+            if lane._p4rtt_sink is not None:
+                continue
+            p4rtt_rtt_all = []
+            for flow_key in lane._p4rtt_rtt_samples:
+                p4rtt_rtt_all.extend([t[1] for t in lane._p4rtt_rtt_samples[flow_key]])
+            lane._save_rtt_samples(p4rtt_rtt_all, tcptrace_rtt_all)
+
+        ## tcptrace_const plots are identical for all lanes; with the baseline option, every lane restores its outputs from the baseline
+        if primary._tcptrace_baseline is not None:
+            for lane in lanes:
+                lane._restore_tcptrace_baseline()
+        else:
+            if not primary._no_plots:
+                primary._tcptrace_const.plot_tcptrace_stats(latest_tstamp)
+            for lane in lanes[1:]:
+                lane_tcptrace_path = os.path.join(lane._simulation_dir, "tcptrace_const")
+                if not os.path.exists(lane_tcptrace_path):
+                    os.makedirs(lane_tcptrace_path)
+                for plot_filename in os.listdir(primary._tcptrace_const._resultsPath):
+                    copy(os.path.join(primary._tcptrace_const._resultsPath, plot_filename), lane_tcptrace_path)
+
+        for lane in lanes:
+            if lane._profiler is not None:
+                lane._save_profile()
+
+        t_end = datetime.now()
+        t_elapsed = round((t_end - t_start)/timedelta(minutes=1), 2)
+        for lane in lanes:
+            lane._write_round_manifest((t_end - t_start)/timedelta(seconds=1))
+        self._custom_print("{0} Round {1}/{2}: Finished lockstep simulation for rounds {3} at time {4}. Time elapsed: {5} mins.".format(
+                                primary._time_elapsed(), primary._round_number, primary._max_round_number, rounds, t_end.strftime(t_format), t_elapsed))
+
+        return
+
+##################################################
+
+def main():
+
+    simulation_params_list = json.loads(sys.argv[1])
+    is_test          = simulation_params_list[0]["sim_params"]["is_test"]
+    round_nums       = [simulation_params["sim_params"]["round_number"] for simulation_params in simulation_params_list]
+    num_combinations = simulation_params_list[0]["sim_params"]["combinations_count"]
+    print("Rounds {}/{}: Create lockstep simulation object with current set of params".format(round_nums, num_combinations-1))
+    simulation = LockstepSimulation(simulation_params_list, is_test)
+    print("Rounds {}/{}: Start P4RTT lockstep simulation".format(round_nums, num_combinations-1))
+    simulation.run_p4rtt_simulation()
+
+##################################################
+
+if __name__ == "__main__":
+    main()
+
+##################################################
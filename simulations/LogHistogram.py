@@ -0,0 +1,185 @@
+import numpy as np
+
+##################################################
+
+## Sub-buckets per power of two are 2^(SUB_BUCKET_BITS-1): values are kept to a relative precision of 2^-(SUB_BUCKET_BITS-1)
+SUB_BUCKET_BITS = 8
+
+##################################################
+
+class LogHistogram(object):
+    ''' Log-linear (HDR-style) histogram of integers with fixed memory and O(1) recording.
+        Magnitudes below 2^SUB_BUCKET_BITS get a bucket each; above, every power of two is split into 2^(SUB_BUCKET_BITS-1)
+        equally wide buckets. Negative values (rare, e.g., reinsertions of records stamped after the current packet) are
+        counted in a mirrored set of buckets. Histograms with the same precision merge by adding their counts. '''
+
+    ##################################################
+
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS):
+
+        self._subBucketBits  = sub_bucket_bits
+        self._subBucketCount = 1 << sub_bucket_bits
+        self._halfCount      = self._subBucketCount >> 1
+        ## Values up to 2^64
+        self._counts         = [0] * ((66 - sub_bucket_bits) * self._halfCount)
+        self._negativeCounts = [0] * len(self._counts)
+        self._totalCount     = 0
+        self._min            = None
+        self._max            = None
+
+    ##################################################
+
+    def __len__(self):
+        return self._totalCount
+
+    ##################################################
+
+    def _index(self, value):
+        ## Bucket of a non-negative value
+
+        if value < self._subBucketCount:
+            return value
+
+        shift = value.bit_length() - self._subBucketBits
+        return (shift * self._halfCount) + (value >> shift)
+
+    ##################################################
+
+    def _bucketBounds(self, index):
+        ## [lower, upper) of the values counted in bucket index
+
+        if index < self._subBucketCount:
+            return index, index + 1
+
+        shift = index // self._halfCount - 1
+        lower = (index - shift * self._halfCount) << shift
+        return lower, lower + (1 << shift)
+
+    ##################################################
+
+    def record(self, value):
+
+        value = int(value)
+        if value >= 0:
+            self._counts[self._index(value)] += 1
+        else:
+            self._negativeCounts[self._index(-value)] += 1
+        self._totalCount += 1
+        if self._min is None or value < self._min:
+            self._min = value
+        if self._max is None or value > self._max:
+            self._max = value
+
+    ## Drop-in for the sample lists the tables append to
+    append = record
+
+    ##################################################
+
+    def merge(self, other):
+
+        if other._subBucketBits != self._subBucketBits:
+            raise Exception("Cannot merge histograms of different precision ({} and {} sub-bucket bits)".format(
+                                self._subBucketBits, other._subBucketBits))
+
+        for index, count in enumerate(other._counts):
+            if count:
+                self._counts[index] += count
+        for index, count in enumerate(other._negativeCounts):
+            if count:
+                self._negativeCounts[index] += count
+        self._totalCount += other._totalCount
+        if other._min is not None:
+            self._min = other._min if self._min is None else min(self._min, other._min)
+            self._max = other._max if self._max is None else max(self._max, other._max)
+
+        return self
+
+    ##################################################
+
+    def _buckets(self):
+        ## Non-empty buckets as (representative values, counts); a bucket is represented by the midpoint of its values,
+        ## clipped to the recorded min/max so that the extremes are exact
+
+        values = []
+        counts = []
+        for index in reversed(np.flatnonzero(np.array(self._negativeCounts, dtype=np.int64)).tolist()):
+            values.append(-(sum(self._bucketBounds(index)) - 1) / 2)
+            counts.append(self._negativeCounts[index])
+        for index in np.flatnonzero(np.array(self._counts, dtype=np.int64)).tolist():
+            values.append((sum(self._bucketBounds(index)) - 1) / 2)
+            counts.append(self._counts[index])
+
+        values = np.array(values, dtype=np.float64)
+        counts = np.array(counts, dtype=np.int64)
+        if len(values) > 0:
+            values = np.clip(values, self._min, self._max)
+
+        return values, counts
+
+    ##################################################
+
+    def percentile(self, q):
+        ## Value below or at which q percent of the recorded values lie
+
+        if self._totalCount == 0:
+            return None
+
+        values, counts = self._buckets()
+        rank = max(1, int(np.ceil(q / 100 * self._totalCount)))
+        return float(values[np.searchsorted(np.cumsum(counts), rank)])
+
+    ##################################################
+
+    def cdf(self):
+        ## (values, cumulative fractions) for plotting
+
+        values, counts = self._buckets()
+        if self._totalCount == 0:
+            return values, np.zeros(0, dtype=np.float64)
+
+        return values, np.cumsum(counts) / self._totalCount
+
+    ##################################################
+
+    def to_array(self):
+        ## Non-empty buckets in value order as rows of [bucket bound closest to zero, count]
+
+        rows  = [[-self._bucketBounds(index)[0], count] for index, count in reversed(list(enumerate(self._negativeCounts))) if count]
+        rows += [[self._bucketBounds(index)[0], count] for index, count in enumerate(self._counts) if count]
+        return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+    ##################################################
+
+    @classmethod
+    def from_array(cls, rows, sub_bucket_bits=SUB_BUCKET_BITS):
+        ## Inverse of to_array; min/max are only known to the precision of their buckets
+
+        histogram = cls(sub_bucket_bits)
+        for bound, count in np.asarray(rows, dtype=np.int64).reshape(-1, 2).tolist():
+            if count <= 0:
+                continue
+            index = histogram._index(abs(bound))
+            if bound >= 0:
+                histogram._counts[index] += count
+                lower, upper = bound, histogram._bucketBounds(index)[1] - 1
+            else:
+                histogram._negativeCounts[index] += count
+                lower, upper = -(histogram._bucketBounds(index)[1] - 1), bound
+            histogram._totalCount += count
+            histogram._min = lower if histogram._min is None else min(histogram._min, lower)
+            histogram._max = upper if histogram._max is None else max(histogram._max, upper)
+
+        return histogram
+
+    ##################################################
+
+    @classmethod
+    def from_samples(cls, samples, sub_bucket_bits=SUB_BUCKET_BITS):
+
+        histogram = cls(sub_bucket_bits)
+        for value in samples:
+            histogram.record(value)
+
+        return histogram
+
+##################################################
@@ -1,11 +1,8 @@
 # from BitHash import BitHash, ResetBitHash
 from CuckooHashTable import CuckooHashTable
+from ArrayStorage import FIELD_KEY, FIELD_TIME, FIELD_INT
 from datetime import datetime, timedelta
 from random import randint
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 from zlib import crc32
@@ -19,6 +16,10 @@ MAX_SEQNUM = 2**32
 
 class PacketTable(CuckooHashTable):
 
+    ## Record: (packet_key, tstamp, seqno)
+    _recordSchema       = (FIELD_KEY, FIELD_TIME, FIELD_INT)
+    _recordUpdateFields = (1, )
+
     ##################################################
 
     def __init__(self, packettab_params, test=True):
@@ -205,12 +206,13 @@ class PacketTable(CuckooHashTable):
             self._custom_print("\nPT:: Insert into Packet Table")
 
         if self.accountant._firstEntryTime is None:
-            self.accountant._firstEntryTime = timestamp
+            self.accountant.setFirstEntryTime(timestamp)
         
         self.accountant.accountForInsertAttempt()
 
         ## Create snapshot (if interval is complete)
-        self.accountant.createSnapshot(timestamp)
+        if self.accountant._snapshotDue:
+            self.accountant.createSnapshot(timestamp)
         
         return self._insert(record, timestamp, flow_table, apxflow_table)
 
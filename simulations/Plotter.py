@@ -1,7 +1,4 @@
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+from lazy_pyplot import load_pyplot
 import numpy as np
 import pickle
 import os
@@ -27,6 +24,8 @@ class Plotter(object):
 
     def plotPerformanceComparison(self, tcptrace_rtt_samples, p4rtt_rtt_samples, tcptrace_sample_count, p4rtt_sample_count):
 
+        plt, sns = load_pyplot()
+
         ## Data processing
         sorted_flow_keys = sorted(tcptrace_rtt_samples, key=lambda k: len(tcptrace_rtt_samples[k]))
 
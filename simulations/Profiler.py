@@ -0,0 +1,141 @@
+import time
+import json
+import os
+
+##################################################
+
+PROFILE_FILE = "profile.json"
+
+## Packets between two throughput samples
+THROUGHPUT_SAMPLE_PACKETS = 100000
+
+##################################################
+
+class ComponentStats(object):
+    ''' Call count, cumulative time, and a log2 latency histogram (bucket i counts calls of [2^(i-1), 2^i) ns,
+        saved as [2^i, calls] pairs of the non-empty buckets) '''
+
+    ##################################################
+
+    def __init__(self):
+        self.calls     = 0
+        self.total_ns  = 0
+        self.histogram = [0] * 64
+
+    ##################################################
+
+    def record(self, duration_ns):
+        self.calls    += 1
+        self.total_ns += duration_ns
+        self.histogram[min(duration_ns.bit_length(), 63)] += 1
+
+    ##################################################
+
+    def to_dict(self):
+        return {
+                    "calls": self.calls,
+                    "total_s": self.total_ns / 1e9,
+                    "mean_us": self.total_ns / self.calls / 1e3 if self.calls > 0 else None,
+                    "histogram_ns": [[2**i, count] for i, count in enumerate(self.histogram) if count > 0],
+                }
+
+##################################################
+
+class Profiler(object):
+    ''' Per-component latency profile of a simulation round.
+        Components are timed by replacing methods of the profiled objects with timing wrappers (instrument) and by
+        timing the packet iterator (iterate), so nothing in the simulation loop changes and a round without a profiler
+        pays nothing. Times are inclusive: a component's time contains that of the components it calls. '''
+
+    ##################################################
+
+    def __init__(self):
+
+        self._components = {}
+        self._throughput = []
+        self._packets    = 0
+        self._loop_time  = 0.0
+        self._t_start    = time.perf_counter()
+
+    ##################################################
+
+    def _component(self, component):
+        if component not in self._components:
+            self._components[component] = ComponentStats()
+        return self._components[component]
+
+    ##################################################
+
+    def instrument(self, obj, method_name, component):
+        ## Time all calls of obj.method_name (also those from within obj) as component
+
+        method = getattr(obj, method_name)
+        stats  = self._component(component)
+        perf_counter_ns = time.perf_counter_ns
+
+        def timed_method(*args, **kwargs):
+            t_start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stats.record(perf_counter_ns() - t_start)
+
+        setattr(obj, method_name, timed_method)
+
+    ##################################################
+
+    def iterate(self, packets, component="trace_decode"):
+        ## Times producing every packet as component; samples the packets per second every THROUGHPUT_SAMPLE_PACKETS packets
+
+        stats    = self._component(component)
+        iterator = iter(packets)
+        perf_counter_ns = time.perf_counter_ns
+
+        t_loop_start  = time.perf_counter()
+        t_sample      = t_loop_start
+        packets_count = 0
+        while True:
+            t_start = perf_counter_ns()
+            try:
+                packet = next(iterator)
+            except StopIteration:
+                break
+            stats.record(perf_counter_ns() - t_start)
+
+            packets_count += 1
+            if packets_count % THROUGHPUT_SAMPLE_PACKETS == 0:
+                t_now = time.perf_counter()
+                self._throughput.append([round(t_now - self._t_start, 3), packets_count,
+                                            round(THROUGHPUT_SAMPLE_PACKETS / (t_now - t_sample), 1)])
+                t_sample = t_now
+
+            yield packet
+
+        self._packets   += packets_count
+        self._loop_time += time.perf_counter() - t_loop_start
+
+    ##################################################
+
+    def to_dict(self):
+
+        return {
+                    "wall_time_s": round(time.perf_counter() - self._t_start, 3),
+                    "loop_time_s": round(self._loop_time, 3),
+                    "packets": self._packets,
+                    "packets_per_second": round(self._packets / self._loop_time, 1) if self._loop_time > 0 else None,
+                    "throughput": {"columns": ["time_s", "packets", "packets_per_second"], "samples": self._throughput},
+                    "components": {component: stats.to_dict() for component, stats in sorted(self._components.items())},
+                }
+
+    ##################################################
+
+    def save(self, results_path):
+
+        profile_path = os.path.join(results_path, PROFILE_FILE)
+        with open(profile_path + ".tmp", "w") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+        os.replace(profile_path + ".tmp", profile_path)
+
+        return profile_path
+
+##################################################
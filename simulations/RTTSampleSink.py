@@ -0,0 +1,196 @@
+import numpy as np
+import json
+import sys
+import os
+
+##################################################
+
+RTT_SINK_FORMAT      = "rtt_samples"
+RTT_SINK_VERSION     = 1
+RTT_SINK_META_FILE   = "rtt_samples_meta.json"
+DEFAULT_BUFFER_SIZE  = 65536
+
+## Sink directory of each sample source in a round directory; the text files they replace are <dir>.txt
+RTT_SINK_DIRS = {"p4rtt": "rtt_samples_p4rtt", "tcptrace_const": "rtt_samples_tcptrace_const"}
+
+## Column name -> dtype; one raw little-endian file per column, one row per RTT sample
+RTT_SAMPLE_COLUMNS = [
+                        ("flow_id", "<u4"),  # Index into the flow columns, in order of the flows' first samples
+                        ("seqno",   "<u4"),  # Sequence number of the packet record that was matched
+                        ("ts_us",   "<i8"),  # Timestamp of the matching ACK, microseconds since the epoch
+                        ("rtt_us",  "<i8"),
+                     ]
+
+## One row per flow
+RTT_FLOW_COLUMNS = [("ipsrc", "<u4"), ("ipdst", "<u4"), ("tcpsrc", "<u2"), ("tcpdst", "<u2")]
+
+##################################################
+
+class RTTSampleSink(object):
+    ''' Appends RTT samples to binary column files as they are produced, buffering a chunk at a time, so that a round
+        never holds its samples in memory; only a flow id per flow is kept. The text files are rendered from the columns
+        on demand (write_rtt_samples_text). '''
+
+    ##################################################
+
+    def __init__(self, sink_dir, buffer_size=DEFAULT_BUFFER_SIZE):
+
+        self._sink_dir    = sink_dir
+        self._buffer_size = buffer_size
+        self._count       = 0
+        self._flow_ids    = {}
+        self._buffers     = {name: [] for name, _ in RTT_SAMPLE_COLUMNS}
+        self._flows       = {name: [] for name, _ in RTT_FLOW_COLUMNS}
+
+        if not os.path.exists(self._sink_dir):
+            os.makedirs(self._sink_dir)
+
+        ## Truncate column files
+        for name, _ in RTT_SAMPLE_COLUMNS + [("flow_" + name, dtype) for name, dtype in RTT_FLOW_COLUMNS]:
+            with open(os.path.join(self._sink_dir, name + ".bin"), "wb"):
+                pass
+
+    ##################################################
+
+    def __len__(self):
+        return self._count
+
+    ##################################################
+
+    def add(self, flow_key, seqno, ts_us, rtt_us):
+        ## flow_key: (ipsrc, ipdst, tcpsrc, tcpdst)
+
+        flow_id = self._flow_ids.get(flow_key)
+        if flow_id is None:
+            flow_id = self._flow_ids[flow_key] = len(self._flow_ids)
+            self._flows["ipsrc"].append(int(flow_key[0]))
+            self._flows["ipdst"].append(int(flow_key[1]))
+            self._flows["tcpsrc"].append(flow_key[2])
+            self._flows["tcpdst"].append(flow_key[3])
+
+        self._buffers["flow_id"].append(flow_id)
+        self._buffers["seqno"].append(seqno)
+        self._buffers["ts_us"].append(ts_us)
+        self._buffers["rtt_us"].append(rtt_us)
+        self._count += 1
+
+        if len(self._buffers["flow_id"]) >= self._buffer_size:
+            self._flush()
+
+    ##################################################
+
+    def _flush(self):
+
+        for name, dtype in RTT_SAMPLE_COLUMNS:
+            with open(os.path.join(self._sink_dir, name + ".bin"), "ab") as fp:
+                fp.write(np.asarray(self._buffers[name], dtype=dtype).tobytes())
+            self._buffers[name] = []
+        for name, dtype in RTT_FLOW_COLUMNS:
+            with open(os.path.join(self._sink_dir, "flow_" + name + ".bin"), "ab") as fp:
+                fp.write(np.asarray(self._flows[name], dtype=dtype).tobytes())
+            self._flows[name] = []
+
+    ##################################################
+
+    def close(self):
+
+        self._flush()
+        write_rtt_sink_meta(self._sink_dir, self._count, len(self._flow_ids))
+
+        return self._count
+
+##################################################
+
+def write_rtt_sink_meta(sink_dir, count, flow_count):
+    ## Marks the column files in sink_dir as a closed sink of count samples of flow_count flows
+
+    meta = {
+                "format": RTT_SINK_FORMAT,
+                "version": RTT_SINK_VERSION,
+                "count": count,
+                "flow_count": flow_count,
+                "columns": [[name, dtype] for name, dtype in RTT_SAMPLE_COLUMNS],
+                "flow_columns": [[name, dtype] for name, dtype in RTT_FLOW_COLUMNS],
+            }
+    meta_path = os.path.join(sink_dir, RTT_SINK_META_FILE)
+    with open(meta_path + ".tmp", "w") as fp:
+        json.dump(meta, fp, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+
+##################################################
+
+def load_rtt_sink(sink_dir):
+    ## {column: memory-mapped array} of a closed sink; flow columns are prefixed with "flow_"
+
+    with open(os.path.join(sink_dir, RTT_SINK_META_FILE)) as fp:
+        meta = json.load(fp)
+    if meta.get("format") != RTT_SINK_FORMAT:
+        raise Exception("Not an RTT sample sink: {}".format(sink_dir))
+
+    columns = {}
+    for prefix, column_list, count in [("", meta["columns"], meta["count"]), ("flow_", meta["flow_columns"], meta["flow_count"])]:
+        for name, dtype in column_list:
+            if count == 0:
+                columns[prefix + name] = np.zeros(0, dtype=dtype)
+            else:
+                columns[prefix + name] = np.memmap(os.path.join(sink_dir, prefix + name + ".bin"), dtype=dtype, mode="r", shape=(count,))
+
+    return columns
+
+##################################################
+
+def rtt_samples_ms(sink_dir):
+    ## RTTs (ms) in the order of the text files: grouped by flow in order of the flows' first samples, each flow's samples
+    ## in the order they were taken
+
+    columns = load_rtt_sink(sink_dir)
+    order   = np.argsort(columns["flow_id"], kind="stable")
+
+    return columns["rtt_us"][order] / 1000
+
+##################################################
+
+def write_rtt_samples_text(sink_dir, text_path, chunk_size=DEFAULT_BUFFER_SIZE):
+    ## Renders the one-RTT-per-line text file a round writes without a sink, byte for byte
+
+    rtts = rtt_samples_ms(sink_dir)
+    with open(text_path, "w") as fp:
+        for offset in range(0, len(rtts), chunk_size):
+            lines = ["{}".format(point) for point in rtts[offset:offset+chunk_size].tolist()]
+            fp.write(("\n" if offset > 0 else "") + "\n".join(lines))
+
+    return len(rtts)
+
+##################################################
+
+def load_round_rtt_samples(round_dir, source):
+    ## RTTs (ms) of a round's source ("p4rtt" or "tcptrace_const"), from the text file or, if the round used a sink, from it
+
+    text_path = os.path.join(round_dir, RTT_SINK_DIRS[source] + ".txt")
+    if os.path.exists(text_path):
+        with open(text_path) as fp:
+            return [float(line) for line in fp.read().split("\n") if line != ""]
+
+    return rtt_samples_ms(os.path.join(round_dir, RTT_SINK_DIRS[source])).tolist()
+
+##################################################
+
+def main():
+    ## Writes the text files of all sinks of the given round directories
+
+    if len(sys.argv) < 2:
+        raise Exception("At least 1 argument expected")
+
+    for round_dir in sys.argv[1:]:
+        for source in sorted(RTT_SINK_DIRS):
+            sink_dir = os.path.join(round_dir, RTT_SINK_DIRS[source])
+            if os.path.exists(os.path.join(sink_dir, RTT_SINK_META_FILE)):
+                count = write_rtt_samples_text(sink_dir, sink_dir + ".txt")
+                print("Wrote {} {} RTT samples to {}".format(count, source, sink_dir + ".txt"))
+
+##################################################
+
+if __name__ == "__main__":
+    main()
+
+##################################################
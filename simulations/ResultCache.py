@@ -0,0 +1,206 @@
+from round_manifest import MANIFEST_FILE
+from ColumnarTrace import TRACE_COLUMNS, TRACE_META_FILE
+from shutil import copytree, rmtree
+from datetime import datetime
+import hashlib
+import json
+import os
+
+##################################################
+
+ENTRY_FILE  = "cache_entry.json"
+DIGEST_FILE = "trace_digests.json"
+
+## Simulation options that do not change a round's results
+RESULT_NEUTRAL_OPTIONS = ["shared_trace", "shared_trace_dir", "tcptrace_baseline", "tcptrace_baseline_dir", "tcptrace_baseline_workers"]
+
+##################################################
+
+class ResultCache(object):
+    ''' Persistent store of finished simulation rounds, keyed by the round's result-relevant parameters and a digest
+        of the trace; entries are evicted least recently used first once the cache exceeds its size bound '''
+
+    ##################################################
+
+    def __init__(self, cache_dir, max_size_mb=None):
+
+        self._cache_dir   = cache_dir
+        self._max_size_mb = max_size_mb
+        self._digests     = {}
+
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+    ##################################################
+
+    def _custom_print(self, text, flush=True):
+        print(text, flush=flush)
+
+    ##################################################
+
+    def _file_digest(self, digest, path):
+        with open(path, "rb") as fp:
+            for block in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(block)
+
+    ##################################################
+
+    def trace_digest(self, tcptrace_data_paths):
+        ## sha256 of the trace the rounds read; memoized on disk by path, size, and mtime since hashing a large trace is slow.
+        ## A pickle is the source of truth when given: with "shared_trace" the rounds read a columnar copy of it, which must
+        ## not change the digest.
+
+        if "part_pkts_pickle" in tcptrace_data_paths:
+            paths = [tcptrace_data_paths["part_pkts_pickle"]]
+        else:
+            trace_dir = tcptrace_data_paths["part_pkts_columnar"]
+            paths = [os.path.join(trace_dir, TRACE_META_FILE)] + [os.path.join(trace_dir, name + ".bin") for name, _ in TRACE_COLUMNS]
+
+        stamps = []
+        for path in paths:
+            path_st = os.stat(path)
+            stamps.append("{}:{}:{}".format(os.path.abspath(path), path_st.st_size, path_st.st_mtime_ns))
+        stamp = "|".join(stamps)
+
+        if stamp in self._digests:
+            return self._digests[stamp]
+
+        digests_path = os.path.join(self._cache_dir, DIGEST_FILE)
+        digests = {}
+        if os.path.exists(digests_path):
+            try:
+                with open(digests_path) as fp:
+                    digests = json.load(fp)
+            except ValueError:
+                digests = {}
+
+        if stamp not in digests:
+            self._custom_print("Result cache: compute trace digest of {}".format(", ".join(paths)))
+            digest = hashlib.sha256()
+            for path in paths:
+                self._file_digest(digest, path)
+            digests[stamp] = digest.hexdigest()
+            with open(digests_path + ".tmp{}".format(os.getpid()), "w") as fp:
+                json.dump(digests, fp, indent=2)
+            os.replace(digests_path + ".tmp{}".format(os.getpid()), digests_path)
+
+        self._digests[stamp] = digests[stamp]
+
+        return self._digests[stamp]
+
+    ##################################################
+
+    def result_key(self, simulation_params):
+
+        sim_params  = simulation_params["sim_params"]
+        sim_options = sim_params.get("sim_options", {})
+        key_params  = {
+                        "flowtab_params": simulation_params["flowtab_params"],
+                        "packettab_params": simulation_params["packettab_params"],
+                        "apxflowtab_params": simulation_params["apxflowtab_params"],
+                        "enable_apxft": sim_params["enable_apxft"],
+                        "total_packets_count": sim_params["tcptrace_data_paths"]["total_packets_count"],
+                        "sim_options": {k: v for k, v in sim_options.items() if k not in RESULT_NEUTRAL_OPTIONS},
+                        "trace_digest": self.trace_digest(sim_params["tcptrace_data_paths"]),
+                    }
+
+        return hashlib.sha256(json.dumps(key_params, sort_keys=True).encode()).hexdigest()
+
+    ##################################################
+
+    def _entry_dir(self, key):
+        return os.path.join(self._cache_dir, key[:2], key)
+
+    ##################################################
+
+    def restore(self, key, round_dir, round_number):
+        ## Materialize a cached round into round_dir; returns the cached wall time, or None on a miss
+
+        entry_dir  = self._entry_dir(key)
+        entry_path = os.path.join(entry_dir, ENTRY_FILE)
+        if not os.path.exists(entry_path):
+            return None
+
+        with open(entry_path) as fp:
+            entry = json.load(fp)
+
+        if os.path.exists(round_dir):
+            rmtree(round_dir)
+        copytree(os.path.join(entry_dir, "outputs"), round_dir)
+
+        ## The parameters file names the round it was produced by
+        params_path = os.path.join(round_dir, "simulation_parameters.txt")
+        if os.path.exists(params_path):
+            with open(params_path) as fp:
+                params_lines = fp.read().split("\n")
+            for i, line in enumerate(params_lines):
+                if line.startswith("Simulation No.: "):
+                    params_lines[i] = "Simulation No.: {}".format(round_number)
+                    break
+            with open(params_path, "w") as fp:
+                fp.write("\n".join(params_lines))
+
+        ## Mark as recently used
+        os.utime(entry_path)
+
+        return entry["wall_time_secs"]
+
+    ##################################################
+
+    def store(self, key, round_dir, wall_time_secs):
+
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry_dir, ENTRY_FILE)):
+            os.utime(os.path.join(entry_dir, ENTRY_FILE))
+            return
+
+        ## Copy into a temporary entry and rename it into place, so readers never see a partial entry
+        tmp_entry_dir = "{}.tmp{}".format(entry_dir, os.getpid())
+        if os.path.exists(tmp_entry_dir):
+            rmtree(tmp_entry_dir)
+        copytree(round_dir, os.path.join(tmp_entry_dir, "outputs"))
+        manifest_path = os.path.join(tmp_entry_dir, "outputs", MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        with open(os.path.join(tmp_entry_dir, ENTRY_FILE), "w") as fp:
+            json.dump({"key": key, "wall_time_secs": wall_time_secs, "stored_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, fp, indent=2)
+
+        if os.path.exists(entry_dir):
+            rmtree(entry_dir)
+        os.replace(tmp_entry_dir, entry_dir)
+
+        self._evict()
+
+    ##################################################
+
+    def _evict(self):
+        ## Drop least recently used entries until the cache fits into max_size_mb
+
+        if self._max_size_mb is None:
+            return
+
+        entries = []
+        total_size = 0
+        for prefix in os.listdir(self._cache_dir):
+            prefix_dir = os.path.join(self._cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_path = os.path.join(prefix_dir, key, ENTRY_FILE)
+                if not os.path.exists(entry_path):
+                    continue
+                size = 0
+                for dirpath, _, filenames in os.walk(os.path.join(prefix_dir, key)):
+                    size += sum([os.path.getsize(os.path.join(dirpath, filename)) for filename in filenames])
+                entries.append((os.path.getmtime(entry_path), size, os.path.join(prefix_dir, key)))
+                total_size += size
+
+        max_size = self._max_size_mb * 1024 * 1024
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= max_size:
+                break
+            self._custom_print("Result cache: evict {}".format(entry_dir))
+            rmtree(entry_dir)
+            total_size -= size
+
+##################################################
@@ -1,19 +1,21 @@
-from defined_subnets import PU_SNETS, DEFINED_SUBNETS
-from ipaddress import IPv4Address, ip_network
+from defined_subnets import DEFINED_SUBNETS
 from datetime import datetime, timedelta
 from PacketTable import PacketTable
 from FlowTable import FlowTable
 from ApproxFlowTable import ApproxFlowTable
 from TCPTraceConst import TCPTraceConst
+from TCPTraceBaseline import TCPTraceBaseline, baseline_options, baseline_cache_dir
+from SnapshotClock import SnapshotClock
+from Profiler import Profiler
+from RTTSampleSink import RTTSampleSink, RTT_SINK_DIRS
+from ColumnarTrace import ColumnarTrace, DEFAULT_CHUNK_SIZE, TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK, DIRECTION_SEQ, DIRECTION_ACK, \
+                            iter_columns_as_packets, packet_from_record
+from SubnetMatcher import home_matcher, label_directions, iter_directed_chunks
+from round_manifest import simulation_params_hash, write_round_manifest
 from Plotter import Plotter
 from shutil import copy, move
 import itertools
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-import scipy.stats as st
 import pickle
 import json
 import sys
@@ -25,11 +27,15 @@ class Simulation(object):
 
     ##################################################
 
-    def __init__(self, simulation_params, test=True):
+    def __init__(self, simulation_params, test=True, lane=False):
+        ## lane: only build this round's packet table; the FT, AFT, and tcptrace_const are shared and attached by LockstepSimulation
 
         if False:
             self._custom_print("RECHECK:: Simulation params received: {}".format(simulation_params))
 
+        ## Identifies this round's results in its completion manifest (before the params are augmented below)
+        self._params_hash = simulation_params_hash(simulation_params)
+
         ## Unique flows
         self._all_flows_seq_pkts = {}
         self._all_flows_ack_pkts = {}
@@ -44,8 +50,17 @@ class Simulation(object):
         self._total_packets_count  = simulation_params["sim_params"]["tcptrace_data_paths"]["total_packets_count"]
         self._packets_count        = 0
         self._packets              = None
+        self._latest_tstamp        = None
         self._curr_packets_count   = None
         self._enable_apxft         = simulation_params["sim_params"]["enable_apxft"]
+        self._sim_options          = simulation_params["sim_params"].get("sim_options", {})
+        self._no_plots             = self._sim_options.get("no_plots", False)
+
+        ## Only handle the SEQ/ACK direction of packets leaving/entering a DEFINED_SUBNETS category (None: both directions of every packet)
+        self._direction_filter     = self._sim_options.get("direction_filter")
+        if self._direction_filter is not None and self._direction_filter not in DEFINED_SUBNETS:
+            self._custom_print("Round {}/{}: Invalid option for direction filter, reset to None".format(self._round_number, self._max_round_number))
+            self._direction_filter = None
 
         str_len = len(str(simulation_params["sim_params"]["combinations_count"]))
         self._simulation_dir = os.path.join(self._simulation_batch_dir, "simulation_round_{}".format(str(self._round_number).zfill(str_len)))
@@ -74,6 +89,14 @@ class Simulation(object):
             simulation_params["apxflowtab_params"]["results_path"]  = self._simulation_dir
             simulation_params["apxflowtab_params"]["total_packets"] = self._total_packets_count
 
+        ## Storage backend, snapshot format and distribution mode apply to all tables
+        for option in ["storage_backend", "snapshot_format", "distribution_mode"]:
+            if option in self._sim_options:
+                simulation_params["flowtab_params"][option]   = self._sim_options[option]
+                simulation_params["packettab_params"][option] = self._sim_options[option]
+                if self._enable_apxft:
+                    simulation_params["apxflowtab_params"][option] = self._sim_options[option]
+
         ## Table params
         self._flowtab_params    = simulation_params["flowtab_params"]
         self._packettab_params  = simulation_params["packettab_params"]
@@ -86,11 +109,14 @@ class Simulation(object):
                 self._custom_print("{} Round {}/{}: RECHECK:: Apxflowtab params: {}".format(self._time_elapsed(), self._round_number, self._max_round_number, self._apxflowtab_params))
         
         ## Initialize tables
-        self._custom_print("{} Round {}/{}: Initialize the flow table".format(self._time_elapsed(), self._round_number, self._max_round_number))
-        self._flow_table    = FlowTable(self._flowtab_params, self._test)
+        self._flow_table    = None
+        self._apxflow_table = None
+        if not lane:
+            self._custom_print("{} Round {}/{}: Initialize the flow table".format(self._time_elapsed(), self._round_number, self._max_round_number))
+            self._flow_table    = FlowTable(self._flowtab_params, self._test)
         self._custom_print("{} Round {}/{}: Initialize the packet table".format(self._time_elapsed(), self._round_number, self._max_round_number))
         self._packet_table  = PacketTable(self._packettab_params, self._test)
-        if self._enable_apxft:
+        if self._enable_apxft and not lane:
             self._custom_print("{} Round {}/{}: Initialize the approx. flow table".format(self._time_elapsed(), self._round_number, self._max_round_number))
             self._apxflow_table = ApproxFlowTable(self._apxflowtab_params, self._test)
 
@@ -157,6 +183,11 @@ class Simulation(object):
             params_lines.append("sampling_rate: {}".format(self._apxflowtab_params["sampling_rate"]))
             params_lines.append("log_interval: {}".format(self._apxflowtab_params["log_interval"]))
             params_lines.append("")
+        if self._sim_options:
+            params_lines.append("##### Simulation Options #####")
+            for option in sorted(self._sim_options):
+                params_lines.append("{}: {}".format(option, self._sim_options[option]))
+            params_lines.append("")
         params_lines.append("##################################################")
 
         params_text = "\n".join(params_lines)
@@ -165,8 +196,86 @@ class Simulation(object):
         with open(params_path, "w") as fp:
             fp.write(params_text)
         
+        ## Optionally stream RTT samples to binary column files instead of keeping them per flow until the end of the round
+        self._p4rtt_sink = None
+        if self._sim_options.get("rtt_sink", False):
+            self._p4rtt_sink = RTTSampleSink(os.path.join(self._simulation_dir, RTT_SINK_DIRS["p4rtt"]))
+
+        ## Optionally reuse the tcptrace_const baseline of the trace, computed once for all rounds (TCPTraceBaseline.py), instead of
+        ## simulating tcptrace_const in every round
+        self._tcptrace_baseline = None
+        if self._sim_options.get("tcptrace_baseline", False):
+            self._tcptrace_baseline         = TCPTraceBaseline(baseline_cache_dir(simulation_params))
+            self._tcptrace_baseline_options = baseline_options(simulation_params)
+
         ## Initialize tcptrace_const
-        self._tcptrace_const = TCPTraceConst(self._simulation_dir, self._flowtab_params["log_interval"])
+        self._tcptrace_const = None
+        if not lane and self._tcptrace_baseline is None:
+            tcptrace_sink = None
+            if self._p4rtt_sink is not None:
+                tcptrace_sink = RTTSampleSink(os.path.join(self._simulation_dir, RTT_SINK_DIRS["tcptrace_const"]))
+            self._tcptrace_const = TCPTraceConst(self._simulation_dir, self._flowtab_params["log_interval"],
+                                                 idle_timeout=self._sim_options.get("tcptrace_idle_timeout"), rtt_sink=tcptrace_sink)
+
+        ## One clock triggers the snapshots of all tables and tcptrace_const (lanes are attached to their primary's clock)
+        self._snapshot_clock = SnapshotClock()
+        if not lane:
+            self._attach_snapshot_clock(self._snapshot_clock)
+
+        ## Optional per-component profile, saved as profile.json next to simulation_parameters.txt
+        self._profiler = None
+        if self._sim_options.get("profile", False):
+            self._profiler = Profiler()
+            self._instrument(self._profiler, lane)
+
+    ##################################################
+
+    def _attach_snapshot_clock(self, snapshot_clock):
+        for table in [self._flow_table, self._packet_table, self._apxflow_table]:
+            if table is not None:
+                table.accountant.setSnapshotClock(snapshot_clock)
+        if self._tcptrace_const is not None:
+            self._tcptrace_const.set_snapshot_clock(snapshot_clock)
+
+    ##################################################
+
+    def _instrument(self, profiler, lane=False):
+        ## Components timed by the profiler; a lane only times its own packet table (the primary times the shared ones)
+
+        components = [
+                        (self, "_handle_SEQ_packet_table", "seq_packet_table"),
+                        (self, "_handle_ACK_packet_table", "ack_packet_table"),
+                        (self._packet_table, "_insert", "packet_table_insert"),
+                        (self._packet_table, "_checkForAndHandleEviction", "packet_table_eviction_check"),
+                        (self._packet_table.accountant, "createSnapshot", "packet_table_snapshot"),
+                    ]
+        if not lane:
+            components += [
+                        (self, "_retrieve_packets_data", "trace_load"),
+                        (self._snapshot_clock, "advance", "snapshot_clock"),
+                        (self, "_handle_SEQ_flow_tables", "seq_flow_tables"),
+                        (self, "_handle_SEQ_approx_flow_table", "seq_approx_flow_table"),
+                        (self, "_handle_ACK_flow_table", "ack_flow_table"),
+                        (self, "_handle_ACK_approx_flow_table", "ack_approx_flow_table"),
+                        (self._flow_table, "_insert", "flow_table_insert"),
+                        (self._flow_table, "_checkForAndHandleEviction", "flow_table_eviction_check"),
+                        (self._flow_table.accountant, "createSnapshot", "flow_table_snapshot"),
+                    ]
+        if self._tcptrace_const is not None:
+            components += [
+                        (self._tcptrace_const, "process_tcptrace_SEQ", "tcptrace_seq"),
+                        (self._tcptrace_const, "process_tcptrace_ACK", "tcptrace_ack"),
+                        (self._tcptrace_const, "_create_tcptrace_snapshot", "tcptrace_snapshot"),
+                    ]
+        if self._apxflow_table is not None:
+            components += [
+                        (self._apxflow_table, "_insert_or_update", "approx_flow_table_insert"),
+                        (self._apxflow_table, "_checkForAndHandleEviction", "approx_flow_table_eviction_check"),
+                        (self._apxflow_table.accountant, "createSnapshot", "approx_flow_table_snapshot"),
+                    ]
+
+        for obj, method_name, component in components:
+            profiler.instrument(obj, method_name, component)
 
     ##################################################
 
@@ -196,12 +305,32 @@ class Simulation(object):
         ## Load packets
         # process_packets_path = os.path.join(self._tcptrace_data_paths["local_directory"], "local_packets_round_{}.pickle".format(
         #                             str(count_data).zfill(2)))
-        process_packets_path = self._tcptrace_data_paths["part_pkts_pickle"]
-        with open(process_packets_path, "rb") as packets_fp:
-            self._packets = pickle.load(packets_fp)
+        if "part_pkts_columnar" in self._tcptrace_data_paths:
+            ## Stream packets chunk by chunk from the memory-mapped columnar trace
+            packets_trace = ColumnarTrace(self._tcptrace_data_paths["part_pkts_columnar"])
+            chunk_size    = self._tcptrace_data_paths.get("chunk_size", DEFAULT_CHUNK_SIZE)
+            if self._direction_filter is None:
+                self._packets = packets_trace.iter_packets(chunk_size)
+            else:
+                self._packets = iter_columns_as_packets(iter_directed_chunks(packets_trace, chunk_size, self._direction_filter))
+            self._curr_packets_count = len(packets_trace)
+        else:
+            process_packets_path = self._tcptrace_data_paths["part_pkts_pickle"]
+            with open(process_packets_path, "rb") as packets_fp:
+                self._packets = pickle.load(packets_fp)
+
+            ## Convert into Packet records once: IPv4 addresses packed into ints (flow and packet keys are then plain int tuples), flags into bitmasks
+            for i, packet_data in enumerate(self._packets):
+                self._packets[i] = packet_from_record(packet_data)
+
+            ## Label directions for the whole part file at once and drop the packets of neither direction
+            if self._direction_filter is not None:
+                directions = label_directions([packet.ipsrc for packet in self._packets], [packet.ipdst for packet in self._packets],
+                                                home_matcher(self._direction_filter)).tolist()
+                self._packets = [packet._replace(direction=direction) for packet, direction in zip(self._packets, directions) if direction]
 
-        ## Populate counts
-        self._curr_packets_count = len(self._packets)
+            ## Populate counts
+            self._curr_packets_count = len(self._packets)
 
         t_end     = datetime.now()
         t_elapsed = round((t_end - t_start)/timedelta(minutes=1), 2)
@@ -211,33 +340,27 @@ class Simulation(object):
 
     ##################################################
 
-    def _is_home(self, ipv4):
-
-        is_home = False
-        ipv4 = IPv4Address(ipv4)
-        for snet in PU_SNETS[:17]:
-            if ipv4 in snet:
-                is_home = True
-                break
-        if is_home:
-            for snet in PU_SNETS[17:]:
-                if ipv4 in snet:
-                    is_home = False
-                    break
-    
-        return is_home
-    
-    ##################################################
-
     def _handle_SEQ_direction(self, packet):
         '''Handle SEQ direction'''
         ## This proceeds in 4 steps: (1) FT processing, (2) AFT processing, (3) PT processing, (4) AFT processing
         ## In the actual data plane (DP) implementation, these steps are intertwined. To help simulate that, in each step, we accumulate actionables for subsequent steps.
         ## So while we execute actions in a convenient order in simulation (to the extent possible), the final state in each of the 3 data structures is the same as when done in the DP impl.
         ## The accounting/logging is done in a way such that it reflects how things would have happened in the DP impl. The plots are therefore faithful to the actual DP impl.
+        ## Steps 1, 2, and 4 only depend on the FT and AFT, so they are shared by all packet tables of a lockstep simulation (see LockstepSimulation).
+
+        flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft = self._handle_SEQ_flow_tables(packet)
+        actionables_pt2aft = self._handle_SEQ_packet_table(packet, flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft)
+        self._handle_SEQ_approx_flow_table(flow_key, actionables_pt2aft)
+
+        return
+
+    ##################################################
+
+    def _handle_SEQ_flow_tables(self, packet):
 
         # Prep flow key
-        flow_key = (packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], packet["tcpdst"])
+        flow_key = (packet.ipsrc, packet.ipdst, packet.tcpsrc, packet.tcpdst)
+        exp_ack  = None
         
         # Step 1: Peform flow table (FT) processing
 
@@ -249,10 +372,10 @@ class Simulation(object):
         self._flow_table.accountant.accountForProcessing()
         
         ## Case 0: Drop if SYN packet with IGNORE option or a pure ACK
-        is_syn = "S" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_fin = "F" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_rst = "R" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_pure_ack = packet["tcpflags"] == "-A----" and packet["pktsize"] == 0
+        is_syn = packet.tcpflags & TCP_SYN and self._flowtab_params["syn_action"] == "ignore"
+        is_fin = packet.tcpflags & TCP_FIN and self._flowtab_params["syn_action"] == "ignore"
+        is_rst = packet.tcpflags & TCP_RST and self._flowtab_params["syn_action"] == "ignore"
+        is_pure_ack = packet.tcpflags == TCP_ACK and packet.pktsize == 0
         # if is_syn or is_fin or is_rst or is_pure_ack:
         if is_syn or is_rst or is_pure_ack:
             ## Account for packet drop
@@ -265,8 +388,8 @@ class Simulation(object):
         ## Cases: 1. Flow record for this flow exists, 2. Flow record for this flow doesn't exist
         else:
             ## Compute expected ACK
-            exp_ack = packet["seqno"] + packet["pktsize"]
-            if "S" in packet["tcpflags"] or "F" in packet["tcpflags"]: exp_ack += 1
+            exp_ack = packet.seqno + packet.pktsize
+            if packet.tcpflags & (TCP_SYN | TCP_FIN): exp_ack += 1
 
             ## Lookup the flow record
             flow_record = self._flow_table.lookup(flow_key)
@@ -278,23 +401,23 @@ class Simulation(object):
                 if self._test: self._custom_print("SEQ FT:: Flow record for key {} is found, retrieved record is: {}".format(flow_key, flow_record))
 
                 ## Case 1.1: The flow record is valid; the new packet is either an extension to the measurement range, or ahead of the measurement range
-                if packet["seqno"] >= highest_expected_ack:
+                if packet.seqno >= highest_expected_ack:
             
                     ## Case 1.1.1: The new packet is an extension to the measurement range
-                    if packet["seqno"] == highest_expected_ack:
-                        updated_record = (flow_key, (highest_byte_acked_or_rexmited, exp_ack), None, packet["timestamp"], None, packet["tcpflags"])
+                    if packet.seqno == highest_expected_ack:
+                        updated_record = (flow_key, (highest_byte_acked_or_rexmited, exp_ack), None, packet.timestamp, None, packet.tcpflags)
                     
                     ## Case 1.1.2: Restart the measurement range with latest packet since there's a gap in the sequence no. space
                     else:
-                        updated_record = (flow_key, (packet["seqno"], exp_ack), None, packet["timestamp"], None, packet["tcpflags"])
+                        updated_record = (flow_key, (packet.seqno, exp_ack), None, packet.timestamp, None, packet.tcpflags)
 
                     ## Delete if collapsed interval, or update if interval is still open
                     if updated_record[1][0] == updated_record[1][1]:
-                        update_success = self._flow_table.delete(flow_key, packet["timestamp"])
+                        update_success = self._flow_table.delete(flow_key, packet.timestamp)
                         if self._test: self._custom_print("SEQ FT:: Delete record since closed interval: {} || Flow key: {}".format(
                                                             (updated_record[1][0], updated_record[1][1]), flow_key))
                     else:
-                        update_success = self._flow_table.update(flow_key, updated_record, packet["timestamp"])
+                        update_success = self._flow_table.update(flow_key, updated_record, packet.timestamp)
                         if self._test: self._custom_print("SEQ FT:: Updated record with: {} || Flow key: {}".format(
                                                             (updated_record[1][0], updated_record[1][1]), flow_key))
                     
@@ -308,19 +431,19 @@ class Simulation(object):
                 ## Case 1.2: Delete since violation to measurement range
                 else:
                     
-                    update_success = self._flow_table.delete(flow_key, packet["timestamp"])
+                    update_success = self._flow_table.delete(flow_key, packet.timestamp)
                     self._flow_table.accountant.accountForUpdateAttempt()
                     if update_success: self._flow_table.accountant.accountForUpdateSuccess()
                     else: self._flow_table.accountant.accountForUpdateFailure()
 
                     ### Create record with a collapsed measurement range to insert into/update AFT
-                    aft_record = (flow_key, (exp_ack, exp_ack), packet["timestamp"], packet["timestamp"], packet["tcpflags"], packet["tcpflags"])
+                    aft_record = (flow_key, (exp_ack, exp_ack), packet.timestamp, packet.timestamp, packet.tcpflags, packet.tcpflags)
 
                     actionables_ft2pt  = ("drop", None)
                     actionables_ft2aft = ("update_or_insert", [aft_record, ])
 
                     if self._test: self._custom_print("SEQ FT: Deleted record since packet seq. no. {} < {} highest expected ACK || Flow key: {}".format(
-                                                        packet["seqno"], highest_expected_ack, flow_key))
+                                                        packet.seqno, highest_expected_ack, flow_key))
 
             ## Case 2: Flow record does not exist in FT; need to insert it
             else:
@@ -331,7 +454,7 @@ class Simulation(object):
                 if self._test: self._custom_print("SEQ PT (FT):: Flow record not found; packet record looked up: {}".format(packet_record))
 
                 if packet_record is not None:
-                    aft_record = (flow_key, (exp_ack, exp_ack), packet["timestamp"], packet["timestamp"], packet["tcpflags"], packet["tcpflags"])
+                    aft_record = (flow_key, (exp_ack, exp_ack), packet.timestamp, packet.timestamp, packet.tcpflags, packet.tcpflags)
                     actionables_ft2pt  = ("delete", packet_key)
                     actionables_ft2aft = ("update_or_insert", [aft_record, ])
 
@@ -344,8 +467,8 @@ class Simulation(object):
                     # if self._test: self._custom_print("SEQ PT (FT):: Exhaustive record is: {}".format(exhaustive_rec))
 
                     ## Create new flow record
-                    new_flow_record = (flow_key, (packet["seqno"], exp_ack), packet["timestamp"], packet["timestamp"], packet["tcpflags"], packet["tcpflags"])
-                    _, touched_records = self._flow_table.insert(record=new_flow_record, timestamp=packet["timestamp"])
+                    new_flow_record = (flow_key, (packet.seqno, exp_ack), packet.timestamp, packet.timestamp, packet.tcpflags, packet.tcpflags)
+                    _, touched_records = self._flow_table.insert(record=new_flow_record, timestamp=packet.timestamp)
                     
                     actionables_ft2pt  = ("insert", "packet_record")
                     ## touched_records is a list of flow records that could be inserted into the AFT
@@ -374,9 +497,14 @@ class Simulation(object):
                         if self._apxflow_table.insert_or_update(record, timestamp=record[3]):
                             if self._test: self._custom_print("SEQ AFT:: Flow record successfully inserted/updated: {}".format(record))
                         else:
-                            if self._test: self._custom_print("SEQ AFT:: Flow record insertion/update failed: {}".format(record))        
-        
-        
+                            if self._test: self._custom_print("SEQ AFT:: Flow record insertion/update failed: {}".format(record))
+
+        return flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft
+
+    ##################################################
+
+    def _handle_SEQ_packet_table(self, packet, flow_key, exp_ack, actionables_ft2pt, actionables_ft2aft):
+
         # Step 3: Peform packet table (PT) processing
         ## Account for packet processing
         actionables_pt2aft = ("drop", None)
@@ -389,7 +517,7 @@ class Simulation(object):
         
         elif actionables_ft2pt[0] == "delete":
             self._packet_table.accountant.accountForUpdateAttempt()
-            if self._packet_table.delete(actionables_ft2pt[1], packet["timestamp"]):
+            if self._packet_table.delete(actionables_ft2pt[1], packet.timestamp):
                 self._packet_table.accountant.accountForUpdateSuccess()
             else:
                 self._packet_table.accountant.accountForUpdateFailure()
@@ -397,10 +525,10 @@ class Simulation(object):
 
         elif actionables_ft2pt[0] == "insert":
             ## Insert into packet table
-            packet_key = (packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], packet["tcpdst"], exp_ack)
-            new_packet_record = (packet_key, packet["timestamp"], packet["seqno"])
+            packet_key = (packet.ipsrc, packet.ipdst, packet.tcpsrc, packet.tcpdst, exp_ack)
+            new_packet_record = (packet_key, packet.timestamp, packet.seqno)
             if not self._enable_apxft: self._apxflow_table = None
-            eviction_code = self._packet_table.insert(record=new_packet_record, timestamp=packet["timestamp"], flow_table=self._flow_table, apxflow_table=self._apxflow_table)
+            eviction_code = self._packet_table.insert(record=new_packet_record, timestamp=packet.timestamp, flow_table=self._flow_table, apxflow_table=self._apxflow_table)
             if self._test:
                 if eviction_code: self._custom_print("SEQ PT:: Flow key: {} || Packet record {} inserted, eviction code is {}".format(flow_key, packet_key, eviction_code))
                 else: self._custom_print("SEQ PT:: Flow key: {} || Packet record {} insertion FAILED, eviction code is {}".format(flow_key, packet_key, eviction_code))
@@ -408,7 +536,13 @@ class Simulation(object):
                 actionables_pt2aft = ("update_or_insert", actionables_ft2aft[1][-1])
         
         if self._enable_apxft and self._test: self._custom_print("SEQ PT:: Flow key: {} || Actionables for AFT: {}".format(flow_key, actionables_pt2aft))
-        
+
+        return actionables_pt2aft
+
+    ##################################################
+
+    def _handle_SEQ_approx_flow_table(self, flow_key, actionables_pt2aft):
+
         # Step 4: Peform PT2AFT action
         if self._enable_apxft:
             ## Account for packet processing
@@ -442,8 +576,18 @@ class Simulation(object):
         ## (2) Packets that result in removing flow entry (RST packets; when conf. interval collapses due to ACKs, entries are removed during contention)
         ## (3) Packets that result in RTT samples (The following isn't true anymore: RST packets with ACK set also count)
 
+        flow_key, actionables_ft2pt, actionables_ft2aft = self._handle_ACK_flow_table(packet)
+        self._handle_ACK_packet_table(packet, flow_key, actionables_ft2pt)
+        self._handle_ACK_approx_flow_table(flow_key, actionables_ft2aft)
+
+        return
+
+    ##################################################
+
+    def _handle_ACK_flow_table(self, packet):
+
         ## Prep. flow key
-        flow_key = (packet["ipdst"], packet["ipsrc"], packet["tcpdst"], packet["tcpsrc"])
+        flow_key = (packet.ipdst, packet.ipsrc, packet.tcpdst, packet.tcpsrc)
 
         # Step 1: Peform flow table (FT) processing
 
@@ -451,10 +595,10 @@ class Simulation(object):
         self._flow_table.accountant.accountForProcessing("ACK")
 
         ## Case 0: Drop packet if SYN, FIN, or RST packet and SYN IGNORE is on; or not an ACK
-        is_syn = "S" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_fin = "F" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_rst = "R" in packet["tcpflags"] and self._flowtab_params["syn_action"] == "ignore"
-        is_not_ack = "A" not in packet["tcpflags"]
+        is_syn = packet.tcpflags & TCP_SYN and self._flowtab_params["syn_action"] == "ignore"
+        is_fin = packet.tcpflags & TCP_FIN and self._flowtab_params["syn_action"] == "ignore"
+        is_rst = packet.tcpflags & TCP_RST and self._flowtab_params["syn_action"] == "ignore"
+        is_not_ack = not packet.tcpflags & TCP_ACK
         # if is_syn or is_fin or is_rst or is_not_ack:
         if is_syn or is_rst or is_not_ack:
             ## Account for packet drop
@@ -466,11 +610,11 @@ class Simulation(object):
             actionables_ft2aft = ("drop", None)
             
         # ## Case 1: RST is set but ACK is not: Delete flow table record
-        # elif "A" not in packet["tcpflags"] and "R" in packet["tcpflags"]:
+        # elif not packet.tcpflags & TCP_ACK and packet.tcpflags & TCP_RST:
         #     ft_record_to_delete = self._flow_table.lookup(flow_key)
         #     ## Account for flow table record deletion
         #     self._flow_table.accountant.accountForUpdateAttempt("ACK")
-        #     if self._flow_table.delete(flow_key, packet["timestamp"]):
+        #     if self._flow_table.delete(flow_key, packet.timestamp):
         #         self._flow_table.accountant.accountForUpdateSuccess("ACK")
         #     else:
         #         self._flow_table.accountant.accountForUpdateFailure("ACK")
@@ -479,7 +623,7 @@ class Simulation(object):
         #     if ft_record_to_delete is not None:
         #         eACK_to_delete     = ft_record_to_delete[1][1]
         #         pt_key_to_delete   = flow_key + (eACK_to_delete, )
-        #         updated_ft_record  = (flow_key, (eACK_to_delete, eACK_to_delete), None, packet["timestamp"], None, packet["tcpflags"])
+        #         updated_ft_record  = (flow_key, (eACK_to_delete, eACK_to_delete), None, packet.timestamp, None, packet.tcpflags)
         #         actionables_ft2pt  = ("delete", pt_key_to_delete)
         #         actionables_ft2aft = ("update_or_insert", updated_ft_record)
         #     else:
@@ -487,7 +631,7 @@ class Simulation(object):
         #         actionables_ft2aft = ("drop", None)
         
         ## Case 2: ACK is set
-        elif "A" in packet["tcpflags"]:
+        elif packet.tcpflags & TCP_ACK:
             flow_record = self._flow_table.lookup(flow_key)
             
             ## Case 2.1: Flow record does not exist, drop packet
@@ -503,19 +647,19 @@ class Simulation(object):
                 if self._test: self._custom_print("ACK FT:: Flow record for key {}: {}".format(flow_key, flow_record))
 
                 ## Case 2.2.1: Delete flow table record if (RST is set or) ACK beyond measurement range
-                # if "R" in packet["tcpflags"] or packet["ackno"] > highest_expected_ack or packet["ackno"] <= highest_byte_acked_or_rexmited:
-                # if packet["ackno"] > highest_expected_ack or packet["ackno"] <= highest_byte_acked_or_rexmited:
+                # if packet.tcpflags & TCP_RST or packet.ackno > highest_expected_ack or packet.ackno <= highest_byte_acked_or_rexmited:
+                # if packet.ackno > highest_expected_ack or packet.ackno <= highest_byte_acked_or_rexmited:
 
-                if packet["ackno"] < highest_byte_acked_or_rexmited or packet["ackno"] > highest_expected_ack:
+                if packet.ackno < highest_byte_acked_or_rexmited or packet.ackno > highest_expected_ack:
                     ## ACK in future = optimistic ACK; ACK in past = ACK for past SEQ packet not tracked due to MR collapse OR ACK reordered
                     self._flow_table.accountant.accountForDrop("ACK")
                     actionables_ft2pt  = ("drop", None)
                     actionables_ft2aft = ("drop", None)
                 
-                elif packet["ackno"] == highest_byte_acked_or_rexmited:
+                elif packet.ackno == highest_byte_acked_or_rexmited:
                     ## Duplicate ACK: delete flow table record
                     self._flow_table.accountant.accountForUpdateAttempt("ACK")
-                    if self._flow_table.delete(flow_key, packet["timestamp"]):
+                    if self._flow_table.delete(flow_key, packet.timestamp):
                         self._flow_table.accountant.accountForUpdateSuccess("ACK")
                     else:
                         self._flow_table.accountant.accountForUpdateFailure("ACK")
@@ -523,11 +667,11 @@ class Simulation(object):
                     actionables_ft2aft = ("drop", None)
                     
                     # ## Set actionables for next steps
-                    # new_highest_expected_ack = max(highest_expected_ack, packet["ackno"])
+                    # new_highest_expected_ack = max(highest_expected_ack, packet.ackno)
                     # pt_key_to_delete   = flow_key + (highest_expected_ack, )
                     # updated_ft_record  = (flow_key, (new_highest_expected_ack, new_highest_expected_ack),
-                    #   None, packet["timestamp"], None, packet["tcpflags"])
-                    # # if "R" not in packet["tcpflags"]:
+                    #   None, packet.timestamp, None, packet.tcpflags)
+                    # # if not packet.tcpflags & TCP_RST:
                     # #     actionables_ft2pt  = ("delete", pt_key_to_delete)
                     # # else:
                     # #     actionables_ft2pt  = ("match", "packet_record")
@@ -535,16 +679,16 @@ class Simulation(object):
                     # actionables_ft2aft = ("update_or_insert", updated_ft_record)
 
                 ## Case 2.2.2: Update flow table with ACK no. since ACK within measurement range            
-                elif highest_byte_acked_or_rexmited < packet["ackno"] and packet["ackno"] <= highest_expected_ack:
+                elif highest_byte_acked_or_rexmited < packet.ackno and packet.ackno <= highest_expected_ack:
 
-                    updated_record = (flow_key, (packet["ackno"], highest_expected_ack), None, packet["timestamp"], None, packet["tcpflags"])
+                    updated_record = (flow_key, (packet.ackno, highest_expected_ack), None, packet.timestamp, None, packet.tcpflags)
                     self._flow_table.accountant.accountForUpdateAttempt("ACK")
-                    if packet["ackno"] == highest_expected_ack:
-                        update_success = self._flow_table.delete(flow_key, packet["timestamp"])
+                    if packet.ackno == highest_expected_ack:
+                        update_success = self._flow_table.delete(flow_key, packet.timestamp)
                         if self._test: self._custom_print("ACK FT:: Flow key: {} || ACK# within measurement range; updated measurement range closed now ({} == {}), deleted".format(
-                                                            flow_key, packet["ackno"], highest_expected_ack))
+                                                            flow_key, packet.ackno, highest_expected_ack))
                     else:
-                        update_success = self._flow_table.update(flow_key, updated_record, packet["timestamp"])
+                        update_success = self._flow_table.update(flow_key, updated_record, packet.timestamp)
                         if self._test: self._custom_print("ACK FT:: Flow key: {} || ACK# within measurement range; updated measurement range is: {}".format(
                                                             flow_key, updated_record[1]))
                     
@@ -554,17 +698,17 @@ class Simulation(object):
                     actionables_ft2aft = ("update_or_insert", updated_record)
                 
                 if self._test:
-                    # if "R" in packet["tcpflags"]:
+                    # if packet.tcpflags & TCP_RST:
                     #     self._custom_print("ACK FT:: Flow key: {} || Deleted FT record since RST is set".format(flow_key))
-                    if packet["ackno"] > highest_expected_ack:
+                    if packet.ackno > highest_expected_ack:
                         self._custom_print("ACK FT:: Flow key: {} || Ignored since optimistic ACK: ACK# > highest eACK: {} > {}".format(
-                                            flow_key, packet["ackno"], highest_expected_ack))
-                    elif packet["ackno"] == highest_byte_acked_or_rexmited:
+                                            flow_key, packet.ackno, highest_expected_ack))
+                    elif packet.ackno == highest_byte_acked_or_rexmited:
                         self._custom_print("ACK FT:: Flow key: {} || Deleted FT record since ACK# == highest byte affected (dupACK): {} <= {}".format(
-                                            flow_key, packet["ackno"], highest_byte_acked_or_rexmited))
-                    elif packet["ackno"] < highest_byte_acked_or_rexmited:
+                                            flow_key, packet.ackno, highest_byte_acked_or_rexmited))
+                    elif packet.ackno < highest_byte_acked_or_rexmited:
                         self._custom_print("ACK FT:: Flow key: {} || Ignored since ACK to untracked SEQ packet: ACK# < highest eACK: {} > {}".format(
-                                            flow_key, packet["ackno"], highest_expected_ack))
+                                            flow_key, packet.ackno, highest_expected_ack))
         
         else:
             self._flow_table.accountant.accountForDrop("ACK")
@@ -573,6 +717,11 @@ class Simulation(object):
             
         if self._test: self._custom_print("ACK FT:: Actionables: FT2PT: {}, FT2AFT: {}".format(actionables_ft2pt, actionables_ft2aft))
 
+        return flow_key, actionables_ft2pt, actionables_ft2aft
+
+    ##################################################
+
+    def _handle_ACK_packet_table(self, packet, flow_key, actionables_ft2pt):
 
         # Step 2: Handle packet table action
         self._packet_table.accountant.accountForProcessing("ACK")
@@ -585,7 +734,7 @@ class Simulation(object):
         ## Case 1: Action is delete
         elif actionables_ft2pt[0] == "delete":
             self._packet_table.accountant.accountForUpdateAttempt("ACK")
-            if self._packet_table.delete(actionables_ft2pt[1], packet["timestamp"]):
+            if self._packet_table.delete(actionables_ft2pt[1], packet.timestamp):
                 self._packet_table.accountant.accountForUpdateSuccess("ACK")
             else:
                 self._packet_table.accountant.accountForUpdateFailure("ACK")
@@ -593,7 +742,7 @@ class Simulation(object):
         
         ## Case 2: Action is match
         elif actionables_ft2pt[0] == "match":
-            match_key     = (packet["ipdst"], packet["ipsrc"], packet["tcpdst"], packet["tcpsrc"], packet["ackno"])
+            match_key     = (packet.ipdst, packet.ipsrc, packet.tcpdst, packet.tcpsrc, packet.ackno)
             packet_record = self._packet_table.lookup(match_key)
 
             ## Case 2.1: If packet record doesn't exist, drop packet
@@ -604,22 +753,30 @@ class Simulation(object):
             ## Case 2.2: Packet record exists: Delete packet record, compute RTT sample, and report
             else:
                 self._packet_table.accountant.accountForUpdateAttempt("ACK")
-                if self._packet_table.delete(match_key, packet["timestamp"]):
+                if self._packet_table.delete(match_key, packet.timestamp):
                     self._packet_table.accountant.accountForUpdateSuccess("ACK")
                 else:
                     self._packet_table.accountant.accountForUpdateFailure("ACK")
                 
-                if self._test: self._custom_print("ACK PT:: Flow key: {} || Deleted PT record since match is found for ACK#: {}".format(flow_key, packet["ackno"]))
+                if self._test: self._custom_print("ACK PT:: Flow key: {} || Deleted PT record since match is found for ACK#: {}".format(flow_key, packet.ackno))
                 
                 _, packet_tstamp, packet_seqno = packet_record
-                rtt = (packet["timestamp"] - packet_tstamp)/timedelta(milliseconds=1)
-                if flow_key not in self._p4rtt_rtt_samples:
-                    self._p4rtt_rtt_samples[flow_key] = []
-                self._p4rtt_rtt_samples[flow_key].append((packet_seqno, rtt))
+                rtt = (packet.timestamp - packet_tstamp)/1000
+                if self._p4rtt_sink is not None:
+                    self._p4rtt_sink.add(flow_key, packet_seqno, packet.timestamp, packet.timestamp - packet_tstamp)
+                else:
+                    if flow_key not in self._p4rtt_rtt_samples:
+                        self._p4rtt_rtt_samples[flow_key] = []
+                    self._p4rtt_rtt_samples[flow_key].append((packet_seqno, rtt))
                 self._p4rtt_sample_count += 1
                 
                 if self._test: self._custom_print("ACK FT:: Flow key: {} || RTT sample collected is {}".format(flow_key, rtt))
 
+        return
+
+    ##################################################
+
+    def _handle_ACK_approx_flow_table(self, flow_key, actionables_ft2aft):
 
         # Step 3: Handle approx. flow table action
 
@@ -648,18 +805,8 @@ class Simulation(object):
 
     ##################################################
 
-    def run_p4rtt_simulation(self):
-
-        t_format = "%Y-%m-%d %H:%M:%S"
-        t_start  = datetime.now()
-        self._custom_print("{} Round {}/{}: Start simulation for round {} at time {}".format(
-                            self._time_elapsed(), self._round_number, self._max_round_number, self._round_number, t_start.strftime(t_format)))
-        latest_tstamp = None
-
-        # time_seq_tcptrace = []
-        # time_seq_p4rtt = []
-        # time_ack_tcptrace = []
-        # time_ack_p4rtt = []
+    def _iterate_packets(self):
+        ## Yields the packets of all part files as Packet records; tracks the packet count and the first/latest timestamps
 
         for count_data in range(self._tcptrace_data_paths["part_pkts_count"]):
 
@@ -670,89 +817,142 @@ class Simulation(object):
 
                 self._packets_count += 1
 
-                packet = {}
-                packet["pktno"], packet["timestamp"], packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], \
-                    packet["tcpdst"], packet["tcpflags"], packet["seqno"], packet["ackno"], packet["pktsize"] = packet_data
-                packet["tcpflags"] = packet["tcpflags"][2:]
+                packet = packet_data
 
                 if self._test:
                     self._custom_print("##################################################\n")
                     self._custom_print("Packet {}: {}".format(self._packets_count, packet))
 
                 if count_data == 0 and count_packet == 0:
-                    self._firstEntryTime                 = packet["timestamp"]
-                    self._tcptrace_const._firstEntryTime = packet["timestamp"]
+                    self._firstEntryTime = packet.timestamp
+                    if self._tcptrace_const is not None:
+                        self._tcptrace_const._firstEntryTime = packet.timestamp
 
-                latest_tstamp = packet["timestamp"]
+                self._latest_tstamp = packet.timestamp
 
                 if (self._packets_count+1)%1000000 == 0:
                     self._custom_print("{} Round {}/{}: Processed {}M/{}M packets in this simulation".format(
                                             self._time_elapsed(), self._round_number, self._max_round_number,
                                             round((self._packets_count+1)/1000000, 2), round(self._total_packets_count/1000000, 2)))
-                
-                ## Handle SEQ direction if source IP is within campus and destination IP is NOT within campus
-                # if self._is_home(packet["ipsrc"]) and not self._is_home(packet["ipdst"]):
-                if True:
-                    if self._test:
-                        self._custom_print("\nHandle SEQ direction")
-                    
-                    # dbg_time_start = datetime.now()
+
+                yield packet
+
+    ##################################################
+
+    def _save_rtt_samples(self, p4rtt_rtt_all, tcptrace_rtt_all=None):
+        ## tcptrace_rtt_all: None if the round reuses the tcptrace_const baseline
+
+        ### P4RTT
+        with open(os.path.join(self._simulation_dir, "rtt_samples_p4rtt.txt"), "w") as fp:
+            lines = ["{}".format(point) for point in p4rtt_rtt_all]
+            fp.write("\n".join(lines))
+        ## tcptrace
+        if tcptrace_rtt_all is None:
+            return
+        with open(os.path.join(self._simulation_dir, "rtt_samples_tcptrace_const.txt"), "w") as fp:
+            lines = ["{}".format(point) for point in tcptrace_rtt_all]
+            fp.write("\n".join(lines))
+
+    ##################################################
+
+    def _close_rtt_sinks(self, close_tcptrace=True):
+        ## Flushes the sinks; the text files can be rendered from them with RTTSampleSink.py
+        ## close_tcptrace: False for lockstep lanes, which share their primary's tcptrace_const
+
+        p4rtt_count = self._p4rtt_sink.close()
+        self._custom_print("{} Round {}/{}: Streamed {} P4RTT RTT samples to {}".format(self._time_elapsed(), self._round_number, self._max_round_number,
+                            p4rtt_count, RTT_SINK_DIRS["p4rtt"]))
+        if close_tcptrace and self._tcptrace_const is not None:
+            tcptrace_count = self._tcptrace_const.close_rtt_sink()
+            self._custom_print("{} Round {}/{}: Streamed {} tcptrace_const RTT samples to {}".format(self._time_elapsed(), self._round_number,
+                                self._max_round_number, tcptrace_count, RTT_SINK_DIRS["tcptrace_const"]))
+
+    ##################################################
+
+    def _restore_tcptrace_baseline(self):
+        ## Copies the round's tcptrace_const outputs from the baseline, which is computed here if the batch did not prepare it
+
+        key = self._tcptrace_baseline.key(self._tcptrace_data_paths, self._tcptrace_baseline_options)
+        if not self._tcptrace_baseline.has(key):
+            self._custom_print("{} Round {}/{}: tcptrace_const baseline {} not found; compute it".format(self._time_elapsed(), self._round_number,
+                                self._max_round_number, key[:12]))
+            self._tcptrace_baseline.compute(self._tcptrace_data_paths, self._tcptrace_baseline_options)
+        self._custom_print("{} Round {}/{}: Restore tcptrace_const baseline {}".format(self._time_elapsed(), self._round_number, self._max_round_number, key[:12]))
+        self._tcptrace_baseline.restore(key, self._simulation_dir, rtt_sink=self._p4rtt_sink is not None, plots=not self._no_plots)
+
+    ##################################################
+
+    def _save_profile(self):
+        profile_path = self._profiler.save(self._simulation_dir)
+        self._custom_print("{} Round {}/{}: Saved profile to {}".format(self._time_elapsed(), self._round_number, self._max_round_number, profile_path))
+
+    ##################################################
+
+    def _write_round_manifest(self, wall_time_secs):
+        ## Marks the round as complete for resumed batches (see SimulationBatch)
+        self._custom_print("{} Round {}/{}: Write round manifest".format(self._time_elapsed(), self._round_number, self._max_round_number))
+        write_round_manifest(self._simulation_dir, self._params_hash, round(wall_time_secs, 3))
+
+    ##################################################
+
+    def run_p4rtt_simulation(self):
+
+        t_format = "%Y-%m-%d %H:%M:%S"
+        t_start  = datetime.now()
+        self._custom_print("{} Round {}/{}: Start simulation for round {} at time {}".format(
+                            self._time_elapsed(), self._round_number, self._max_round_number, self._round_number, t_start.strftime(t_format)))
+
+        packets = self._iterate_packets()
+        if self._profiler is not None:
+            packets = self._profiler.iterate(packets)
+
+        for packet in packets:
+
+            self._snapshot_clock.advance(packet.timestamp)
+
+            ## Handle SEQ direction if source IP is within campus and destination IP is NOT within campus (every packet without direction filter)
+            if packet.direction & DIRECTION_SEQ:
+                if self._test:
+                    self._custom_print("\nHandle SEQ direction")
+
+                if self._tcptrace_const is not None:
                     self._tcptrace_const.process_tcptrace_SEQ(packet)
-                    # dbg_time_end = datetime.now()
-                    # time_seq_tcptrace.append((dbg_time_end-dbg_time_start)/timedelta(microseconds=1))
-                    
-                    # dbg_time_start = datetime.now()
-                    self._handle_SEQ_direction(packet)
-                    # dbg_time_end = datetime.now()
-                    # time_seq_p4rtt.append((dbg_time_end-dbg_time_start)/timedelta(microseconds=1))
-
-                ## Handle ACK direction if source IP is NOT within campus and destination IP is within campus
-                # if not self._is_home(packet["ipsrc"]) and self._is_home(packet["ipdst"]):
-                if True:
-                    if self._test:
-                        self._custom_print("\nHandle ACK direction")
-
-                    # dbg_time_start = datetime.now()
-                    self._tcptrace_const.process_tcptrace_ACK(packet)
-                    # dbg_time_end = datetime.now()
-                    # time_ack_tcptrace.append((dbg_time_end-dbg_time_start)/timedelta(microseconds=1))
+                self._handle_SEQ_direction(packet)
 
-                    # dbg_time_start = datetime.now()
-                    self._handle_ACK_direction(packet)
-                    # dbg_time_end = datetime.now()
-                    # time_ack_p4rtt.append((dbg_time_end-dbg_time_start)/timedelta(microseconds=1))
-                
-                ## Log state of data structures
+            ## Handle ACK direction if source IP is NOT within campus and destination IP is within campus (every packet without direction filter)
+            if packet.direction & DIRECTION_ACK:
                 if self._test:
-                    self._custom_print("\nState of tables after processing packet no. {}:\n".format(self._packets_count))
-                    self._custom_print(self._flow_table)
-                    self._custom_print()
-                    self._custom_print(self._packet_table)
+                    self._custom_print("\nHandle ACK direction")
+
+                if self._tcptrace_const is not None:
+                    self._tcptrace_const.process_tcptrace_ACK(packet)
+                self._handle_ACK_direction(packet)
+            
+            ## Log state of data structures
+            if self._test:
+                self._custom_print("\nState of tables after processing packet no. {}:\n".format(self._packets_count))
+                self._custom_print(self._flow_table)
+                self._custom_print()
+                self._custom_print(self._packet_table)
+                self._custom_print()
+                if self._enable_apxft:
+                    self._custom_print(self._apxflow_table)
                     self._custom_print()
-                    if self._enable_apxft:
-                        self._custom_print(self._apxflow_table)
-                        self._custom_print()
-                    self._flow_table.accountant.stateMismatchInfo(self._packets_count)
-                    self._packet_table.accountant.stateMismatchInfo(self._packets_count)
+                self._flow_table.accountant.stateMismatchInfo(self._packets_count)
+                self._packet_table.accountant.stateMismatchInfo(self._packets_count)
 
         self._custom_print("{} Round {}/{}: Processing complete; processed {}M/{}M packets in this simulation".format(
                                 self._time_elapsed(), self._round_number, self._max_round_number, round((self._packets_count+1)/1000000, 2),
                                 round(self._total_packets_count/1000000, 2)))
-        
-        # print("Total time taken per SEQ packet (tcptrace): {}".format(round(np.sum(time_seq_tcptrace))))
-        # print("Total time taken per SEQ packet (p4rtt): {}".format(round(np.sum(time_seq_p4rtt))))
-        # print("Total time taken per ACK packet (tcptrace): {}".format(round(np.sum(time_ack_tcptrace))))
-        # print("Total time taken per ACK packet (p4rtt): {}".format(round(np.sum(time_ack_p4rtt))))
-        
-        
+
         ## Logging
 
         ## Last snapshot is explicit
         self._custom_print("{} Round {}/{}: Trigger last snapshot explicitly".format(self._time_elapsed(), self._round_number, self._max_round_number))
-        self._flow_table.accountant.explicitSnapshot(latest_tstamp)
+        self._flow_table.accountant.explicitSnapshot(self._latest_tstamp)
         if self._flow_table._synAction == "staging":
-            self._flow_table._syn_table.accountant.explicitSnapshot(latest_tstamp)
-        self._packet_table.accountant.explicitSnapshot(latest_tstamp)
+            self._flow_table._syn_table.accountant.explicitSnapshot(self._latest_tstamp)
+        self._packet_table.accountant.explicitSnapshot(self._latest_tstamp)
 
         ## Save snapshots
         self._custom_print("{} Round {}/{}: Save all snapshots".format(self._time_elapsed(), self._round_number, self._max_round_number))
@@ -775,9 +975,11 @@ class Simulation(object):
         for flow_key in self._p4rtt_rtt_samples:
             p4rtt_rtt_all.extend([t[1] for t in self._p4rtt_rtt_samples[flow_key]])
         ## tcptrace
-        tcptrace_rtt_all = []
-        for flow_key in self._tcptrace_const._tcptrace_rtt_samples:
-            tcptrace_rtt_all.extend([t[1] for t in self._tcptrace_const._tcptrace_rtt_samples[flow_key]])
+        tcptrace_rtt_all = None
+        if self._tcptrace_const is not None:
+            tcptrace_rtt_all = []
+            for flow_key in self._tcptrace_const._tcptrace_rtt_samples:
+                tcptrace_rtt_all.extend([t[1] for t in self._tcptrace_const._tcptrace_rtt_samples[flow_key]])
         
         # self._flow_table.accountant._plotMetricCDF(p4rtt_rtt_all, "rtt_samples_cdf", "red", "-", "RTT (ms) CDF ({} Samples)".format(
         #                                             self._p4rtt_sample_count))
@@ -787,19 +989,16 @@ class Simulation(object):
         # self._packet_table.accountant.stateValidationInfo(self._time_elapsed())
 
         ## Plot RTT comparison
-        self._tcptrace_const.concludeRTTDict()
+        if self._tcptrace_const is not None:
+            self._tcptrace_const.concludeRTTDict()
         # self._plotter.plotPerformanceComparison(self._tcptrace_const._tcptrace_rtt_samples, self._p4rtt_rtt_samples,
         #                                         self._tcptrace_const._tcptrace_sample_count, self._p4rtt_sample_count)
         
         ## Save RTT Samples
-        ### P4RTT
-        with open(os.path.join(self._simulation_dir, "rtt_samples_p4rtt.txt"), "w") as fp:
-            lines = ["{}".format(point) for point in p4rtt_rtt_all]
-            fp.write("\n".join(lines))
-        ## tcptrace
-        with open(os.path.join(self._simulation_dir, "rtt_samples_tcptrace_const.txt"), "w") as fp:
-            lines = ["{}".format(point) for point in tcptrace_rtt_all]
-            fp.write("\n".join(lines))
+        if self._p4rtt_sink is not None:
+            self._close_rtt_sinks()
+        else:
+            self._save_rtt_samples(p4rtt_rtt_all, tcptrace_rtt_all)
         
         # num_seq_pkts = 0
         # num_ack_pkts = 0
@@ -817,13 +1016,21 @@ class Simulation(object):
         # print("{0} Round {1}/{2}: Packet records: Mean: {3}, Stdv.: {4}".format(self._time_elapsed(), self._round_number, self._max_round_number,
         #         np.mean(self._tcptrace_const._intervalActivePackets), np.std(self._tcptrace_const._intervalActivePackets) ))
 
-        self._tcptrace_const.plot_tcptrace_stats(latest_tstamp)
+        ## Headless runs skip plotting, so matplotlib is never imported
+        if self._tcptrace_baseline is not None:
+            self._restore_tcptrace_baseline()
+        elif not self._no_plots:
+            self._tcptrace_const.plot_tcptrace_stats(self._latest_tstamp)
 
         # self._tcptrace_const.investigate_bias(self._flow_table)
         
         
+        if self._profiler is not None:
+            self._save_profile()
+
         t_end = datetime.now()
         t_elapsed = round((t_end - t_start)/timedelta(minutes=1), 2)
+        self._write_round_manifest((t_end - t_start)/timedelta(seconds=1))
         self._custom_print("{0} Round {1}/{2}: Finished simulation for round {1} at time {3}. Time elapsed: {4} mins.".format(
                                 self._time_elapsed(), self._round_number, self._max_round_number, t_end.strftime(t_format), t_elapsed))
 
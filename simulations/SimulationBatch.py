@@ -1,13 +1,19 @@
 from Simulation import Simulation
+from BatchScheduler import BatchScheduler
+from round_manifest import simulation_round_dir, simulation_params_hash, check_round_manifest, read_round_manifest, write_round_manifest
+from ResultCache import ResultCache
+from TCPTraceBaseline import TCPTraceBaseline, baseline_options, baseline_cache_dir
+from ColumnarTrace import convert_pickle_to_columnar, is_columnar_trace
 from multiprocessing import Pool, Process, cpu_count
 from datetime import datetime, timedelta
 from itertools import product, chain
-from shutil import copy, move
+from shutil import copy, move, rmtree
 from sys import exit
 import subprocess
 import pickle
 import json
 import stat
+import re
 import os
 
 ##################################################
@@ -16,7 +22,9 @@ class SimulationBatch(object):
 
     ##################################################
 
-    def __init__(self, tcptrace_data_paths, flowtab_params, packettab_params, apxflowtab_params, test=True):
+    def __init__(self, tcptrace_data_paths, flowtab_params, packettab_params, apxflowtab_params, test=True, sim_options=None, resume=False, cache_params=None):
+        ## resume: continue the latest batch in p4rtt_simulations_dir, rerunning only rounds without a valid completion manifest
+        ## cache_params: {"cache_dir": ..., "max_size_mb": ...} to reuse results of identical rounds from earlier batches
         
         self._start_time              = (datetime.now() - datetime.utcfromtimestamp(0)).total_seconds()
         self._test                    = test
@@ -27,6 +35,12 @@ class SimulationBatch(object):
         self._simulation_batch_number = None
         self._simulation_batch_dir    = None
         self._tcptrace_data_paths     = tcptrace_data_paths
+        self._sim_options             = sim_options if sim_options is not None else {}
+        self._resume                  = resume
+        self._result_cache            = None
+        self._release_trace_dir       = None
+        if cache_params is not None:
+            self._result_cache = ResultCache(cache_params["cache_dir"], cache_params.get("max_size_mb", None))
 
         ## Read flow table parameters
         reqd_flowtab_params = ["num_stages", "max_size", "recirculations", "prefer_new", "eviction_stage", "entry_timeout", \
@@ -71,7 +85,12 @@ class SimulationBatch(object):
         for batch_dirname in os.listdir(self._simulation_results_dir):
             if os.path.isdir(os.path.join(self._simulation_results_dir, batch_dirname)):
                 batch_numbers.append(int(batch_dirname.split("_")[2]))
-        if len(batch_numbers) > 0:
+        if self._resume:
+            if len(batch_numbers) == 0:
+                self._custom_print("No simulation batch to resume. Exit simulation.")
+                exit(1)
+            self._simulation_batch_number = max(batch_numbers)
+        elif len(batch_numbers) > 0:
             self._simulation_batch_number = max(batch_numbers) + 1
         else:
             self._simulation_batch_number = 0
@@ -79,11 +98,18 @@ class SimulationBatch(object):
         ## Create simulation batch directory
         self._simulation_batch_dir = os.path.join(tcptrace_data_paths["p4rtt_simulations_dir"], "simulation_batch_{}".format(
             str(self._simulation_batch_number).zfill(3)))
-        if os.path.exists(self._simulation_batch_dir):
+        if self._resume:
+            self._custom_print("Resume batch in directory: {}".format(self._simulation_batch_dir))
+        elif os.path.exists(self._simulation_batch_dir):
             self._custom_print("Batch path already exists. Exit simulation.")
             exit(1)
-        self._custom_print("Create directory: {}".format(self._simulation_batch_dir))
-        os.makedirs(self._simulation_batch_dir)
+        else:
+            self._custom_print("Create directory: {}".format(self._simulation_batch_dir))
+            os.makedirs(self._simulation_batch_dir)
+
+        ## Map the trace once for all rounds
+        if self._sim_options.get("shared_trace", False):
+            self._prepare_shared_trace()
 
         ## Determine execution script path
         if not os.path.exists("scripts"):
@@ -145,6 +171,11 @@ class SimulationBatch(object):
         params_lines.append("sampling_rate: {}".format(self._apxflowtab_params["sampling_rate"]))
         params_lines.append("log_interval: {}".format(self._apxflowtab_params["log_interval"]))
         params_lines.append("")
+        if self._sim_options:
+            params_lines.append("##### Simulation Options #####")
+            for option in sorted(self._sim_options):
+                params_lines.append("{}: {}".format(option, self._sim_options[option]))
+            params_lines.append("")
         params_lines.append("##################################################\n")
         
         params_text = "\n".join(params_lines)
@@ -187,11 +218,69 @@ class SimulationBatch(object):
 
     ##################################################
 
-    def _augment_execution_script(self, simulation_parameters):
+    def _prepare_shared_trace(self):
+        ## Convert the pickled trace to a columnar trace once (in /dev/shm by default); every round then memory-maps
+        ## the same read-only column files instead of unpickling its own copy of the trace
+
+        if "part_pkts_columnar" in self._tcptrace_data_paths:
+            self._custom_print("Trace is already columnar; rounds share it via mmap: {}".format(self._tcptrace_data_paths["part_pkts_columnar"]))
+            return
+
+        pickle_path = self._tcptrace_data_paths["part_pkts_pickle"]
+        in_shm      = "shared_trace_dir" not in self._sim_options and os.path.isdir("/dev/shm")
+        if in_shm:
+            cache_dir = "/dev/shm"
+        else:
+            cache_dir = self._sim_options.get("shared_trace_dir", self._simulation_batch_dir)
+
+        ## Key the cached trace on the source pickle so that a modified pickle is converted again
+        pickle_st  = os.stat(pickle_path)
+        trace_base = os.path.splitext(os.path.basename(pickle_path))[0]
+        trace_name = "{}_{}_{}.columnar".format(trace_base, pickle_st.st_size, pickle_st.st_mtime_ns)
+        trace_dir  = os.path.join(cache_dir, "p4rtt_trace_cache", trace_name)
+
+        if is_columnar_trace(trace_dir):
+            self._custom_print("Reuse shared trace: {}".format(trace_dir))
+        else:
+            self._custom_print("Convert {} to shared trace: {}".format(pickle_path, trace_dir))
+            tmp_trace_dir = "{}.tmp{}".format(trace_dir, os.getpid())
+            count = convert_pickle_to_columnar(pickle_path, tmp_trace_dir)
+            if is_columnar_trace(trace_dir):
+                rmtree(tmp_trace_dir)
+            else:
+                os.replace(tmp_trace_dir, trace_dir)
+            self._custom_print("Shared trace holds {} packets".format(count))
+
+            ## Versions of older copies of this pickle are stale
+            stale_name = re.compile(re.escape(trace_base) + r"_\d+_\d+\.columnar$")
+            for name in os.listdir(os.path.dirname(trace_dir)):
+                if name != trace_name and stale_name.match(name):
+                    self._custom_print("Remove stale shared trace: {}".format(name))
+                    rmtree(os.path.join(os.path.dirname(trace_dir), name), ignore_errors=True)
+
+        ## A trace in /dev/shm holds its size in RAM, so it only lives as long as the batch's rounds
+        if in_shm:
+            self._release_trace_dir = trace_dir
+
+        self._tcptrace_data_paths = dict(self._tcptrace_data_paths)
+        self._tcptrace_data_paths["part_pkts_columnar"] = trace_dir
+
+    ##################################################
+
+    def _release_shared_trace(self):
+
+        if self._release_trace_dir is not None and os.path.exists(self._release_trace_dir):
+            self._custom_print("Remove shared trace: {}".format(self._release_trace_dir))
+            rmtree(self._release_trace_dir, ignore_errors=True)
+        self._release_trace_dir = None
+
+    ##################################################
+
+    def _augment_execution_script(self, simulation_parameters, script="Simulation.py"):
 
         params_str = json.dumps(simulation_parameters)
-        command = "nohup python3 -u Simulation.py '{}' 1>>{} 2>&1 &\n".format(
-                    params_str, self._log_file)
+        command = "nohup python3 -u {} '{}' 1>>{} 2>&1 &\n".format(
+                    script, params_str, self._log_file)
         
         with open(self._local_exec_script, 'a') as fp:
             fp.write(command)
@@ -216,7 +305,7 @@ class SimulationBatch(object):
 
     ##################################################
 
-    def p4rtt_simulate_batch(self):
+    def _build_simulation_params(self):
 
         iterables = {"True": [], "False": []}
 
@@ -262,6 +351,7 @@ class SimulationBatch(object):
             simulation_params["sim_params"]["round_number"]        = count_round
             simulation_params["sim_params"]["combinations_count"]  = self._num_combinations
             simulation_params["sim_params"]["start_time"]          = self._start_time
+            simulation_params["sim_params"]["sim_options"]         = self._sim_options
             count_round += 1
             ## Flow table params
             simulation_params["flowtab_params"]["num_stages"]                 = next(params)
@@ -305,17 +395,149 @@ class SimulationBatch(object):
                 simulation_params["apxflowtab_params"]["log_interval"]        = next(params)
             ## Append to all params list
             all_simulation_params.append(simulation_params)
-            # ## No multiprocessing here
-            # self._trigger_p4rtt_simulation(simulation_params)
-            ## Alternative: Execution script
-            self._augment_execution_script(simulation_params)
-        
-        self._conclude_execution_script()
-        
+
+        return all_simulation_params
+
+    ##################################################
+
+    def _skip_completed_rounds(self, all_simulation_params):
+        ## Keep rounds whose completion manifest is missing, stale, or does not match their outputs; clear their partial results
+
+        pending_simulation_params = []
+        for simulation_params in all_simulation_params:
+            round_number = simulation_params["sim_params"]["round_number"]
+            round_dir    = simulation_round_dir(self._simulation_batch_dir, round_number, self._num_combinations)
+            reason       = check_round_manifest(round_dir, simulation_params_hash(simulation_params))
+            if reason is None:
+                continue
+            if os.path.exists(round_dir):
+                self._custom_print("Rerun round {} ({}); clear {}".format(round_number, reason, round_dir))
+                rmtree(round_dir)
+            pending_simulation_params.append(simulation_params)
+
+        self._custom_print("Resume: {}/{} rounds already complete".format(
+                            len(all_simulation_params) - len(pending_simulation_params), len(all_simulation_params)))
+
+        return pending_simulation_params
+
+    ##################################################
+
+    def _restore_cached_rounds(self, all_simulation_params):
+        ## Materialize rounds found in the result cache; returns the rounds that still need to be simulated
+
+        pending_simulation_params = []
+        for simulation_params in all_simulation_params:
+            round_number = simulation_params["sim_params"]["round_number"]
+            round_dir    = simulation_round_dir(self._simulation_batch_dir, round_number, self._num_combinations)
+            wall_time    = self._result_cache.restore(self._result_cache.result_key(simulation_params), round_dir, round_number)
+            if wall_time is None:
+                pending_simulation_params.append(simulation_params)
+            else:
+                write_round_manifest(round_dir, simulation_params_hash(simulation_params), wall_time)
+
+        self._custom_print("Result cache: {}/{} rounds restored".format(
+                            len(all_simulation_params) - len(pending_simulation_params), len(all_simulation_params)))
+
+        return pending_simulation_params
+
+    ##################################################
+
+    def _store_cached_rounds(self, all_simulation_params):
+
+        for simulation_params in all_simulation_params:
+            round_dir = simulation_round_dir(self._simulation_batch_dir, simulation_params["sim_params"]["round_number"], self._num_combinations)
+            if check_round_manifest(round_dir, simulation_params_hash(simulation_params)) is not None:
+                continue
+            self._result_cache.store(self._result_cache.result_key(simulation_params), round_dir, read_round_manifest(round_dir)["wall_time_secs"])
+
+    ##################################################
+
+    def _prepare_tcptrace_baseline(self, all_simulation_params):
+        ## Compute the tcptrace_const baseline of every distinct set of baseline options once, before the rounds that reuse it start
+        ## (sharded across "tcptrace_baseline_workers" processes, since no round runs yet)
+
+        if len(all_simulation_params) == 0:
+            return
+
+        tcptrace_baseline = TCPTraceBaseline(baseline_cache_dir(all_simulation_params[0]))
+        tcptrace_data_paths = all_simulation_params[0]["sim_params"]["tcptrace_data_paths"]
+        all_options = {}
+        for simulation_params in all_simulation_params:
+            options = baseline_options(simulation_params)
+            all_options[json.dumps(options, sort_keys=True)] = options
+
+        for options in all_options.values():
+            key = tcptrace_baseline.key(tcptrace_data_paths, options)
+            if tcptrace_baseline.has(key):
+                self._custom_print("Reuse tcptrace_const baseline {} ({})".format(key[:12], options))
+            else:
+                tcptrace_baseline.compute(tcptrace_data_paths, options, workers=self._sim_options.get("tcptrace_baseline_workers", 1))
+
+    ##################################################
+
+    def _group_lockstep_lanes(self, all_simulation_params):
+        ## Rounds that only differ in their packet table params share one lockstep simulation
+
+        groups = {}
+        for simulation_params in all_simulation_params:
+            shared = {k: v for k, v in simulation_params.items() if k != "packettab_params"}
+            shared["sim_params"] = {k: v for k, v in simulation_params["sim_params"].items() if k != "round_number"}
+            groups.setdefault(json.dumps(shared, sort_keys=True), []).append(simulation_params)
+
+        return list(groups.values())
+
+    ##################################################
+
+    def p4rtt_simulate_batch(self, lockstep=False, sched_params=None):
+        ## lockstep: run packet table sweeps as one LockstepSimulation per set of shared FT/AFT params instead of one process per round
+        ## sched_params: run the simulations on a bounded BatchScheduler worker pool instead of starting them all from the execution script
+
+        all_simulation_params = self._build_simulation_params()
+        if self._resume:
+            all_simulation_params = self._skip_completed_rounds(all_simulation_params)
+        if self._result_cache is not None:
+            all_simulation_params = self._restore_cached_rounds(all_simulation_params)
+        if self._sim_options.get("tcptrace_baseline", False):
+            self._prepare_tcptrace_baseline(all_simulation_params)
+
+        ## (label, script, params) per simulation process
+        simulation_runs = []
+        if lockstep:
+            simulation_groups = self._group_lockstep_lanes(all_simulation_params)
+            self._custom_print("No. of lockstep simulations in this batch: {}".format(len(simulation_groups)))
+            for simulation_params_list in simulation_groups:
+                round_numbers = [simulation_params["sim_params"]["round_number"] for simulation_params in simulation_params_list]
+                simulation_runs.append(("rounds {}".format(round_numbers), "LockstepSimulation.py", simulation_params_list))
+        else:
+            for simulation_params in all_simulation_params:
+                simulation_runs.append(("round {}".format(simulation_params["sim_params"]["round_number"]), "Simulation.py", simulation_params))
+
         ## Trigger simulations in a multiprocessed fashion
         self._custom_print("No. of CPUs: {}".format(cpu_count()))
         self._custom_print("No. of usable CPUs: {}".format(len(os.sched_getaffinity(0))))
 
-        self._trigger_execution_script()
+        if sched_params is not None:
+            scheduler = BatchScheduler(sched_params, self._log_file)
+            results = scheduler.run([(label, ["python3", "-u", script, json.dumps(params)]) for label, script, params in simulation_runs])
+            failed  = [label for label in results if results[label] != "done"]
+            if len(failed) > 0:
+                self._custom_print("Failed simulations: {}".format(", ".join(failed)))
+        else:
+            for _, script, params in simulation_runs:
+                # ## No multiprocessing here
+                # self._trigger_p4rtt_simulation(simulation_params)
+                ## Alternative: Execution script
+                self._augment_execution_script(params, script)
+            
+            self._conclude_execution_script()
+            self._trigger_execution_script()
+            results = None
+
+        if self._result_cache is not None:
+            self._store_cached_rounds(all_simulation_params)
+
+        self._release_shared_trace()
+
+        return results
 
 ##################################################
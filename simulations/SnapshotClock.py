@@ -0,0 +1,47 @@
+##################################################
+
+class SnapshotClock(object):
+    ''' Single simulation clock for the periodic snapshots of all tables and baselines of a simulation.
+        The simulation advances it once per packet; only when the packet's timestamp reaches the earliest scheduled
+        snapshot boundary does it fire the registered snapshot callbacks, each of which reschedules its next boundary. '''
+
+    ##################################################
+
+    def __init__(self):
+
+        self._callbacks     = []
+        self._next_boundary = None
+        self._current_time  = None
+
+    ##################################################
+
+    def register(self, snapshot_callback):
+        ## snapshot_callback(t): snapshot (or mark as due) if the subscriber's boundary is reached at time t, then schedule its next boundary
+        self._callbacks.append(snapshot_callback)
+
+    ##################################################
+
+    def schedule(self, boundary):
+        if self._next_boundary is None or boundary < self._next_boundary:
+            self._next_boundary = boundary
+
+    ##################################################
+
+    def current_time(self):
+        return self._current_time
+
+    ##################################################
+
+    def advance(self, t):
+
+        self._current_time = t
+
+        ## Until the first boundary is scheduled, callbacks run on every packet
+        if self._next_boundary is not None and t < self._next_boundary:
+            return
+
+        self._next_boundary = None
+        for snapshot_callback in self._callbacks:
+            snapshot_callback(t)
+
+##################################################
@@ -0,0 +1,101 @@
+from defined_subnets import PU_SNETS, DEFINED_SUBNETS
+from ColumnarTrace import DIRECTION_NONE, DIRECTION_SEQ, DIRECTION_ACK
+import numpy as np
+
+##################################################
+
+class SubnetMatcher(object):
+    ''' Longest-prefix match of packed IPv4 addresses against labelled subnets.
+        The subnets are compiled into sorted, disjoint address intervals, each carrying the label of its most specific
+        covering subnet, so a lookup is a single binary search; match() does it for a whole address array at once. '''
+
+    ##################################################
+
+    def __init__(self, labelled_subnets, default_label=0):
+        ## labelled_subnets: [(ip_network, label)]; of equally specific subnets, the later one wins
+        ## Non-IPv4 subnets are ignored (trace addresses are packed IPv4)
+
+        subnets = sorted([(snet.prefixlen, int(snet.network_address), int(snet.broadcast_address) + 1, label)
+                            for snet, label in labelled_subnets if snet.version == 4], key=lambda subnet: subnet[0])
+
+        ## Interval boundaries: every subnet start and end
+        boundaries = {0}
+        for _, start, end, _ in subnets:
+            boundaries.add(start)
+            boundaries.add(end)
+        starts = np.array(sorted(b for b in boundaries if b < 2**32), dtype=np.int64)
+        labels = np.full(len(starts), default_label, dtype=np.int64)
+
+        ## Paint from the shortest to the longest prefix, so that more specific subnets win
+        for _, start, end, label in subnets:
+            labels[np.searchsorted(starts, start):np.searchsorted(starts, end)] = label
+
+        ## Merge neighbouring intervals with equal labels
+        keep = np.ones(len(starts), dtype=bool)
+        keep[1:] = labels[1:] != labels[:-1]
+        self._starts = starts[keep]
+        self._labels = labels[keep]
+
+    ##################################################
+
+    def __len__(self):
+        return len(self._starts)
+
+    ##################################################
+
+    def match(self, addresses):
+        ## addresses: array of packed IPv4 addresses; returns the label of each
+        index = np.searchsorted(self._starts, np.asarray(addresses, dtype=np.int64), side="right") - 1
+        return self._labels[index]
+
+    ##################################################
+
+    def match_one(self, address):
+        return int(self._labels[np.searchsorted(self._starts, int(address), side="right") - 1])
+
+##################################################
+
+def home_matcher(category="any"):
+    ## Labels home addresses 1, others 0: PU_SNETS[:17] are campus subnets, PU_SNETS[17:] are excluded from them.
+    ## For a DEFINED_SUBNETS category other than "any", only the category's (campus) subnets are home.
+
+    if category not in DEFINED_SUBNETS:
+        raise Exception("Unknown subnet category: {}".format(category))
+
+    home_subnets = DEFINED_SUBNETS[category] if DEFINED_SUBNETS[category] else PU_SNETS[:17]
+
+    labelled_subnets  = [(snet, 1) for snet in home_subnets]
+    labelled_subnets += [(snet, 0) for snet in PU_SNETS[17:]]
+
+    return SubnetMatcher(labelled_subnets)
+
+##################################################
+
+def label_directions(ipsrc, ipdst, matcher):
+    ## DIRECTION_SEQ for packets leaving home, DIRECTION_ACK for packets entering it, DIRECTION_NONE otherwise
+
+    src_home = matcher.match(ipsrc).astype(bool)
+    dst_home = matcher.match(ipdst).astype(bool)
+
+    directions = np.full(len(src_home), DIRECTION_NONE, dtype=np.uint8)
+    directions[src_home & ~dst_home] = DIRECTION_SEQ
+    directions[~src_home & dst_home] = DIRECTION_ACK
+
+    return directions
+
+##################################################
+
+def iter_directed_chunks(packets_trace, chunk_size, category):
+    ## Chunks of a columnar trace with a "direction" column, as labelled by preprocess_trace or, if missing, computed per chunk
+
+    direction_column = "direction_{}".format(category)
+    matcher = None if packets_trace.has_column(direction_column) else home_matcher(category)
+
+    for offset, chunk in packets_trace.iter_chunks(chunk_size):
+        if matcher is None:
+            chunk["direction"] = chunk[direction_column]
+        else:
+            chunk["direction"] = label_directions(chunk["ipsrc"], chunk["ipdst"], matcher)
+        yield offset, chunk
+
+##################################################
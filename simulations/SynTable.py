@@ -2,10 +2,6 @@
 from CuckooHashTable import CuckooHashTable
 from datetime import datetime, timedelta
 from random import randint
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import itertools
 from zlib import crc32
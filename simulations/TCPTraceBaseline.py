@@ -0,0 +1,505 @@
+from defined_subnets import DEFINED_SUBNETS
+from TCPTraceConst import TCPTraceConstVariants, TCPTracePolicy, plot_tcptrace_snapshots
+from SnapshotClock import SnapshotClock
+from ResultCache import ResultCache
+from RTTSampleSink import RTTSampleSink, RTT_SINK_DIRS, RTT_SAMPLE_COLUMNS, RTT_FLOW_COLUMNS, DEFAULT_BUFFER_SIZE, write_rtt_samples_text, \
+                            write_rtt_sink_meta, load_rtt_sink
+from ColumnarTrace import ColumnarTrace, DEFAULT_CHUNK_SIZE, DIRECTION_ACK, iter_columns_as_packets, packet_from_record, \
+                            convert_pickle_to_columnar, is_columnar_trace
+from SubnetMatcher import home_matcher, label_directions, iter_directed_chunks
+from shutil import copy, copytree, rmtree
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+import numpy as np
+import itertools
+import hashlib
+import pickle
+import json
+import os
+
+##################################################
+
+BASELINE_VERSION    = 1
+BASELINE_ENTRY_FILE = "baseline_entry.json"
+BASELINE_CACHE_NAME = "tcptrace_baseline_cache"
+
+## Trace position of every sample in a shard's sink
+SHARD_PKTNO_FILE    = "pktno.bin"
+
+## Files rendered from an entry on first use
+BASELINE_TEXT_FILE  = RTT_SINK_DIRS["tcptrace_const"] + ".txt"
+BASELINE_PLOTS_DIR  = "tcptrace_const"
+BASELINE_PLOT_FILES = ["tcptrace_flows_records.png", "tcptrace_packet_records.png"]
+
+##################################################
+
+def baseline_options(simulation_params):
+    ## Everything besides the trace that the tcptrace_const results of a round depend on; the table params only set the log interval
+
+    sim_options      = simulation_params["sim_params"].get("sim_options", {})
+    direction_filter = sim_options.get("direction_filter")
+    if direction_filter not in DEFINED_SUBNETS:
+        direction_filter = None
+
+    return {
+                "log_interval": simulation_params["flowtab_params"]["log_interval"],
+                "direction_filter": direction_filter,
+                "idle_timeout": sim_options.get("tcptrace_idle_timeout"),
+            }
+
+##################################################
+
+def baseline_cache_dir(simulation_params):
+    ## "tcptrace_baseline_dir" option, or a cache next to the simulation batches
+
+    sim_params = simulation_params["sim_params"]
+    return sim_params.get("sim_options", {}).get("tcptrace_baseline_dir",
+                os.path.join(sim_params["tcptrace_data_paths"]["p4rtt_simulations_dir"], BASELINE_CACHE_NAME))
+
+##################################################
+
+def iter_trace_packets(tcptrace_data_paths, direction_filter=None):
+    ## Packet records of a trace exactly as a simulation round iterates them (packets of neither direction are skipped)
+
+    for _ in range(tcptrace_data_paths["part_pkts_count"]):
+
+        if "part_pkts_columnar" in tcptrace_data_paths:
+            packets_trace = ColumnarTrace(tcptrace_data_paths["part_pkts_columnar"])
+            chunk_size    = tcptrace_data_paths.get("chunk_size", DEFAULT_CHUNK_SIZE)
+            if direction_filter is None:
+                packets = packets_trace.iter_packets(chunk_size)
+            else:
+                packets = iter_columns_as_packets(iter_directed_chunks(packets_trace, chunk_size, direction_filter))
+        else:
+            with open(tcptrace_data_paths["part_pkts_pickle"], "rb") as packets_fp:
+                packets = [packet_from_record(packet_data) for packet_data in pickle.load(packets_fp)]
+            if direction_filter is not None:
+                directions = label_directions([packet.ipsrc for packet in packets], [packet.ipdst for packet in packets],
+                                                home_matcher(direction_filter)).tolist()
+                packets = [packet._replace(direction=direction) for packet, direction in zip(packets, directions) if direction]
+
+        for packet in packets:
+            yield packet
+
+##################################################
+
+def _baseline_results(tcptrace_variants, policies, packets_count):
+    ## {policy: results of its variant}, closing the variants' sinks
+
+    results = {}
+    for variant, (policy, sample_count) in enumerate(zip(policies, tcptrace_variants.close_rtt_sinks())):
+        snapshot_time, active_flows, active_packets = tcptrace_variants.snapshot_series(variant)
+        results[policy] = {
+                            "packets_count": packets_count,
+                            "sample_count": sample_count,
+                            "snapshot_time": snapshot_time,
+                            "active_flows": active_flows,
+                            "active_packets": active_packets,
+                        }
+
+    return results
+
+##################################################
+
+def simulate_baseline(tcptrace_data_paths, options, policies, variant_dirs):
+    ## One pass of tcptrace_const under all policies over the trace; RTT samples go to a sink in variant_dirs[policy]
+
+    rtt_sinks         = [RTTSampleSink(os.path.join(variant_dirs[policy], RTT_SINK_DIRS["tcptrace_const"])) for policy in policies]
+    tcptrace_variants = TCPTraceConstVariants(policies, options["log_interval"], rtt_sinks, idle_timeout=options["idle_timeout"])
+    snapshot_clock    = SnapshotClock()
+    tcptrace_variants.set_snapshot_clock(snapshot_clock)
+
+    packets_count = 0
+    latest_tstamp = None
+    for packet in iter_trace_packets(tcptrace_data_paths, options["direction_filter"]):
+
+        if packets_count == 0:
+            tcptrace_variants._firstEntryTime = packet.timestamp
+        packets_count += 1
+        latest_tstamp  = packet.timestamp
+
+        snapshot_clock.advance(packet.timestamp)
+        tcptrace_variants.process_packet(packet)
+
+    ## Last snapshot is explicit, as before a round's plots
+    if latest_tstamp is not None:
+        tcptrace_variants._create_tcptrace_snapshot(latest_tstamp, True)
+
+    return _baseline_results(tcptrace_variants, policies, packets_count)
+
+##################################################
+
+def connection_shards(chunk, shards):
+    ## Shard of every packet's connection: a hash of its two endpoints in canonical order, so both directions map to the same shard
+
+    endpoint_src = (chunk["ipsrc"].astype(np.uint64) << np.uint64(16)) | chunk["tcpsrc"].astype(np.uint64)
+    endpoint_dst = (chunk["ipdst"].astype(np.uint64) << np.uint64(16)) | chunk["tcpdst"].astype(np.uint64)
+
+    ## splitmix64 finalizer over both endpoints
+    h  = np.minimum(endpoint_src, endpoint_dst) * np.uint64(0x9E3779B97F4A7C15) ^ np.maximum(endpoint_src, endpoint_dst)
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+
+    return h % np.uint64(shards)
+
+##################################################
+
+class ShardRTTSampleSink(RTTSampleSink):
+    ''' RTT sample sink of one shard that also records, for every sample, the position of its ACK packet in the pass
+        over the whole trace; the shards' samples are merged in that order '''
+
+    ##################################################
+
+    def __init__(self, sink_dir, buffer_size=DEFAULT_BUFFER_SIZE):
+
+        RTTSampleSink.__init__(self, sink_dir, buffer_size)
+        self.pktno   = None
+        self._pktnos = []
+        with open(os.path.join(self._sink_dir, SHARD_PKTNO_FILE), "wb"):
+            pass
+
+    ##################################################
+
+    def add(self, flow_key, seqno, ts_us, rtt_us):
+        self._pktnos.append(self.pktno)
+        RTTSampleSink.add(self, flow_key, seqno, ts_us, rtt_us)
+
+    ##################################################
+
+    def _flush(self):
+
+        with open(os.path.join(self._sink_dir, SHARD_PKTNO_FILE), "ab") as fp:
+            fp.write(np.asarray(self._pktnos, dtype="<i8").tobytes())
+        self._pktnos = []
+        RTTSampleSink._flush(self)
+
+##################################################
+
+def simulate_baseline_shard(trace_dir, chunk_size, part_pkts_count, options, policies, variant_dirs, shard, shards):
+    ## simulate_baseline on the connections of one shard of a columnar trace. Every shard scans the timestamps of all
+    ## packets and takes its snapshots at the same packets as a single pass, so the shards' counts add up.
+
+    rtt_sinks         = [ShardRTTSampleSink(os.path.join(variant_dirs[policy], RTT_SINK_DIRS["tcptrace_const"])) for policy in policies]
+    tcptrace_variants = TCPTraceConstVariants(policies, options["log_interval"], rtt_sinks, idle_timeout=options["idle_timeout"])
+    ## Snapshots are taken below at the packets they are due at; the clock is never advanced, it only disables the per-packet checks
+    tcptrace_variants.set_snapshot_clock(SnapshotClock())
+
+    packets_trace    = ColumnarTrace(trace_dir)
+    direction_filter = options["direction_filter"]
+    packets_count    = 0
+    first_tstamp     = None
+    latest_tstamp    = None
+    max_elapsed      = None
+
+    for _ in range(part_pkts_count):
+
+        if direction_filter is None:
+            chunks = packets_trace.iter_chunks(chunk_size)
+        else:
+            chunks = iter_directed_chunks(packets_trace, chunk_size, direction_filter)
+
+        for offset, chunk in chunks:
+
+            ## Packets of neither direction are not part of the pass
+            if "direction" in chunk:
+                chunk = {name: column[np.flatnonzero(chunk["direction"])] for name, column in chunk.items()}
+            ts_us = chunk["ts_us"]
+            if len(ts_us) == 0:
+                continue
+
+            if first_tstamp is None:
+                first_tstamp = int(ts_us[0])
+                tcptrace_variants._firstEntryTime = first_tstamp
+
+            ## A snapshot is due at the first packet whose elapsed time (ms) reaches the cutoff, which is where the
+            ## running maximum of the elapsed times first does
+            elapsed = np.maximum.accumulate((ts_us - first_tstamp) / 1000)
+            if max_elapsed is not None:
+                elapsed = np.maximum(elapsed, max_elapsed)
+            max_elapsed   = elapsed[-1]
+            next_snapshot = np.searchsorted(elapsed, tcptrace_variants._snapshot_cutoff())
+
+            own = np.flatnonzero(connection_shards(chunk, shards) == shard)
+            own_packets = iter_columns_as_packets([(offset, {name: column[own] for name, column in chunk.items()})])
+
+            ## The chunk's length stands for the start of the next chunk, to take the snapshots due after the last packet
+            for i, packet in zip(own.tolist() + [len(ts_us)], itertools.chain(own_packets, [None])):
+
+                while next_snapshot <= i and next_snapshot < len(ts_us):
+                    tcptrace_variants._create_tcptrace_snapshot(int(ts_us[next_snapshot]))
+                    next_snapshot = np.searchsorted(elapsed, tcptrace_variants._snapshot_cutoff())
+                if packet is None:
+                    break
+
+                if packet.direction & DIRECTION_ACK:
+                    for rtt_sink in rtt_sinks:
+                        rtt_sink.pktno = packets_count + i
+                tcptrace_variants.process_packet(packet)
+
+            packets_count += len(ts_us)
+            latest_tstamp  = int(ts_us[-1])
+
+    if latest_tstamp is not None:
+        tcptrace_variants._create_tcptrace_snapshot(latest_tstamp, True)
+
+    return _baseline_results(tcptrace_variants, policies, packets_count)
+
+##################################################
+
+def merge_shard_sinks(shard_sink_dirs, sink_dir):
+    ## Merges the shards' sinks into one, with the samples and flow ids in the order a single pass produces them
+
+    shard_columns = [load_rtt_sink(shard_sink_dir) for shard_sink_dir in shard_sink_dirs]
+    pktnos = np.concatenate([np.fromfile(os.path.join(shard_sink_dir, SHARD_PKTNO_FILE), dtype="<i8") for shard_sink_dir in shard_sink_dirs])
+    order  = np.argsort(pktnos, kind="stable")
+
+    ## Flow ids made unique across shards, then renumbered in order of the flows' first samples
+    flow_offsets = np.cumsum([0] + [len(columns["flow_ipsrc"]) for columns in shard_columns])
+    flow_ids     = np.concatenate([columns["flow_id"].astype(np.int64) + flow_offsets[i] for i, columns in enumerate(shard_columns)])[order]
+    shard_flow_ids, first_samples = np.unique(flow_ids, return_index=True)
+    merged_flow_ids = np.empty(len(shard_flow_ids), dtype=np.int64)
+    merged_flow_ids[np.argsort(first_samples, kind="stable")] = np.arange(len(shard_flow_ids))
+    flow_order = np.empty(len(shard_flow_ids), dtype=np.int64)
+    flow_order[merged_flow_ids] = shard_flow_ids
+
+    if not os.path.exists(sink_dir):
+        os.makedirs(sink_dir)
+    for name, dtype in RTT_SAMPLE_COLUMNS:
+        if name == "flow_id":
+            values = merged_flow_ids[np.searchsorted(shard_flow_ids, flow_ids)]
+        else:
+            values = np.concatenate([columns[name] for columns in shard_columns])[order]
+        values.astype(dtype).tofile(os.path.join(sink_dir, name + ".bin"))
+    for name, dtype in RTT_FLOW_COLUMNS:
+        values = np.concatenate([columns["flow_" + name] for columns in shard_columns])[flow_order]
+        values.astype(dtype).tofile(os.path.join(sink_dir, "flow_" + name + ".bin"))
+    write_rtt_sink_meta(sink_dir, len(order), len(shard_flow_ids))
+
+    return len(order)
+
+##################################################
+
+def simulate_baseline_sharded(trace_dir, chunk_size, part_pkts_count, options, policies, variant_dirs, shards):
+    ## simulate_baseline with the connections hash-partitioned across shards worker processes. tcptrace_const state is
+    ## strictly per connection, so the merged results are identical to a single pass.
+
+    shard_dirs = {policy: "{}.shards".format(variant_dirs[policy]) for policy in policies}
+    shard_args = []
+    for shard in range(shards):
+        shard_variant_dirs = {policy: os.path.join(shard_dirs[policy], str(shard)) for policy in policies}
+        shard_args.append((trace_dir, chunk_size, part_pkts_count, options, policies, shard_variant_dirs, shard, shards))
+
+    with Pool(shards) as pool:
+        shard_results = pool.starmap(simulate_baseline_shard, shard_args)
+
+    results = {}
+    for policy in policies:
+        variant_results = [shard_result[policy] for shard_result in shard_results]
+        for variant_result in variant_results[1:]:
+            if variant_result["snapshot_time"] != variant_results[0]["snapshot_time"]:
+                raise Exception("Shards of the tcptrace_const baseline took their snapshots at different times")
+
+        shard_sink_dirs = [os.path.join(shard_dirs[policy], str(shard), RTT_SINK_DIRS["tcptrace_const"]) for shard in range(shards)]
+        sample_count = merge_shard_sinks(shard_sink_dirs, os.path.join(variant_dirs[policy], RTT_SINK_DIRS["tcptrace_const"]))
+        rmtree(shard_dirs[policy])
+
+        results[policy] = {
+                                "packets_count": variant_results[0]["packets_count"],
+                                "sample_count": sample_count,
+                                "snapshot_time": variant_results[0]["snapshot_time"],
+                                "active_flows": np.sum([r["active_flows"] for r in variant_results], axis=0).tolist(),
+                                "active_packets": np.sum([r["active_packets"] for r in variant_results], axis=0).tolist(),
+                            }
+
+    return results
+
+##################################################
+
+class TCPTraceBaseline(object):
+    ''' Persistent store of tcptrace_const results, computed once per trace, set of baseline options, and TCPTracePolicy
+        instead of once per simulation round. An entry holds the RTT samples as an RTTSampleSink and the
+        snapshot series; rounds get the same rtt_samples_tcptrace_const files and plots as if they had simulated
+        tcptrace_const themselves. '''
+
+    ##################################################
+
+    def __init__(self, baseline_dir):
+
+        self._baseline_dir = baseline_dir
+
+        ## Trace digests are memoized like the result cache's (in the same file format, in this directory)
+        self._digests = ResultCache(baseline_dir)
+
+    ##################################################
+
+    def _custom_print(self, text, flush=True):
+        print(text, flush=flush)
+
+    ##################################################
+
+    def key(self, tcptrace_data_paths, options, policy=TCPTracePolicy()):
+
+        key_params = {
+                        "version": BASELINE_VERSION,
+                        "options": options,
+                        "allow_syn": policy.allow_syn,
+                        "part_pkts_count": tcptrace_data_paths["part_pkts_count"],
+                        "trace_digest": self._digests.trace_digest(tcptrace_data_paths),
+                    }
+        ## Policy fields other than allow_syn only enter the key when not at their defaults, so that entries keep their keys
+        for name, value in policy._asdict().items():
+            if name != "allow_syn" and value != TCPTracePolicy._field_defaults[name]:
+                key_params[name] = value
+
+        return hashlib.sha256(json.dumps(key_params, sort_keys=True).encode()).hexdigest()
+
+    ##################################################
+
+    def _entry_dir(self, key):
+        return os.path.join(self._baseline_dir, key[:2], key)
+
+    ##################################################
+
+    def has(self, key):
+        return os.path.exists(os.path.join(self._entry_dir(key), BASELINE_ENTRY_FILE))
+
+    ##################################################
+
+    def rtt_sink_dir(self, key):
+        ## RTT samples of an entry, for load_rtt_sink/rtt_samples_ms/write_rtt_samples_text
+        return os.path.join(self._entry_dir(key), RTT_SINK_DIRS["tcptrace_const"])
+
+    ##################################################
+
+    def read_entry(self, key):
+        with open(os.path.join(self._entry_dir(key), BASELINE_ENTRY_FILE)) as fp:
+            return json.load(fp)
+
+    ##################################################
+
+    def _columnar_trace_dir(self, tcptrace_data_paths):
+        ## Columnar trace for the shards to memory-map; a pickle trace is converted once into this directory
+
+        if "part_pkts_columnar" in tcptrace_data_paths:
+            return tcptrace_data_paths["part_pkts_columnar"]
+
+        trace_dir = os.path.join(self._baseline_dir, "traces", self._digests.trace_digest(tcptrace_data_paths))
+        if not is_columnar_trace(trace_dir):
+            self._custom_print("tcptrace_const baseline: convert {} to columnar trace {}".format(tcptrace_data_paths["part_pkts_pickle"], trace_dir))
+            tmp_trace_dir = "{}.tmp{}".format(trace_dir, os.getpid())
+            convert_pickle_to_columnar(tcptrace_data_paths["part_pkts_pickle"], tmp_trace_dir)
+            if is_columnar_trace(trace_dir):
+                rmtree(tmp_trace_dir)
+            else:
+                os.replace(tmp_trace_dir, trace_dir)
+
+        return trace_dir
+
+    ##################################################
+
+    def compute(self, tcptrace_data_paths, options, policies=(TCPTracePolicy(), ), workers=1):
+        ## Simulates tcptrace_const under all policies not cached yet in a single pass over the trace; returns {policy: key}
+        ## workers: > 1 shards the trace by connection across that many processes, with the same results
+
+        keys    = {policy: self.key(tcptrace_data_paths, options, policy) for policy in policies}
+        missing = [policy for policy in policies if not self.has(keys[policy])]
+        if len(missing) == 0:
+            return keys
+
+        t_start = datetime.now()
+        self._custom_print("tcptrace_const baseline: compute {} ({} policies; workers: {})".format(
+                            ", ".join([keys[policy][:12] for policy in missing]), len(missing), workers))
+
+        ## Build every entry in a temporary directory and rename it into place, so readers never see a partial entry
+        tmp_entry_dirs = {}
+        for policy in missing:
+            tmp_entry_dirs[policy] = "{}.tmp{}".format(self._entry_dir(keys[policy]), os.getpid())
+            if os.path.exists(tmp_entry_dirs[policy]):
+                rmtree(tmp_entry_dirs[policy])
+            os.makedirs(os.path.join(tmp_entry_dirs[policy], BASELINE_PLOTS_DIR))
+
+        if workers > 1:
+            results = simulate_baseline_sharded(self._columnar_trace_dir(tcptrace_data_paths), tcptrace_data_paths.get("chunk_size", DEFAULT_CHUNK_SIZE),
+                                                tcptrace_data_paths["part_pkts_count"], options, missing, tmp_entry_dirs, workers)
+        else:
+            results = simulate_baseline(tcptrace_data_paths, options, missing, tmp_entry_dirs)
+
+        wall_time_secs = (datetime.now() - t_start)/timedelta(seconds=1)
+        for policy in missing:
+            entry = {"key": keys[policy], "options": options, "policy": policy._asdict()}
+            entry.update(results[policy])
+            entry["wall_time_secs"] = round(wall_time_secs, 3)
+            entry["stored_at"]      = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with open(os.path.join(tmp_entry_dirs[policy], BASELINE_ENTRY_FILE), "w") as fp:
+                json.dump(entry, fp)
+
+            entry_dir = self._entry_dir(keys[policy])
+            if self.has(keys[policy]):
+                rmtree(tmp_entry_dirs[policy])
+            else:
+                if os.path.exists(entry_dir):
+                    rmtree(entry_dir)
+                os.replace(tmp_entry_dirs[policy], entry_dir)
+
+            self._custom_print("tcptrace_const baseline: stored {} ({} packets, {} RTT samples) in {} secs.".format(
+                                keys[policy][:12], entry["packets_count"], entry["sample_count"], round(wall_time_secs, 2)))
+
+        return keys
+
+    ##################################################
+
+    def _render(self, key, name, render):
+        ## Path of a file rendered from an entry by render(path) on first use; concurrent renderers write the same file
+
+        path = os.path.join(self._entry_dir(key), name)
+        if not os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            tmp_path  = "{}.tmp{}{}".format(root, os.getpid(), ext)
+            render(tmp_path)
+            os.replace(tmp_path, path)
+
+        return path
+
+    ##################################################
+
+    def _render_plots(self, key):
+        ## Plots the snapshot series of an entry once into its tcptrace_const directory
+
+        entry = self.read_entry(key)
+        entry_plots_dir = os.path.join(self._entry_dir(key), BASELINE_PLOTS_DIR)
+        tmp_plots_dir   = "{}.tmp{}".format(entry_plots_dir, os.getpid())
+        if not os.path.exists(tmp_plots_dir):
+            os.makedirs(tmp_plots_dir)
+        plot_tcptrace_snapshots(tmp_plots_dir, entry["snapshot_time"], entry["active_flows"], entry["active_packets"])
+        for plot_filename in BASELINE_PLOT_FILES:
+            os.replace(os.path.join(tmp_plots_dir, plot_filename), os.path.join(entry_plots_dir, plot_filename))
+        rmtree(tmp_plots_dir)
+
+    ##################################################
+
+    def restore(self, key, simulation_dir, rtt_sink=False, plots=True):
+        ## Materialize the tcptrace_const outputs of an entry into a round directory
+
+        if rtt_sink:
+            round_sink_dir = os.path.join(simulation_dir, RTT_SINK_DIRS["tcptrace_const"])
+            if os.path.exists(round_sink_dir):
+                rmtree(round_sink_dir)
+            copytree(self.rtt_sink_dir(key), round_sink_dir)
+        else:
+            text_path = self._render(key, BASELINE_TEXT_FILE, lambda path: write_rtt_samples_text(self.rtt_sink_dir(key), path))
+            copy(text_path, os.path.join(simulation_dir, BASELINE_TEXT_FILE))
+
+        round_plots_dir = os.path.join(simulation_dir, BASELINE_PLOTS_DIR)
+        if not os.path.exists(round_plots_dir):
+            os.makedirs(round_plots_dir)
+        if plots:
+            entry_plots_dir = os.path.join(self._entry_dir(key), BASELINE_PLOTS_DIR)
+            if not all([os.path.exists(os.path.join(entry_plots_dir, plot_filename)) for plot_filename in BASELINE_PLOT_FILES]):
+                self._render_plots(key)
+            for plot_filename in BASELINE_PLOT_FILES:
+                copy(os.path.join(entry_plots_dir, plot_filename), round_plots_dir)
+
+##################################################
@@ -1,19 +1,26 @@
-from datetime import timedelta
+from ColumnarTrace import TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK, DIRECTION_SEQ, DIRECTION_ACK
+from lazy_pyplot import load_pyplot
 from ipaddress import IPv4Address
+from collections import namedtuple
 import itertools
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 
 ##################################################
 
+## Which packets tcptrace_const takes into measurement ranges (RST packets never are):
+## allow_syn: SYN and SYN-ACK packets; allow_fin: FIN packets; allow_pure_ack: packets with only ACK set and no payload
+## in the SEQ direction. The default is process_tcptrace_SEQ/ACK with allow_syn=False.
+TCPTracePolicy = namedtuple("TCPTracePolicy", ["allow_syn", "allow_fin", "allow_pure_ack"], defaults=[False, True, False])
+
+##################################################
+
 class TCPTraceConst(object):
 
     ##################################################
 
-    def __init__(self, simulation_dir, log_interval, test=False):
+    def __init__(self, simulation_dir, log_interval, test=False, idle_timeout=None, rtt_sink=None):
+        ## idle_timeout (ms): forget flows whose record was not updated for that long, and unmatched packet records as old; None keeps all
+        ## rtt_sink: RTTSampleSink that RTT samples are streamed to instead of being kept per flow
 
         self._test = test
         
@@ -21,6 +28,12 @@ class TCPTraceConst(object):
         self._tcptrace_packet_table = {}
         self._tcptrace_sample_count = 0
         self._tcptrace_rtt_samples  = {}
+        self._rtt_sink              = rtt_sink
+        self._open_flows_count      = 0
+
+        ## Idle expiry; flows ordered by their last record update
+        self._idle_timeout    = None if idle_timeout is None else int(idle_timeout * 1000)
+        self._flow_last_seen  = {}
 
         self._resultsPath = os.path.join(simulation_dir, "tcptrace_const")
         if not os.path.exists(self._resultsPath):
@@ -31,6 +44,8 @@ class TCPTraceConst(object):
         self._firstEntryTime           = None
         self._latestEntryRound         = 0
         self._snapshotTime             = []
+        self._snapshot_clock           = None
+        self._next_snapshot_time       = None
         self._intervalPacketsProcessed = 0
         self._intervalActiveFlows      = []
         self._intervalActivePackets    = []
@@ -46,6 +61,35 @@ class TCPTraceConst(object):
 
     ##################################################
 
+    def set_snapshot_clock(self, snapshot_clock):
+        ## Snapshots are then triggered by the clock instead of checked on every packet
+        self._snapshot_clock = snapshot_clock
+        snapshot_clock.register(self._on_snapshot_clock)
+
+    ##################################################
+
+    def _snapshot_cutoff(self):
+        if len(self._snapshotTime) == 0:
+            return (self._latestEntryRound + 1) * self._logInterval
+        else:
+            return max(self._snapshotTime[-1] + self._logInterval, (self._latestEntryRound + 1) * self._logInterval)
+
+    ##################################################
+
+    def _on_snapshot_clock(self, t):
+
+        if self._firstEntryTime is None:
+            return
+
+        if self._next_snapshot_time is None or t >= self._next_snapshot_time:
+            self._create_tcptrace_snapshot(t)
+            ## 1 us early, so that rounding the ms cutoff to us never delays a snapshot
+            self._next_snapshot_time = self._firstEntryTime + int(self._snapshot_cutoff() * 1000) - 1
+
+        self._snapshot_clock.schedule(self._next_snapshot_time)
+
+    ##################################################
+
     def _create_tcptrace_snapshot(self, t, explicit=False):
 
         # print("Creating snapshot at {}".format(t))
@@ -53,11 +97,8 @@ class TCPTraceConst(object):
         if self._firstEntryTime is None:
             return
 
-        ms_elapsed = (t - self._firstEntryTime)/timedelta(milliseconds=1)
-        if len(self._snapshotTime) == 0:
-            ms_cutoff  = (self._latestEntryRound + 1) * self._logInterval
-        else:
-            ms_cutoff  = max(self._snapshotTime[-1] + self._logInterval, (self._latestEntryRound + 1) * self._logInterval)
+        ms_elapsed = (t - self._firstEntryTime)/1000
+        ms_cutoff  = self._snapshot_cutoff()
 
         # self._custom_print("In createSnapshot:: Entry round: {}; Cutoff: {}, Check for snapshot at time: {} ms".format(self._latestEntryRound, ms_cutoff, ms_elapsed))
 
@@ -65,14 +106,12 @@ class TCPTraceConst(object):
             ## Record time
             self._snapshotTime.append(ms_elapsed)
 
+            if self._idle_timeout is not None:
+                self._expire_idle(t)
+
             ## Record params
             self._intervalActivePackets.append(len(self._tcptrace_packet_table))
-            
-            flow_table_size_count = len(self._tcptrace_flow_table)
-            for flow_key in self._tcptrace_flow_table:
-                if self._tcptrace_flow_table[flow_key][0] == self._tcptrace_flow_table[flow_key][1]:
-                    flow_table_size_count -= 1
-            self._intervalActiveFlows.append(flow_table_size_count)
+            self._intervalActiveFlows.append(self._open_flows_count)
 
             ## Increment round
             self._latestEntryRound += 1
@@ -84,21 +123,66 @@ class TCPTraceConst(object):
 
     ##################################################
 
+    def _set_flow_record(self, flow_key, flow_record, t):
+        ## All flow table writes go through here to keep the count of open measurement ranges
+
+        old_record = self._tcptrace_flow_table.get(flow_key)
+        if old_record is not None and old_record[0] != old_record[1]:
+            self._open_flows_count -= 1
+        if flow_record[0] != flow_record[1]:
+            self._open_flows_count += 1
+        self._tcptrace_flow_table[flow_key] = flow_record
+
+        if self._idle_timeout is not None:
+            self._flow_last_seen.pop(flow_key, None)
+            self._flow_last_seen[flow_key] = t
+
+    ##################################################
+
+    def _expire_idle(self, t):
+
+        ## Flows (oldest update first)
+        expired_flow_keys = []
+        for flow_key, t_seen in self._flow_last_seen.items():
+            if t - t_seen < self._idle_timeout:
+                break
+            expired_flow_keys.append(flow_key)
+        for flow_key in expired_flow_keys:
+            del self._flow_last_seen[flow_key]
+            flow_record = self._tcptrace_flow_table.pop(flow_key)
+            if flow_record[0] != flow_record[1]:
+                self._open_flows_count -= 1
+
+        ## Unmatched packet records (oldest insertion first)
+        expired_packet_keys = []
+        for packet_key, (packet_tstamp, _) in self._tcptrace_packet_table.items():
+            if t - packet_tstamp < self._idle_timeout:
+                break
+            expired_packet_keys.append(packet_key)
+        for packet_key in expired_packet_keys:
+            del self._tcptrace_packet_table[packet_key]
+
+        if self._test and (expired_flow_keys or expired_packet_keys):
+            self._custom_print("TCPTRACE:: Expired {} idle flows and {} packet records".format(len(expired_flow_keys), len(expired_packet_keys)))
+
+    ##################################################
+
     def process_tcptrace_SEQ(self, packet, allow_syn=False):
 
         ## Logging
-        self._create_tcptrace_snapshot(packet["timestamp"])
+        if self._snapshot_clock is None:
+            self._create_tcptrace_snapshot(packet.timestamp)
 
         ## Prep. flow key
-        flow_key = (packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], packet["tcpdst"])
+        flow_key = (packet.ipsrc, packet.ipdst, packet.tcpsrc, packet.tcpdst)
 
         ### Handle flow table action
 
         ### Case 0: Drop if SYN packet or pure ACK
-        is_syn = "S" in packet["tcpflags"]
-        is_fin = "F" in packet["tcpflags"]
-        is_rst = "R" in packet["tcpflags"]
-        is_pure_ack = packet["tcpflags"] == "-A----" and packet["pktsize"] == 0
+        is_syn = packet.tcpflags & TCP_SYN
+        is_fin = packet.tcpflags & TCP_FIN
+        is_rst = packet.tcpflags & TCP_RST
+        is_pure_ack = packet.tcpflags == TCP_ACK and packet.pktsize == 0
         
         # if is_syn or is_fin or is_rst or is_pure_ack: # No SYN and no FIN
         if allow_syn and (is_rst or is_pure_ack): # SYN allowed
@@ -113,8 +197,8 @@ class TCPTraceConst(object):
         
         else:
             ## Compute expected ACK
-            exp_ack = packet["seqno"] + packet["pktsize"]
-            if "S" in packet["tcpflags"] or "F" in packet["tcpflags"]: exp_ack += 1
+            exp_ack = packet.seqno + packet.pktsize
+            if packet.tcpflags & (TCP_SYN | TCP_FIN): exp_ack += 1
 
             ## Cases: 1. Flow record for this flow exists; 2: Flow record for this flow doesn't exist
 
@@ -125,15 +209,15 @@ class TCPTraceConst(object):
                                                     flow_key, self._tcptrace_flow_table[flow_key]))
 
                 ## Case 1.1: Packet is either an extension to measurement range or ahead of the measurement range
-                if packet["seqno"] >= highest_expected_ack:
+                if packet.seqno >= highest_expected_ack:
 
                     ## Case 1.1.1: The new packet is an extension to the measurement range
-                    if packet["seqno"] == highest_expected_ack:
-                        self._tcptrace_flow_table[flow_key] = (highest_byte_acked_or_rexmited, exp_ack)
+                    if packet.seqno == highest_expected_ack:
+                        self._set_flow_record(flow_key, (highest_byte_acked_or_rexmited, exp_ack), packet.timestamp)
                     
                     ## Case 1.1.2: Restart the measurement range with latest packet since there's a gap in the sequence no. space
                     else:
-                        self._tcptrace_flow_table[flow_key] = (packet["seqno"], exp_ack)
+                        self._set_flow_record(flow_key, (packet.seqno, exp_ack), packet.timestamp)
                     
                     if self._test: self._custom_print("TCPTRACE SEQ FT:: Extension to MR: Updated record for key {} is: {}".format(
                                                         flow_key, self._tcptrace_flow_table[flow_key]))
@@ -143,7 +227,7 @@ class TCPTraceConst(object):
                 
                 ## Case 1.2: Collapse since violation to measurement range
                 else:
-                    self._tcptrace_flow_table[flow_key] = (exp_ack, exp_ack)
+                    self._set_flow_record(flow_key, (exp_ack, exp_ack), packet.timestamp)
 
                     if self._test: self._custom_print("TCPTRACE SEQ FT:: Collapse MR: Updated record for key {} is: {}".format(
                                                         flow_key, self._tcptrace_flow_table[flow_key]))
@@ -153,7 +237,7 @@ class TCPTraceConst(object):
         
             ## Case 2: Flow record does not exist in FT or collapsed FT; need to insert it
             else:
-                self._tcptrace_flow_table[flow_key] = (packet["seqno"], exp_ack)
+                self._set_flow_record(flow_key, (packet.seqno, exp_ack), packet.timestamp)
 
                 if self._test: self._custom_print("TCPTRACE SEQ FT:: Insert into FT: Updated record for key {} is: {}".format(
                                                     flow_key, self._tcptrace_flow_table[flow_key]))
@@ -167,8 +251,11 @@ class TCPTraceConst(object):
 
         ## PT action is insert
         if actionable_ft2pt[0] == "insert":
-            packet_key = (packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], packet["tcpdst"], exp_ack)
-            self._tcptrace_packet_table[packet_key] = (packet["timestamp"], packet["seqno"])
+            packet_key = (packet.ipsrc, packet.ipdst, packet.tcpsrc, packet.tcpdst, exp_ack)
+            if self._idle_timeout is not None:
+                ## Keep the packet table in insertion time order for expiry
+                self._tcptrace_packet_table.pop(packet_key, None)
+            self._tcptrace_packet_table[packet_key] = (packet.timestamp, packet.seqno)
             if self._test: self._custom_print("TCPTRACE SEQ PT:: Flow key: {} || Packet record {} inserted".format(flow_key, packet_key))
 
         return
@@ -178,7 +265,8 @@ class TCPTraceConst(object):
     def process_tcptrace_ACK(self, packet, allow_syn=False):
 
         ## Logging
-        self._create_tcptrace_snapshot(packet["timestamp"])
+        if self._snapshot_clock is None:
+            self._create_tcptrace_snapshot(packet.timestamp)
 
         # Handle ACK direction
 
@@ -188,16 +276,16 @@ class TCPTraceConst(object):
         ## (3) Packets that result in RTT samples (RST packets with ACK set also count)
 
         ## Prep. flow key
-        flow_key = (packet["ipdst"], packet["ipsrc"], packet["tcpdst"], packet["tcpsrc"])
+        flow_key = (packet.ipdst, packet.ipsrc, packet.tcpdst, packet.tcpsrc)
 
 
         ## Case 0: Perform flow table processing
-        # if "A" not in packet["tcpflags"] and "R" not in packet["tcpflags"]:
-        is_syn = "S" in packet["tcpflags"]
-        is_pure_syn = is_syn and "A" not in packet["tcpflags"]
-        is_fin = "F" in packet["tcpflags"]
-        is_rst = "R" in packet["tcpflags"]
-        is_not_ack = "A" not in packet["tcpflags"]
+        # if not packet.tcpflags & TCP_ACK and not packet.tcpflags & TCP_RST:
+        is_syn = packet.tcpflags & TCP_SYN
+        is_pure_syn = is_syn and not packet.tcpflags & TCP_ACK
+        is_fin = packet.tcpflags & TCP_FIN
+        is_rst = packet.tcpflags & TCP_RST
+        is_not_ack = not packet.tcpflags & TCP_ACK
 
         # if is_syn or is_fin or is_rst or is_not_ack: # No SYN, no FIN
         if allow_syn and (is_pure_syn or is_rst or is_not_ack): # SYN-ACK allowed
@@ -209,7 +297,7 @@ class TCPTraceConst(object):
             actionables_ft2pt = ("drop", None)
         
         ## Case 1: RST is set but ACK is not: Collapse flow table record
-        # elif "A" not in packet["tcpflags"] and "R" in packet["tcpflags"]:
+        # elif not packet.tcpflags & TCP_ACK and packet.tcpflags & TCP_RST:
             
         #     ## Case 1.1: Flow record exists and measurement range is open; collapse measurement range
         #     if flow_key in self._tcptrace_flow_table and not self._is_collapsed(flow_key):
@@ -221,17 +309,17 @@ class TCPTraceConst(object):
             
         #     ## Case 1.2: Flow record doesn't exist; insert
         #     else:
-        #         self._tcptrace_flow_table[flow_key] = (packet["ackno"], packet["ackno"])
+        #         self._tcptrace_flow_table[flow_key] = (packet.ackno, packet.ackno)
         #         if self._test: self._custom_print("TCPTRACE ACK FT:: Flow key: {} || RST set but not ACK, insert collapsed MR: {}".format(
         #                                             flow_key, self._tcptrace_flow_table[flow_key]))
         #         actionables_ft2pt = ("drop", None)
         
         ## Case 2: ACK is set
-        elif "A" in packet["tcpflags"]:
+        elif packet.tcpflags & TCP_ACK:
 
             ## Case 2.1: Haven't seen this flow yet or collapsed measurement range; insert collapsed record
             if flow_key not in self._tcptrace_flow_table or self._is_collapsed(flow_key):
-                self._tcptrace_flow_table[flow_key] = (packet["ackno"], packet["ackno"])
+                self._set_flow_record(flow_key, (packet.ackno, packet.ackno), packet.timestamp)
                 if self._test: self._custom_print("TCPTRACE ACK FT:: Flow record for key {} is NONE or MR is closed, DROP".format(flow_key))
                 actionables_ft2pt = ("drop", None)
             
@@ -240,34 +328,34 @@ class TCPTraceConst(object):
                 highest_byte_acked_or_rexmited, highest_expected_ack = self._tcptrace_flow_table[flow_key]
 
                 ## Case 2.2.1: Collapse flow table record if RST is set or ACK beyond measurement range
-                # if "R" in packet["tcpflags"] or packet["ackno"] > highest_expected_ack or packet["ackno"] <= highest_byte_acked_or_rexmited:
-                if packet["ackno"] < highest_byte_acked_or_rexmited or packet["ackno"] > highest_expected_ack:
+                # if packet.tcpflags & TCP_RST or packet.ackno > highest_expected_ack or packet.ackno <= highest_byte_acked_or_rexmited:
+                if packet.ackno < highest_byte_acked_or_rexmited or packet.ackno > highest_expected_ack:
                     if self._test: self._custom_print("TCPTRACE ACK FT:: Flow record for key {} shows that ACK is outside MR, DROP".format(flow_key))
                     actionables_ft2pt = ("drop", None)
 
-                elif packet["ackno"] == highest_byte_acked_or_rexmited:
+                elif packet.ackno == highest_byte_acked_or_rexmited:
                     ## Duplicate ACK: delete flow table record
-                    # new_highest_expected_ack = max(highest_expected_ack, packet["ackno"])
-                    self._tcptrace_flow_table[flow_key] = (highest_expected_ack, highest_expected_ack)
-                    # if "R" not in packet["tcpflags"]:
+                    # new_highest_expected_ack = max(highest_expected_ack, packet.ackno)
+                    self._set_flow_record(flow_key, (highest_expected_ack, highest_expected_ack), packet.timestamp)
+                    # if not packet.tcpflags & TCP_RST:
                     #     actionables_ft2pt = ("delete", flow_key + (highest_expected_ack, ))
                     # else:
                     #     actionables_ft2pt = ("match", "packet_record")
                     actionables_ft2pt = ("delete", flow_key + (highest_expected_ack, ))
 
                     if self._test:
-                        # if "R" in packet["tcpflags"]:
+                        # if packet.tcpflags & TCP_RST:
                         #     self._custom_print("TCPTRACE ACK FT:: Flow key: {} || Deleted FT record since RST is set".format(flow_key))
-                        if packet["ackno"] > highest_expected_ack:
+                        if packet.ackno > highest_expected_ack:
                             self._custom_print("TCPTRACE ACK FT:: Flow key: {} || Deleted FT record since ACK# > highest eACK: {} > {}".format(
-                                                flow_key, packet["ackno"], highest_expected_ack))
-                        if packet["ackno"] <= highest_byte_acked_or_rexmited:
+                                                flow_key, packet.ackno, highest_expected_ack))
+                        if packet.ackno <= highest_byte_acked_or_rexmited:
                             self._custom_print("TCPTRACE ACK FT:: Flow key: {} || Deleted FT record since ACK# <= highest byte ACKed/reTxed/affected (reordering): {} <= {}".format(
-                                                flow_key, packet["ackno"], highest_byte_acked_or_rexmited))
+                                                flow_key, packet.ackno, highest_byte_acked_or_rexmited))
 
                 ## Case 2.2.2: Update flow table with ACK no. since ACK within measurement range
-                elif highest_byte_acked_or_rexmited < packet["ackno"] and packet["ackno"] <= highest_expected_ack:
-                    self._tcptrace_flow_table[flow_key] = (packet["ackno"], highest_expected_ack)
+                elif highest_byte_acked_or_rexmited < packet.ackno and packet.ackno <= highest_expected_ack:
+                    self._set_flow_record(flow_key, (packet.ackno, highest_expected_ack), packet.timestamp)
                     actionables_ft2pt = ("match", "packet_record")
                     if self._test: self._custom_print("TCPTRACE ACK FT:: Flow key: {} || ACK# within measurement range; updated measurement range is: {}".format(
                                                         flow_key, self._tcptrace_flow_table[flow_key]))
@@ -276,7 +364,7 @@ class TCPTraceConst(object):
             actionables_ft2pt = ("drop", None)
                
         # Handle packet table action
-        match_key = (packet["ipdst"], packet["ipsrc"], packet["tcpdst"], packet["tcpsrc"], packet["ackno"])
+        match_key = (packet.ipdst, packet.ipsrc, packet.tcpdst, packet.tcpsrc, packet.ackno)
 
         ## Case 1: Action is delete
         if actionables_ft2pt[0] == "delete":
@@ -292,10 +380,13 @@ class TCPTraceConst(object):
                 ## Packet record exists: Delete packet record, compute RTT sample, and report
                 packet_tstamp, packet_seqno = self._tcptrace_packet_table[match_key]
                 del self._tcptrace_packet_table[match_key]
-                rtt = (packet["timestamp"] - packet_tstamp)/timedelta(milliseconds=1)
-                if flow_key not in self._tcptrace_rtt_samples:
-                    self._tcptrace_rtt_samples[flow_key] = []
-                self._tcptrace_rtt_samples[flow_key].append((packet_seqno, rtt))
+                rtt = (packet.timestamp - packet_tstamp)/1000
+                if self._rtt_sink is not None:
+                    self._rtt_sink.add(flow_key, packet_seqno, packet.timestamp, packet.timestamp - packet_tstamp)
+                else:
+                    if flow_key not in self._tcptrace_rtt_samples:
+                        self._tcptrace_rtt_samples[flow_key] = []
+                    self._tcptrace_rtt_samples[flow_key].append((packet_seqno, rtt))
                 self._tcptrace_sample_count += 1
                 if self._test: self._custom_print("TCPTRACE ACK PT:: Flow key: {} || Match key found: {}; RTT sample collected: {}".format(flow_key, match_key, rtt))
             else:
@@ -306,43 +397,24 @@ class TCPTraceConst(object):
     ##################################################
 
     def concludeRTTDict(self):
+        ## Flows without samples get an empty list (nothing to do when the samples went to a sink)
+        if self._rtt_sink is not None:
+            return
         for flow_key in self._tcptrace_flow_table:
             if flow_key not in self._tcptrace_rtt_samples:
                 self._tcptrace_rtt_samples[flow_key] = []
 
     ##################################################
 
+    def close_rtt_sink(self):
+        return self._rtt_sink.close()
+
+    ##################################################
+
     def plot_tcptrace_stats(self, latest_tstamp):
 
         self._create_tcptrace_snapshot(latest_tstamp, True)
-        
-        sns_colors = itertools.cycle(sns.color_palette("bright"))
-            
-        plt.figure(figsize=(6,4))
-        time_x = [t/1000 for t in self._snapshotTime]
-        color = next(sns_colors)
-        plt.plot(time_x, self._intervalActiveFlows, color=color, linestyle="-")
-        plt.xlabel("Time (sec.)")
-        plt.ylabel("No. of flow records")
-        plt.title("No. of flow records vs. time")
-        plt.tight_layout()
-        plot_path = os.path.join(self._resultsPath, "tcptrace_flows_records.png")
-        plt.savefig(plot_path, dpi=300)
-        plt.clf()
-        plt.close("all")
-
-        plt.figure(figsize=(6,4))
-        time_x = [t/1000 for t in self._snapshotTime]
-        color = next(sns_colors)
-        plt.plot(time_x, self._intervalActivePackets, color=color, linestyle="-")
-        plt.xlabel("Time (sec.)")
-        plt.ylabel("No. of packet records")
-        plt.title("No. of packet records vs. time")
-        plt.tight_layout()
-        plot_path = os.path.join(self._resultsPath, "tcptrace_packet_records.png")
-        plt.savefig(plot_path, dpi=300)
-        plt.clf()
-        plt.close("all")
+        plot_tcptrace_snapshots(self._resultsPath, self._snapshotTime, self._intervalActiveFlows, self._intervalActivePackets)
 
     ##################################################
 
@@ -365,7 +437,7 @@ class TCPTraceConst(object):
     def populate_missing_flows(self):
 
         missing_flow_keys = []
-        missing_flow_keys.append((IPv4Address('10.9.9.173'), IPv4Address('204.141.30.124'), 50276, 443))
+        missing_flow_keys.append((int(IPv4Address('10.9.9.173')), int(IPv4Address('204.141.30.124')), 50276, 443))
         self._missing_flow_keys = missing_flow_keys
 
     ##################################################
@@ -393,3 +465,298 @@ class TCPTraceConst(object):
     # DISCREPANCY:: Flow key: (IPv4Address('140.180.238.63'), IPv4Address('117.64.235.221'), 25, 60716); P4RTT count 2 > tcptrace_const count 1
 
 ##################################################
+
+class TCPTraceConstVariants(object):
+    ''' tcptrace_const under any number of TCPTracePolicy variants in a single pass, with the same results as a
+        TCPTraceConst per variant. Every packet is decoded once (flow key, expected ACK, and the variants that measure
+        its flags), the records of a flow in all variants share one flow table entry, and the snapshot schedule is
+        shared; each variant only keeps its flow records, packet table, counts, and RTT sink. '''
+
+    ##################################################
+
+    def __init__(self, policies, log_interval, rtt_sinks, idle_timeout=None):
+        ## rtt_sinks: an RTTSampleSink per policy, that the variant's RTT samples are streamed to
+        ## idle_timeout (ms): as for TCPTraceConst, per variant
+
+        self._policies  = list(policies)
+        self._rtt_sinks = list(rtt_sinks)
+
+        ## flow_key -> [flow record of each variant, None if the variant has none]
+        self._flow_table        = {}
+        self._packet_tables     = [{} for _ in self._policies]
+        self._open_flows_counts = [0 for _ in self._policies]
+
+        ## (tcpflags, no payload) -> (variants measuring the packet in the SEQ direction, in the ACK direction)
+        self._measuring_variants = {}
+
+        ## Idle expiry; per variant, flows ordered by their last record update
+        self._idle_timeout   = None if idle_timeout is None else int(idle_timeout * 1000)
+        self._flow_last_seen = [{} for _ in self._policies]
+
+        ## Accounting
+        self._logInterval           = log_interval # in ms
+        self._firstEntryTime        = None
+        self._latestEntryRound      = 0
+        self._snapshotTime          = []
+        self._snapshot_clock        = None
+        self._next_snapshot_time    = None
+        self._intervalActiveFlows   = [[] for _ in self._policies]
+        self._intervalActivePackets = [[] for _ in self._policies]
+
+    ##################################################
+
+    def set_snapshot_clock(self, snapshot_clock):
+        self._snapshot_clock = snapshot_clock
+        snapshot_clock.register(self._on_snapshot_clock)
+
+    ##################################################
+
+    def _snapshot_cutoff(self):
+        if len(self._snapshotTime) == 0:
+            return (self._latestEntryRound + 1) * self._logInterval
+        else:
+            return max(self._snapshotTime[-1] + self._logInterval, (self._latestEntryRound + 1) * self._logInterval)
+
+    ##################################################
+
+    def _on_snapshot_clock(self, t):
+
+        if self._firstEntryTime is None:
+            return
+
+        if self._next_snapshot_time is None or t >= self._next_snapshot_time:
+            self._create_tcptrace_snapshot(t)
+            self._next_snapshot_time = self._firstEntryTime + int(self._snapshot_cutoff() * 1000) - 1
+
+        self._snapshot_clock.schedule(self._next_snapshot_time)
+
+    ##################################################
+
+    def _create_tcptrace_snapshot(self, t, explicit=False):
+
+        if self._firstEntryTime is None:
+            return
+
+        ms_elapsed = (t - self._firstEntryTime)/1000
+        if ms_elapsed >= self._snapshot_cutoff() or explicit:
+            self._snapshotTime.append(ms_elapsed)
+
+            if self._idle_timeout is not None:
+                self._expire_idle(t)
+
+            for variant in range(len(self._policies)):
+                self._intervalActivePackets[variant].append(len(self._packet_tables[variant]))
+                self._intervalActiveFlows[variant].append(self._open_flows_counts[variant])
+
+            self._latestEntryRound += 1
+
+    ##################################################
+
+    def _set_flow_record(self, flow_records, variant, flow_key, flow_record, t):
+
+        old_record = flow_records[variant]
+        if old_record is not None and old_record[0] != old_record[1]:
+            self._open_flows_counts[variant] -= 1
+        if flow_record[0] != flow_record[1]:
+            self._open_flows_counts[variant] += 1
+        flow_records[variant] = flow_record
+
+        if self._idle_timeout is not None:
+            flow_last_seen = self._flow_last_seen[variant]
+            flow_last_seen.pop(flow_key, None)
+            flow_last_seen[flow_key] = t
+
+    ##################################################
+
+    def _expire_idle(self, t):
+
+        for variant, flow_last_seen in enumerate(self._flow_last_seen):
+
+            ## Flows (oldest update first); a flow table entry goes once no variant has a record in it
+            expired_flow_keys = []
+            for flow_key, t_seen in flow_last_seen.items():
+                if t - t_seen < self._idle_timeout:
+                    break
+                expired_flow_keys.append(flow_key)
+            for flow_key in expired_flow_keys:
+                del flow_last_seen[flow_key]
+                flow_records = self._flow_table[flow_key]
+                if flow_records[variant][0] != flow_records[variant][1]:
+                    self._open_flows_counts[variant] -= 1
+                flow_records[variant] = None
+                if not any(flow_records):
+                    del self._flow_table[flow_key]
+
+            ## Unmatched packet records (oldest insertion first)
+            packet_table = self._packet_tables[variant]
+            expired_packet_keys = []
+            for packet_key, (packet_tstamp, _) in packet_table.items():
+                if t - packet_tstamp < self._idle_timeout:
+                    break
+                expired_packet_keys.append(packet_key)
+            for packet_key in expired_packet_keys:
+                del packet_table[packet_key]
+
+    ##################################################
+
+    def _classify(self, tcpflags, no_payload):
+        ## Variants that measure a packet with these flags in each direction; the drop cases of process_tcptrace_SEQ/ACK
+
+        is_syn      = tcpflags & TCP_SYN
+        is_fin      = tcpflags & TCP_FIN
+        is_rst      = tcpflags & TCP_RST
+        is_ack      = tcpflags & TCP_ACK
+        is_pure_ack = tcpflags == TCP_ACK and no_payload
+
+        seq_variants = []
+        ack_variants = []
+        for variant, policy in enumerate(self._policies):
+            if is_rst or (is_syn and not policy.allow_syn) or (is_fin and not policy.allow_fin):
+                continue
+            if not is_pure_ack or policy.allow_pure_ack:
+                seq_variants.append(variant)
+            if is_ack:
+                ack_variants.append(variant)
+
+        return tuple(seq_variants), tuple(ack_variants)
+
+    ##################################################
+
+    def process_packet(self, packet):
+        ## Both handlers of all variants, in the directions the packet is labelled with
+
+        if self._snapshot_clock is None:
+            self._create_tcptrace_snapshot(packet.timestamp)
+
+        tcpflags = packet.tcpflags
+        flags_key = (tcpflags, packet.pktsize == 0)
+        measuring_variants = self._measuring_variants.get(flags_key)
+        if measuring_variants is None:
+            measuring_variants = self._measuring_variants[flags_key] = self._classify(*flags_key)
+        seq_variants, ack_variants = measuring_variants
+
+        if packet.direction & DIRECTION_SEQ and seq_variants:
+            self._process_SEQ(packet, seq_variants)
+        if packet.direction & DIRECTION_ACK and ack_variants:
+            self._process_ACK(packet, ack_variants)
+
+    ##################################################
+
+    def _process_SEQ(self, packet, variants):
+
+        timestamp = packet.timestamp
+        seqno     = packet.seqno
+        flow_key  = (packet.ipsrc, packet.ipdst, packet.tcpsrc, packet.tcpdst)
+        exp_ack   = seqno + packet.pktsize
+        if packet.tcpflags & (TCP_SYN | TCP_FIN): exp_ack += 1
+
+        flow_records = self._flow_table.get(flow_key)
+        if flow_records is None:
+            flow_records = self._flow_table[flow_key] = [None] * len(self._policies)
+
+        packet_key    = flow_key + (exp_ack, )
+        packet_record = (timestamp, seqno)
+        for variant in variants:
+            flow_record = flow_records[variant]
+
+            ## No open measurement range: open one with this packet
+            if flow_record is None or flow_record[0] == flow_record[1]:
+                self._set_flow_record(flow_records, variant, flow_key, (seqno, exp_ack), timestamp)
+
+            ## Extension to the measurement range, or a restart of it after a gap in the sequence no. space
+            elif seqno >= flow_record[1]:
+                self._set_flow_record(flow_records, variant, flow_key, (flow_record[0] if seqno == flow_record[1] else seqno, exp_ack), timestamp)
+
+            ## Violation of the measurement range: collapse it
+            else:
+                self._set_flow_record(flow_records, variant, flow_key, (exp_ack, exp_ack), timestamp)
+                continue
+
+            packet_table = self._packet_tables[variant]
+            if self._idle_timeout is not None:
+                packet_table.pop(packet_key, None)
+            packet_table[packet_key] = packet_record
+
+    ##################################################
+
+    def _process_ACK(self, packet, variants):
+
+        timestamp = packet.timestamp
+        ackno     = packet.ackno
+        flow_key  = (packet.ipdst, packet.ipsrc, packet.tcpdst, packet.tcpsrc)
+
+        flow_records = self._flow_table.get(flow_key)
+        if flow_records is None:
+            flow_records = self._flow_table[flow_key] = [None] * len(self._policies)
+
+        match_key = flow_key + (ackno, )
+        for variant in variants:
+            flow_record = flow_records[variant]
+
+            ## No open measurement range: insert a collapsed one
+            if flow_record is None or flow_record[0] == flow_record[1]:
+                self._set_flow_record(flow_records, variant, flow_key, (ackno, ackno), timestamp)
+
+            ## ACK outside the measurement range
+            elif ackno < flow_record[0] or ackno > flow_record[1]:
+                pass
+
+            ## Duplicate ACK: collapse the measurement range and delete its last packet record
+            elif ackno == flow_record[0]:
+                self._set_flow_record(flow_records, variant, flow_key, (flow_record[1], flow_record[1]), timestamp)
+                self._packet_tables[variant].pop(flow_key + (flow_record[1], ), None)
+
+            ## ACK within the measurement range: an RTT sample if it matches a packet record
+            else:
+                self._set_flow_record(flow_records, variant, flow_key, (ackno, flow_record[1]), timestamp)
+                packet_record = self._packet_tables[variant].pop(match_key, None)
+                if packet_record is not None:
+                    self._rtt_sinks[variant].add(flow_key, packet_record[1], timestamp, timestamp - packet_record[0])
+
+    ##################################################
+
+    def snapshot_series(self, variant):
+        ## (snapshot times (ms), open flow records, packet records) of a variant
+        return self._snapshotTime, self._intervalActiveFlows[variant], self._intervalActivePackets[variant]
+
+    ##################################################
+
+    def close_rtt_sinks(self):
+        return [rtt_sink.close() for rtt_sink in self._rtt_sinks]
+
+##################################################
+
+def plot_tcptrace_snapshots(results_path, snapshot_time, active_flows, active_packets):
+    ## Flow and packet record counts over time (snapshot times in ms)
+
+    plt, sns = load_pyplot()
+
+    sns_colors = itertools.cycle(sns.color_palette("bright"))
+
+    plt.figure(figsize=(6,4))
+    time_x = [t/1000 for t in snapshot_time]
+    color = next(sns_colors)
+    plt.plot(time_x, active_flows, color=color, linestyle="-")
+    plt.xlabel("Time (sec.)")
+    plt.ylabel("No. of flow records")
+    plt.title("No. of flow records vs. time")
+    plt.tight_layout()
+    plot_path = os.path.join(results_path, "tcptrace_flows_records.png")
+    plt.savefig(plot_path, dpi=300)
+    plt.clf()
+    plt.close("all")
+
+    plt.figure(figsize=(6,4))
+    time_x = [t/1000 for t in snapshot_time]
+    color = next(sns_colors)
+    plt.plot(time_x, active_packets, color=color, linestyle="-")
+    plt.xlabel("Time (sec.)")
+    plt.ylabel("No. of packet records")
+    plt.title("No. of packet records vs. time")
+    plt.tight_layout()
+    plot_path = os.path.join(results_path, "tcptrace_packet_records.png")
+    plt.savefig(plot_path, dpi=300)
+    plt.clf()
+    plt.close("all")
+
+##################################################
@@ -0,0 +1,55 @@
+from datetime import datetime
+import subprocess
+import numpy as np
+import sys
+
+##################################################
+
+## Per-process startup cost of a simulation round, i.e., loading the simulation modules.
+## "eager plotting" additionally imports matplotlib/seaborn, which is what every round paid before plotting imports became lazy.
+STARTUP_VARIANTS = [
+                        ("simulation modules", "import Simulation, LockstepSimulation"),
+                        ("simulation modules + eager plotting", "import Simulation, LockstepSimulation; import matplotlib; matplotlib.use('Agg'); import matplotlib.pyplot; import seaborn"),
+                    ]
+
+##################################################
+
+def time_startup(code, repetitions):
+
+    times = []
+    for _ in range(repetitions):
+        t_start = datetime.now()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        times.append((datetime.now() - t_start).total_seconds() * 1000)
+
+    return times
+
+##################################################
+
+def main():
+
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    ## Warm up the OS file cache
+    time_startup(STARTUP_VARIANTS[-1][1], 1)
+
+    ## Plotting must stay out of the simulation's import path
+    loaded = subprocess.run([sys.executable, "-c", "import sys, Simulation, LockstepSimulation; print(int('matplotlib' in sys.modules or 'seaborn' in sys.modules))"],
+                            check=True, stdout=subprocess.PIPE).stdout.decode().strip()
+    print("matplotlib/seaborn loaded by the simulation modules: {}".format("yes" if loaded == "1" else "no"))
+
+    print("Process startup time over {} runs (ms):".format(repetitions))
+    medians = []
+    for name, code in STARTUP_VARIANTS:
+        times = time_startup(code, repetitions)
+        medians.append(np.median(times))
+        print("  {:<40} median: {:8.1f}, min: {:8.1f}, max: {:8.1f}".format(name, np.median(times), np.min(times), np.max(times)))
+
+    print("Saved per round: {:.1f} ms".format(medians[1] - medians[0]))
+
+##################################################
+
+if __name__ == "__main__":
+    main()
+
+##################################################
@@ -0,0 +1,324 @@
+from CuckooHashTable import _stage_hash_cache
+from FlowTable import FlowTable
+from PacketTable import PacketTable
+from ApproxFlowTable import ApproxFlowTable
+from SnapshotClock import SnapshotClock
+from ColumnarTrace import TCP_ACK
+from contextlib import redirect_stdout
+from random import Random
+import subprocess
+import itertools
+import platform
+import tempfile
+import json
+import time
+import sys
+import gc
+import io
+import os
+
+##################################################
+
+## Synthetic key streams are seeded, so every run (and every commit) replays the same operations
+BENCHMARK_SEED = 42
+TABLE_SIZE     = 4096
+OPERATIONS     = 5000
+REPETITIONS    = 3
+
+## Parameter grid
+OCCUPANCIES      = [0.5, 0.9]
+STAGE_COUNTS     = [1, 2, 4]
+RECIRCULATIONS   = [0, 2, 8]
+EVICTION_STAGES  = ["start", "immediate", "end"]
+STORAGE_BACKENDS = ["tuple", "array"]
+
+## A benchmark is flagged if its ops/sec drop by more than this fraction against the baseline
+REGRESSION_THRESHOLD = 0.10
+
+##################################################
+
+def make_table(table_class, results_path, num_stages, recirculations=0, eviction_stage="start", storage_backend="tuple"):
+
+    tab_params = {
+                    "round_num": 0, "max_round_num": 0, "total_packets": 0, "results_path": results_path,
+                    "num_stages": num_stages, "max_size": TABLE_SIZE, "recirculations": recirculations, "prefer_new": True,
+                    "eviction_stage": eviction_stage, "entry_timeout": None, "sampling_threshold": None, "sampling_rate": 1.0,
+                    "syn_action": "ignore", "syn_timeout_entry_timeout": None, "log_interval": 1000, "storage_backend": storage_backend,
+                }
+    with redirect_stdout(io.StringIO()):
+        table = table_class(tab_params, test=False)
+
+    ## As in a simulation, snapshots are driven by a clock (which never fires here) instead of being checked on every operation
+    table.accountant.setSnapshotClock(SnapshotClock())
+
+    return table
+
+##################################################
+
+def random_flow_key(rng):
+    return (rng.getrandbits(32), rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16))
+
+##################################################
+
+def flow_record(rng, flow_key, tstamp):
+    ## Open confidence interval, so that the record is never evicted as collapsed
+    lo = rng.getrandbits(31)
+    return (flow_key, (lo, lo + 1 + rng.getrandbits(16)), tstamp, tstamp, TCP_ACK, TCP_ACK)
+
+##################################################
+
+def prefill(table, records, occupancy):
+    ## Places records into an empty slot of one of their stages, without the insertion algorithm, until the occupancy is reached
+
+    placed = []
+    target = int(occupancy * table._maxSize)
+    for record in records:
+        if table._numRecords >= target:
+            break
+        for stage in range(table._numStages):
+            index = table._computeNthStageIndex(record[0], stage) % table._stageSize
+            if table._retrieveRecordByIndex(index, stage) is None:
+                table._insertRecord(stage, index, record)
+                placed.append(record)
+                break
+
+    return placed
+
+##################################################
+
+def run_timed(operations):
+    ## operations: iterable of (timed_call, untimed_call); untimed calls keep the table at its occupancy
+    ## Returns the timed seconds and the net number of allocated memory blocks
+
+    perf_counter_ns = time.perf_counter_ns
+    timed_ns = 0
+
+    gc.collect()
+    gc.disable()
+    blocks_start = sys.getallocatedblocks()
+    for timed_call, untimed_call in operations:
+        t_start = perf_counter_ns()
+        timed_call()
+        timed_ns += perf_counter_ns() - t_start
+        if untimed_call is not None:
+            untimed_call()
+    blocks = sys.getallocatedblocks() - blocks_start
+    gc.enable()
+
+    return timed_ns / 1e9, blocks
+
+##################################################
+
+def bench_cuckoo(results_path, operation, occupancy, num_stages, storage_backend):
+    ## CuckooHashTable lookup/update/delete on a flow table; half of the lookups miss
+
+    rng   = Random(BENCHMARK_SEED)
+    table = make_table(FlowTable, results_path, num_stages, storage_backend=storage_backend)
+    live  = prefill(table, (flow_record(rng, random_flow_key(rng), 0) for _ in itertools.count()), occupancy)
+    table.accountant.setFirstEntryTime(0)
+
+    operations = []
+    for i in range(OPERATIONS):
+        record = live[rng.randrange(len(live))]
+        tstamp = 10 * (i + 1)
+        if operation == "lookup":
+            key = record[0] if i % 2 == 0 else random_flow_key(rng)
+            operations.append((lambda key=key: table.lookup(key), None))
+        elif operation == "update":
+            new_record = flow_record(rng, record[0], tstamp)
+            operations.append((lambda record=new_record, tstamp=tstamp: table.update(record[0], record, tstamp), None))
+        elif operation == "delete":
+            ## Put the deleted record back, so that every delete hits
+            operations.append((lambda record=record, tstamp=tstamp: table.delete(record[0], tstamp),
+                               lambda record=record: prefill(table, [record], 1.0)))
+
+    return run_timed(operations)
+
+##################################################
+
+def bench_flow_table_insert(results_path, occupancy, num_stages, recirculations):
+    ## FlowTable._insert of new flows; the oldest flows are deleted to hold the occupancy
+
+    rng   = Random(BENCHMARK_SEED)
+    table = make_table(FlowTable, results_path, num_stages, recirculations)
+    live  = prefill(table, (flow_record(rng, random_flow_key(rng), 0) for _ in itertools.count()), occupancy)
+    table.accountant.setFirstEntryTime(0)
+
+    operations = []
+    for i in range(OPERATIONS):
+        tstamp = 10 * (i + 1)
+        record = flow_record(rng, random_flow_key(rng), tstamp)
+        live.append(record)
+        oldest = live[i][0]
+        operations.append((lambda record=record, tstamp=tstamp: table.insert(record, tstamp),
+                           lambda oldest=oldest, tstamp=tstamp: table.delete(oldest, tstamp)))
+
+    return run_timed(operations)
+
+##################################################
+
+def bench_packet_table_insert(results_path, occupancy, num_stages, recirculations, eviction_stage):
+    ## PacketTable._insert of new packet records; the flow table holds the flows of all records, and about
+    ## half of the records are stale (their expected ACK is already acknowledged), so eviction checks both pass and fail
+
+    rng          = Random(BENCHMARK_SEED)
+    flow_table   = make_table(FlowTable, results_path, 4, 8)
+    packet_table = make_table(PacketTable, results_path, num_stages, recirculations, eviction_stage)
+
+    flows = prefill(flow_table, (flow_record(rng, random_flow_key(rng), 0) for _ in itertools.count()), 0.9)
+
+    def packet_record(tstamp):
+        flow_key, (highest_acked, highest_expected), _, _, _, _ = flows[rng.randrange(len(flows))]
+        exp_ack = rng.randint(2 * highest_acked - highest_expected, highest_expected)
+        return (flow_key + (exp_ack, ), tstamp, exp_ack - 1)
+
+    live = prefill(packet_table, (packet_record(0) for _ in itertools.count()), occupancy)
+    packet_table.accountant.setFirstEntryTime(0)
+
+    operations = []
+    for i in range(OPERATIONS):
+        tstamp = 10 * (i + 1)
+        record = packet_record(tstamp)
+        live.append(record)
+        oldest = live[i][0]
+        operations.append((lambda record=record, tstamp=tstamp: packet_table.insert(record, tstamp, flow_table),
+                           lambda oldest=oldest, tstamp=tstamp: packet_table.delete(oldest, tstamp)))
+
+    return run_timed(operations)
+
+##################################################
+
+def bench_approx_flow_table_insert_or_update(results_path, occupancy, num_stages):
+    ## ApproxFlowTable._insert_or_update; half of the operations update a present flow, half insert a new one
+
+    rng   = Random(BENCHMARK_SEED)
+    table = make_table(ApproxFlowTable, results_path, num_stages)
+    live  = prefill(table, (flow_record(rng, random_flow_key(rng), 0) for _ in itertools.count()), occupancy)
+    table.accountant.setFirstEntryTime(0)
+
+    operations = []
+    evicted    = 0
+    for i in range(OPERATIONS):
+        tstamp = 10 * (i + 1)
+        if i % 2 == 0:
+            record = flow_record(rng, live[rng.randrange(evicted, len(live))][0], tstamp)
+            operations.append((lambda record=record, tstamp=tstamp: table.insert_or_update(record, tstamp), None))
+        else:
+            record = flow_record(rng, random_flow_key(rng), tstamp)
+            live.append(record)
+            oldest   = live[evicted][0]
+            evicted += 1
+            operations.append((lambda record=record, tstamp=tstamp: table.insert_or_update(record, tstamp),
+                               lambda oldest=oldest, tstamp=tstamp: table.delete(oldest, tstamp)))
+
+    return run_timed(operations)
+
+##################################################
+
+def benchmark_cases():
+    ## (benchmark name, params, function(results_path) -> (timed seconds, net allocated blocks))
+
+    cases = []
+    for operation, occupancy, num_stages, storage_backend in itertools.product(["lookup", "update", "delete"], OCCUPANCIES,
+                                                                                STAGE_COUNTS, STORAGE_BACKENDS):
+        cases.append(("cuckoo_{}".format(operation),
+                      {"occupancy": occupancy, "num_stages": num_stages, "storage_backend": storage_backend},
+                      lambda path, args=(operation, occupancy, num_stages, storage_backend): bench_cuckoo(path, *args)))
+    for occupancy, num_stages, recirculations in itertools.product(OCCUPANCIES, STAGE_COUNTS, RECIRCULATIONS):
+        cases.append(("flow_table_insert",
+                      {"occupancy": occupancy, "num_stages": num_stages, "recirculations": recirculations},
+                      lambda path, args=(occupancy, num_stages, recirculations): bench_flow_table_insert(path, *args)))
+    for occupancy, num_stages, recirculations, eviction_stage in itertools.product(OCCUPANCIES, STAGE_COUNTS, RECIRCULATIONS, EVICTION_STAGES):
+        cases.append(("packet_table_insert",
+                      {"occupancy": occupancy, "num_stages": num_stages, "recirculations": recirculations, "eviction_stage": eviction_stage},
+                      lambda path, args=(occupancy, num_stages, recirculations, eviction_stage): bench_packet_table_insert(path, *args)))
+    for occupancy, num_stages in itertools.product(OCCUPANCIES, STAGE_COUNTS):
+        cases.append(("approx_flow_table_insert_or_update",
+                      {"occupancy": occupancy, "num_stages": num_stages},
+                      lambda path, args=(occupancy, num_stages): bench_approx_flow_table_insert_or_update(path, *args)))
+
+    return cases
+
+##################################################
+
+def case_id(name, params):
+    return name + "".join(" {}={}".format(k, params[k]) for k in sorted(params))
+
+##################################################
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+##################################################
+
+def main():
+
+    results_file  = sys.argv[1] if len(sys.argv) > 1 else "benchmark_tables.json"
+    baseline_file = sys.argv[2] if len(sys.argv) > 2 else None
+
+    baseline = {}
+    if baseline_file is not None:
+        with open(baseline_file) as fp:
+            baseline = {case_id(result["benchmark"], result["params"]): result for result in json.load(fp)["results"]}
+
+    print("{} ops per benchmark, median of {} runs, table size {}".format(OPERATIONS, REPETITIONS, TABLE_SIZE))
+
+    results     = []
+    regressions = 0
+    with tempfile.TemporaryDirectory() as results_path:
+        for name, params, bench in benchmark_cases():
+
+            runs = []
+            for _ in range(REPETITIONS):
+                _stage_hash_cache.clear()
+                runs.append(bench(results_path))
+            runs.sort()
+            timed_secs, blocks = runs[len(runs) // 2]
+
+            result = {
+                        "benchmark": name,
+                        "params": params,
+                        "ops_per_sec": round(OPERATIONS / timed_secs, 1),
+                        "us_per_op": round(timed_secs / OPERATIONS * 1e6, 3),
+                        "net_blocks_per_op": round(blocks / OPERATIONS, 3),
+                    }
+            results.append(result)
+
+            line = "  {:<110} {:>12.1f} ops/s {:>8.3f} blocks/op".format(case_id(name, params), result["ops_per_sec"], result["net_blocks_per_op"])
+            reference = baseline.get(case_id(name, params))
+            if reference is not None:
+                change = result["ops_per_sec"] / reference["ops_per_sec"] - 1
+                line += " {:>+7.1%}".format(change)
+                if change < -REGRESSION_THRESHOLD:
+                    line += " REGRESSION"
+                    regressions += 1
+            print(line, flush=True)
+
+    with open(results_file, "w") as fp:
+        json.dump({
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "seed": BENCHMARK_SEED,
+                    "table_size": TABLE_SIZE,
+                    "operations": OPERATIONS,
+                    "repetitions": REPETITIONS,
+                    "results": results,
+                }, fp, indent=2)
+    print("Results written to {}".format(results_file))
+
+    if baseline_file is not None:
+        print("{} regressions of more than {:.0%} against {}".format(regressions, REGRESSION_THRESHOLD, baseline_file))
+        if regressions > 0:
+            sys.exit(1)
+
+##################################################
+
+if __name__ == "__main__":
+    main()
+
+##################################################
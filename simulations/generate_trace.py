@@ -0,0 +1,383 @@
+from ipaddress import IPv4Address, ip_network
+from ColumnarTrace import ColumnarTraceWriter, TCP_FIN, TCP_SYN, TCP_PSH, TCP_ACK, epoch_us_to_datetime, flags_mask_to_str
+from SubnetMatcher import SubnetMatcher, home_matcher
+from preprocess_trace import label_trace_directions
+from defined_subnets import PU_SNETS
+from random import Random
+import itertools
+import heapq
+import pickle
+import json
+import math
+import sys
+import os
+
+########################################
+
+GENERATOR_PARAMS_FILE = "generator_params.json"
+
+## Distributions are {"dist": <name>, ...}: "constant" (value), "uniform" (min, max), "exponential" (mean),
+## "lognormal" (median, sigma), "pareto" (alpha, min, optional max)
+DEFAULT_PARAMS = {
+                    "seed": 42,
+                    "num_flows": 10000,
+                    "max_packets": None,                # Truncate the trace after this many packets
+                    "start_time_s": 1577836800,         # Epoch seconds of the first flow arrival
+                    "arrival": {"process": "poisson", "rate_per_s": 500},   # Or "constant" (rate_per_s), "onoff" (rate_per_s, on_s, off_s)
+                    "flow_packets": {"dist": "pareto", "alpha": 1.2, "min": 2, "max": 100000},  # Data segments per flow
+                    "window_packets": {"dist": "uniform", "min": 4, "max": 64},               # Segments in flight
+                    "external_rtt_ms": {"dist": "lognormal", "median": 30, "sigma": 0.8},     # Monitor <-> remote host
+                    "internal_rtt_ms": {"dist": "lognormal", "median": 2, "sigma": 0.5},      # Monitor <-> campus host
+                    "jitter_ms": 0.5,                   # Mean of the exponential per-ACK queueing delay
+                    "segment_gap_us": 12,               # Spacing of back-to-back segments
+                    "delayed_ack_ms": 40,
+                    "ack_every": 2,                     # Delayed ACKs: one ACK per this many in-order segments
+                    "mss": 1448,
+                    "upload_fraction": 0.3,             # Flows where the campus host sends the data
+                    "handshake_fraction": 0.9,          # Flows that start with SYN / SYN-ACK / ACK (others start mid-stream)
+                    "close_fraction": 0.8,              # Flows that end with FIN / FIN-ACK / ACK
+                    "loss_rate": 0.01,                  # Per data segment (originals and retransmissions)
+                    "upstream_loss_fraction": 0.5,      # Losses before the monitor (never seen) vs. after it (seen, not ACKed)
+                    "reorder_rate": 0.005,              # Data segments delayed behind a few of their successors
+                    "retransmission_rate": 0.002,       # Spurious retransmissions of delivered segments
+                    "client_subnets": ["140.180.0.0/16", "10.8.0.0/15", "10.24.0.0/15"],
+                    "num_clients": 10000,
+                    "num_servers": 5000,
+                    "server_ports": [443, 80, 22, 993],
+                }
+
+########################################
+
+def make_sampler(spec, rng):
+
+    dist = spec["dist"]
+    if dist == "constant":
+        value = spec["value"]
+        return lambda: value
+    elif dist == "uniform":
+        return lambda: rng.uniform(spec["min"], spec["max"])
+    elif dist == "exponential":
+        return lambda: rng.expovariate(1.0 / spec["mean"])
+    elif dist == "lognormal":
+        mu = math.log(spec["median"])
+        return lambda: rng.lognormvariate(mu, spec["sigma"])
+    elif dist == "pareto":
+        upper = spec.get("max", float("inf"))
+        return lambda: min(upper, spec["min"] * rng.paretovariate(spec["alpha"]))
+    else:
+        raise Exception("Unknown distribution: {}".format(dist))
+
+########################################
+
+def iter_arrivals(arrival, rng, t_start_us):
+    ## Yields flow arrival times (epoch us) of the arrival process
+
+    process = arrival["process"]
+    mean_us = 1000000.0 / arrival["rate_per_s"]
+
+    if process == "poisson":
+        t = float(t_start_us)
+        while True:
+            yield int(t)
+            t += rng.expovariate(1.0 / mean_us)
+    elif process == "constant":
+        for i in itertools.count():
+            yield int(t_start_us + i * mean_us)
+    elif process == "onoff":
+        ## Poisson arrivals during exponentially distributed on-periods, none during the off-periods
+        t     = float(t_start_us)
+        t_off = t + rng.expovariate(1.0 / arrival["on_s"]) * 1000000
+        while True:
+            yield int(t)
+            t += rng.expovariate(1.0 / mean_us)
+            while t >= t_off:
+                t_on  = t_off + rng.expovariate(1.0 / arrival["off_s"]) * 1000000
+                t     = t_on + (t - t_off)
+                t_off = t_on + rng.expovariate(1.0 / arrival["on_s"]) * 1000000
+    else:
+        raise Exception("Unknown arrival process: {}".format(process))
+
+########################################
+
+def random_addresses(rng, subnets, count, accept):
+    ## count distinct packed IPv4 addresses drawn uniformly from subnets, for which accept(address) holds
+
+    addresses = set()
+    while len(addresses) < count:
+        subnet  = subnets[rng.randrange(len(subnets))]
+        address = int(subnet.network_address) + rng.randrange(subnet.num_addresses)
+        if accept(address):
+            addresses.add(address)
+
+    return sorted(addresses)
+
+########################################
+
+def flow_packets(flow, params, rng):
+    ## Yields the packets of one TCP connection as seen by the monitor at the campus border, in timestamp order:
+    ## (ts_us, ipsrc, ipdst, tcpsrc, tcpdst, tcpflags, seqno, ackno, pktsize)
+    ## A packet of one side passes the monitor, reaches the other side, and the reply passes the monitor again after
+    ## that side's leg of the RTT; the sender keeps window_packets segments in flight, the receiver sends cumulative
+    ## (delayed) ACKs, duplicate ACKs for out-of-order segments, and lost segments are retransmitted after one RTT.
+
+    t0, client, cport, server, sport, upload, num_segments, window, external_rtt, internal_rtt, handshake, close = flow
+
+    gap          = params["segment_gap_us"]
+    mss          = params["mss"]
+    jitter_mean  = params["jitter_ms"] * 1000
+    delayed_ack  = int(params["delayed_ack_ms"] * 1000)
+    ack_every    = params["ack_every"]
+    loss_rate    = params["loss_rate"]
+    upstream     = params["upstream_loss_fraction"]
+    reorder_rate = params["reorder_rate"]
+    retrans_rate = params["retransmission_rate"]
+
+    if upload:
+        snd, snd_port, snd_leg, rcv, rcv_port, rcv_leg = client, cport, internal_rtt, server, sport, external_rtt
+    else:
+        snd, snd_port, snd_leg, rcv, rcv_port, rcv_leg = server, sport, external_rtt, client, cport, internal_rtt
+    rtt = snd_leg + rcv_leg
+
+    snd_isn = rng.getrandbits(32)
+    rcv_isn = rng.getrandbits(32)
+    last_size = rng.randint(1, mss)
+
+    events = []
+    order  = itertools.count()
+
+    def push(t, kind, arg=None):
+        heapq.heappush(events, (t, next(order), kind, arg))
+
+    ## Handshake: the client always opens
+    if handshake:
+        c_isn, s_isn = (snd_isn, rcv_isn) if upload else (rcv_isn, snd_isn)
+        t_synack = t0 + external_rtt
+        t_ack    = t_synack + internal_rtt
+        yield (t0, client, server, cport, sport, TCP_SYN, c_isn, 0, 0)
+        yield (t_synack, server, client, sport, cport, TCP_SYN | TCP_ACK, s_isn, (c_isn + 1) % 2**32, 0)
+        yield (t_ack, client, server, cport, sport, TCP_ACK, (c_isn + 1) % 2**32, (s_isn + 1) % 2**32, 0)
+        ## The client sends right after its ACK; the server once the ACK reached it
+        t_data  = t_ack + (gap if upload else external_rtt)
+        snd_seq = snd_isn + 1
+        rcv_seq = (rcv_isn + 1) % 2**32
+    else:
+        t_data  = t0
+        snd_seq = snd_isn
+        rcv_seq = rcv_isn
+
+    def seg_end(count):
+        ## Sequence number after the first count segments
+        if count == num_segments:
+            return (snd_seq + (count - 1) * mss + last_size) % 2**32
+        return (snd_seq + count * mss) % 2**32
+
+    def send(t, segment, retransmission=False):
+        if not retransmission and reorder_rate > 0 and rng.random() < reorder_rate:
+            t += int(rng.uniform(2, 8) * gap)
+        push(t, "data", (segment, retransmission))
+
+    ## Sender state: next new segment, highest cumulative ACK received
+    next_segment = min(window, num_segments)
+    acked        = 0
+    for segment in range(next_segment):
+        send(t_data + segment * gap, segment)
+
+    ## Receiver state: next expected segment, out-of-order segments, in-order segments not ACKed yet
+    expected   = 0
+    out_of_ord = set()
+    unacked    = 0
+    finished   = False
+
+    while events:
+        t, _, kind, arg = heapq.heappop(events)
+
+        if kind == "data":
+            segment, retransmission = arg
+            size  = last_size if segment == num_segments - 1 else mss
+            flags = TCP_ACK | TCP_PSH if segment == num_segments - 1 else TCP_ACK
+            lost  = loss_rate > 0 and rng.random() < loss_rate
+            if not lost or rng.random() >= upstream:
+                yield (t, snd, rcv, snd_port, rcv_port, flags, (snd_seq + segment * mss) % 2**32, rcv_seq, size)
+            if lost:
+                send(t + rtt + 3 * gap, segment, True)
+                continue
+            if not retransmission and retrans_rate > 0 and rng.random() < retrans_rate:
+                send(t + rtt, segment, True)
+            push(t + rcv_leg + int(rng.expovariate(1.0 / jitter_mean) if jitter_mean > 0 else 0), "arrive", segment)
+            continue
+
+        if kind == "arrive":
+            segment = arg
+            if segment == expected:
+                filled = len(out_of_ord) > 0
+                expected += 1
+                while expected in out_of_ord:
+                    out_of_ord.remove(expected)
+                    expected += 1
+                unacked += 1
+                if not filled and unacked < ack_every and expected < num_segments:
+                    push(t + delayed_ack, "delayed_ack", expected)
+                    continue
+            elif segment > expected:
+                out_of_ord.add(segment)
+            ## Duplicates and out-of-order segments are ACKed immediately
+        elif kind == "delayed_ack":
+            if unacked == 0 or arg != expected:
+                continue
+        elif kind == "fin":
+            yield (t, snd, rcv, snd_port, rcv_port, TCP_FIN | TCP_ACK, seg_end(num_segments), rcv_seq, 0)
+            push(t + rcv_leg, "fin_ack")
+            continue
+        elif kind == "fin_ack":
+            ## Receiver answers the FIN with its own, the sender ACKs it
+            yield (t, rcv, snd, rcv_port, snd_port, TCP_FIN | TCP_ACK, rcv_seq, (seg_end(num_segments) + 1) % 2**32, 0)
+            push(t + snd_leg, "last_ack")
+            continue
+        elif kind == "last_ack":
+            yield (t, snd, rcv, snd_port, rcv_port, TCP_ACK, (seg_end(num_segments) + 1) % 2**32, (rcv_seq + 1) % 2**32, 0)
+            continue
+
+        ## Cumulative ACK
+        unacked = 0
+        yield (t, rcv, snd, rcv_port, snd_port, TCP_ACK, rcv_seq, seg_end(expected), 0)
+
+        ## The sender sees the ACK one leg later and fills its window
+        t_sender = t + snd_leg
+        if expected > acked:
+            acked = expected
+            burst = 0
+            while next_segment < min(num_segments, acked + window):
+                send(t_sender + burst * gap, next_segment)
+                next_segment += 1
+                burst += 1
+        if acked == num_segments and not finished:
+            finished = True
+            if close:
+                push(t_sender, "fin")
+
+    return
+
+########################################
+
+def iter_synthetic_packets(params):
+    ## Merges the packets of all flows into one timestamp-ordered stream; flows are started lazily at their arrival
+    ## time, so only the concurrently active flows are held in memory
+
+    rng = Random(params["seed"])
+
+    flow_packets_sampler = make_sampler(params["flow_packets"], rng)
+    window_sampler       = make_sampler(params["window_packets"], rng)
+    external_rtt_sampler = make_sampler(params["external_rtt_ms"], rng)
+    internal_rtt_sampler = make_sampler(params["internal_rtt_ms"], rng)
+
+    ## Clients are campus hosts of the given subnets, servers are public hosts outside the campus
+    campus   = home_matcher("any")
+    all_pu   = SubnetMatcher([(snet, 1) for snet in PU_SNETS])
+    clients  = random_addresses(rng, [ip_network(snet) for snet in params["client_subnets"]], params["num_clients"],
+                                    lambda address: campus.match_one(address) == 1)
+    servers  = random_addresses(rng, [ip_network("0.0.0.0/0")], params["num_servers"],
+                                    lambda address: all_pu.match_one(address) == 0 and IPv4Address(address).is_global
+                                                        and not IPv4Address(address).is_multicast)
+
+    arrivals     = iter_arrivals(params["arrival"], rng, params["start_time_s"] * 1000000)
+    active       = []  # Heap of (next packet timestamp, flow number, packet, flow generator, flow key)
+    active_keys  = set()
+    flows_count  = 0
+    next_arrival = next(arrivals)
+
+    while flows_count < params["num_flows"] or active:
+
+        ## Start every flow that arrives before the next packet of the active flows
+        while flows_count < params["num_flows"] and (not active or next_arrival <= active[0][0]):
+            client = clients[rng.randrange(len(clients))]
+            server = servers[rng.randrange(len(servers))]
+            sport  = params["server_ports"][rng.randrange(len(params["server_ports"]))]
+            cport  = rng.randint(32768, 60999)
+            while (client, cport, server, sport) in active_keys:
+                cport = rng.randint(32768, 60999)
+            flow_key = (client, cport, server, sport)
+
+            flow = (next_arrival, client, cport, server, sport,
+                    rng.random() < params["upload_fraction"],
+                    max(1, int(flow_packets_sampler())),
+                    max(1, int(window_sampler())),
+                    max(1, int(external_rtt_sampler() * 1000)),
+                    max(1, int(internal_rtt_sampler() * 1000)),
+                    rng.random() < params["handshake_fraction"],
+                    rng.random() < params["close_fraction"])
+            packets = flow_packets(flow, params, rng)
+            heapq.heappush(active, (next_arrival, flows_count, next(packets), packets, flow_key))
+            active_keys.add(flow_key)
+            flows_count += 1
+            next_arrival = next(arrivals)
+
+        _, flow_number, packet, packets, flow_key = active[0]
+        yield packet
+
+        next_packet = next(packets, None)
+        if next_packet is None:
+            heapq.heappop(active)
+            active_keys.discard(flow_key)
+        else:
+            heapq.heapreplace(active, (next_packet[0], flow_number, next_packet, packets, flow_key))
+
+    return
+
+########################################
+
+def generate_trace(dst_trace_path, params=None, out_format="columnar"):
+    ## Writes a synthetic trace in the preprocess_trace formats; params override DEFAULT_PARAMS
+
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    max_packets = params["max_packets"]
+
+    packets = iter_synthetic_packets(params)
+    if max_packets is not None:
+        packets = itertools.islice(packets, max_packets)
+
+    if out_format == "columnar":
+        writer = ColumnarTraceWriter(dst_trace_path)
+        for packet in packets:
+            writer.append(*packet)
+        count = writer.close()
+        label_trace_directions(dst_trace_path)
+        with open(os.path.join(dst_trace_path, GENERATOR_PARAMS_FILE), "w") as fp:
+            json.dump(params, fp, indent=2)
+    elif out_format == "pickle":
+        ## The pickle layout keeps datetimes and IPv4Address objects, like preprocess_trace
+        data = [(count, epoch_us_to_datetime(ts_us), IPv4Address(ipsrc), IPv4Address(ipdst), tcpsrc, tcpdst,
+                    flags_mask_to_str(tcpflags), seqno, ackno, pktsize)
+                for count, (ts_us, ipsrc, ipdst, tcpsrc, tcpdst, tcpflags, seqno, ackno, pktsize) in enumerate(packets)]
+        count = len(data)
+        with open(dst_trace_path, "wb") as fp:
+            pickle.dump(data, fp)
+    else:
+        raise Exception("Unknown output format: {}".format(out_format))
+
+    return count
+
+########################################
+
+def main():
+
+    if len(sys.argv) < 2:
+        raise Exception("At least 1 argument expected")
+
+    dst_trace_path = sys.argv[1]
+    params         = {}
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as fp:
+            params = json.load(fp)
+    out_format     = sys.argv[3] if len(sys.argv) > 3 else "columnar"
+
+    count = generate_trace(dst_trace_path, params, out_format)
+    print("Wrote {} packets to {}".format(count, dst_trace_path))
+
+    return
+
+########################################
+
+if __name__ == "__main__":
+    main()
+
+########################################
@@ -0,0 +1,13 @@
+########################################
+
+def load_pyplot():
+    ## matplotlib and seaborn take a large share of a simulation process's startup time but are only needed
+    ## when plotting, so plotting code imports them on first use through this function
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    return plt, sns
+
+########################################
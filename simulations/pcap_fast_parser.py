@@ -0,0 +1,204 @@
+from multiprocessing import Pool
+from array import array
+import numpy as np
+import struct
+import mmap
+import os
+
+########################################
+
+## Classic pcap magic numbers (microsecond and nanosecond resolution, both byte orders)
+PCAP_MAGIC = {
+                b"\xd4\xc3\xb2\xa1": ("<", 1),
+                b"\xa1\xb2\xc3\xd4": (">", 1),
+                b"\x4d\x3c\xb2\xa1": ("<", 1000),
+                b"\xa1\xb2\x3c\x4d": (">", 1000),
+            }
+
+## Link types
+LINKTYPE_NULL     = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW      = (12, 14, 101)
+LINKTYPE_IPV4     = 228
+LINKTYPE_SLL      = 113
+LINKTYPE_SLL2     = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8, 0x9100)
+
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+## Output columns, in the order used by ColumnarTrace: (name, array typecode, native numpy dtype)
+FAST_COLUMNS = [("ts_us", "q", "=i8"), ("ipsrc", "I", "=u4"), ("ipdst", "I", "=u4"), ("tcpsrc", "H", "=u2"), ("tcpdst", "H", "=u2"),
+                ("tcpflags", "B", "u1"), ("seqno", "I", "=u4"), ("ackno", "I", "=u4"), ("pktsize", "I", "=u4")]
+
+########################################
+
+def read_pcap_header(src_trace_path):
+
+    with open(src_trace_path, "rb") as fp:
+        header = fp.read(PCAP_GLOBAL_HEADER_LEN)
+
+    if len(header) < PCAP_GLOBAL_HEADER_LEN or header[:4] not in PCAP_MAGIC:
+        raise Exception("Not a classic pcap file (pcapng is not supported): {}".format(src_trace_path))
+
+    endian, ts_divisor = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0fffffff
+
+    if linktype not in (LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_IPV4, LINKTYPE_SLL, LINKTYPE_SLL2) + LINKTYPE_RAW:
+        raise Exception("Unsupported link type {} in {}".format(linktype, src_trace_path))
+
+    return endian, ts_divisor, linktype
+
+########################################
+
+def compute_shards(src_trace_path, num_shards):
+    ## Walk the record headers only and cut the file into byte ranges at record boundaries
+
+    endian, _, _ = read_pcap_header(src_trace_path)
+    incl_len_fmt = struct.Struct(endian + "I")
+
+    file_size = os.path.getsize(src_trace_path)
+    if file_size <= PCAP_GLOBAL_HEADER_LEN:
+        return []
+
+    target = max(1, (file_size - PCAP_GLOBAL_HEADER_LEN) // max(1, num_shards))
+
+    shards = []
+    with open(src_trace_path, "rb") as fp:
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offset      = PCAP_GLOBAL_HEADER_LEN
+            shard_start = offset
+            while offset + PCAP_RECORD_HEADER_LEN <= file_size:
+                incl_len = incl_len_fmt.unpack_from(buf, offset + 8)[0]
+                offset += PCAP_RECORD_HEADER_LEN + incl_len
+                if offset - shard_start >= target:
+                    shards.append((shard_start, min(offset, file_size)))
+                    shard_start = offset
+            if shard_start < min(offset, file_size):
+                shards.append((shard_start, min(offset, file_size)))
+        finally:
+            buf.close()
+
+    return shards
+
+########################################
+
+def parse_shard(args):
+    ## Decode the TCP/IPv4 packets of one byte range; returns raw column bytes
+
+    src_trace_path, start, end = args
+    endian, ts_divisor, linktype = read_pcap_header(src_trace_path)
+
+    record_header = struct.Struct(endian + "IIII")
+    ipv4_header   = struct.Struct("!BBHHHBBHII")
+    tcp_header    = struct.Struct("!HHIIBB")
+    ushort_be     = struct.Struct("!H")
+    uint_host     = struct.Struct(endian + "I")
+
+    columns = {name: array(typecode) for name, typecode, _ in FAST_COLUMNS}
+    ts_us_col, ipsrc_col, ipdst_col = columns["ts_us"], columns["ipsrc"], columns["ipdst"]
+    tcpsrc_col, tcpdst_col, tcpflags_col = columns["tcpsrc"], columns["tcpdst"], columns["tcpflags"]
+    seqno_col, ackno_col, pktsize_col = columns["seqno"], columns["ackno"], columns["pktsize"]
+
+    with open(src_trace_path, "rb") as fp:
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offset = start
+            while offset + PCAP_RECORD_HEADER_LEN <= end:
+
+                ts_sec, ts_frac, incl_len, _ = record_header.unpack_from(buf, offset)
+                pkt_start = offset + PCAP_RECORD_HEADER_LEN
+                pkt_end   = min(pkt_start + incl_len, len(buf))
+                offset    = pkt_start + incl_len
+
+                ## Locate the IPv4 header
+                if linktype == LINKTYPE_ETHERNET:
+                    if pkt_end - pkt_start < 14:
+                        continue
+                    ip_start  = pkt_start + 14
+                    ethertype = ushort_be.unpack_from(buf, pkt_start + 12)[0]
+                    while ethertype in ETHERTYPE_VLAN and ip_start + 4 <= pkt_end:
+                        ethertype = ushort_be.unpack_from(buf, ip_start + 2)[0]
+                        ip_start += 4
+                    if ethertype != ETHERTYPE_IPV4:
+                        continue
+                elif linktype == LINKTYPE_SLL:
+                    if pkt_end - pkt_start < 16 or ushort_be.unpack_from(buf, pkt_start + 14)[0] != ETHERTYPE_IPV4:
+                        continue
+                    ip_start = pkt_start + 16
+                elif linktype == LINKTYPE_SLL2:
+                    if pkt_end - pkt_start < 20 or ushort_be.unpack_from(buf, pkt_start)[0] != ETHERTYPE_IPV4:
+                        continue
+                    ip_start = pkt_start + 20
+                elif linktype == LINKTYPE_NULL:
+                    if pkt_end - pkt_start < 4 or uint_host.unpack_from(buf, pkt_start)[0] != 2:
+                        continue
+                    ip_start = pkt_start + 4
+                else:
+                    ip_start = pkt_start
+
+                if pkt_end - ip_start < 20:
+                    continue
+                ver_ihl, _, total_len, _, frag, _, proto, _, src_ip, dst_ip = ipv4_header.unpack_from(buf, ip_start)
+                ihl = (ver_ihl & 0x0f) << 2
+                ## Only IPv4 TCP; non-first fragments carry no TCP header
+                if ver_ihl >> 4 != 4 or proto != 6 or ihl < 20 or frag & 0x1fff:
+                    continue
+
+                ## IP payload ends at the IP total length (Ethernet padding excluded) or at the snap length
+                ip_avail = pkt_end - ip_start
+                if total_len >= ihl:
+                    ip_avail = min(ip_avail, total_len)
+
+                tcp_start = ip_start + ihl
+                if ip_avail - ihl < 20:
+                    continue
+                src_port, dst_port, seq_num, ack_num, doff, flags = tcp_header.unpack_from(buf, tcp_start)
+                tcp_len = max(0, ip_avail - ihl - max(20, (doff >> 4) << 2))
+
+                ts_us_col.append(ts_sec * 1000000 + ts_frac // ts_divisor)
+                ipsrc_col.append(src_ip)
+                ipdst_col.append(dst_ip)
+                tcpsrc_col.append(src_port)
+                tcpdst_col.append(dst_port)
+                tcpflags_col.append(flags & 0x3f)
+                seqno_col.append(seq_num)
+                ackno_col.append(ack_num)
+                pktsize_col.append(tcp_len)
+        finally:
+            buf.close()
+
+    return {name: columns[name].tobytes() for name, _, _ in FAST_COLUMNS}
+
+########################################
+
+def parse_pcap_fast(src_trace_path, num_workers=None, num_shards=None):
+    ## Returns {column: numpy array} for all IPv4 TCP packets, in file order
+
+    if num_workers is None:
+        num_workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    if num_shards is None:
+        num_shards = num_workers * 4
+
+    shards = compute_shards(src_trace_path, num_shards)
+    tasks  = [(src_trace_path, start, end) for start, end in shards]
+
+    if num_workers > 1 and len(tasks) > 1:
+        with Pool(num_workers) as pool:
+            results = pool.map(parse_shard, tasks)
+    else:
+        results = [parse_shard(task) for task in tasks]
+
+    columns = {}
+    for name, _, dtype in FAST_COLUMNS:
+        parts = [np.frombuffer(result[name], dtype=dtype) for result in results]
+        columns[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    ## Shards are contiguous byte ranges in file order, so concatenating them keeps capture order (as parse_trace does, even
+    ## where timestamps go backwards)
+    return columns
+
+########################################
@@ -2,6 +2,7 @@ import enum
 import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
+from RTTSampleSink import load_round_rtt_samples
 import numpy as np
 import random
 import math
@@ -40,14 +41,10 @@ def plot_error (x_axis, sim_path, plt_path, x_label, with_abs=False, with_max=Fa
         # print("Process for x-axis value: {}; round {} of {}".format(mem, i+1, len(x_axis)))
 
         round_path = os.path.join(sim_path, "simulation_round_{}".format(i))
-        tcptrace_path = os.path.join(round_path, "rtt_samples_tcptrace_const.txt")
-        dart_path = os.path.join(round_path, "rtt_samples_p4rtt.txt")
-
-        # print("Load data")
-        with open(tcptrace_path) as fp:
-            tcptrace_rtts = [float(line.strip()) for line in fp.readlines()]
-        with open(dart_path) as fp:
-            dart_rtts     = [float(line.strip()) for line in fp.readlines()]
+
+        # print("Load data (text files, or the RTT sample sinks of rounds run with rtt_sink)")
+        tcptrace_rtts = load_round_rtt_samples(round_path, "tcptrace_const")
+        dart_rtts     = load_round_rtt_samples(round_path, "p4rtt")
         
         if with_max:
             # print("Compute max error")
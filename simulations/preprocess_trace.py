@@ -1,6 +1,8 @@
 from ipaddress import IPv4Address
-from datetime import datetime, timedelta
-from scapy.all import *
+from ColumnarTrace import ColumnarTrace, ColumnarTraceWriter, epoch_us_to_datetime, flags_str_to_mask, iter_columns_as_records
+from SubnetMatcher import home_matcher, label_directions
+from defined_subnets import DEFINED_SUBNETS
+from pcap_fast_parser import parse_pcap_fast
 import pickle
 import sys
 
@@ -24,17 +26,40 @@ def get_flags(flags):
 
 ########################################
 
-def parse_trace(src_trace_path, dst_trace_path):
+def label_trace_directions(trace_dir, categories=None):
+    ## Adds a "direction_<category>" column (DIRECTION_* labels) per DEFINED_SUBNETS category to a columnar trace,
+    ## so that simulations with a direction_filter skip irrelevant packets without classifying addresses
+
+    trace = ColumnarTrace(trace_dir)
+    for category in (sorted(DEFINED_SUBNETS) if categories is None else categories):
+        matcher = home_matcher(category)
+        trace.add_column("direction_{}".format(category), "u1",
+                            (label_directions(chunk["ipsrc"], chunk["ipdst"], matcher) for _, chunk in trace.iter_chunks()))
+
+    return
+
+########################################
+
+def parse_trace(src_trace_path, dst_trace_path, out_format="pickle"):
+
+    from scapy.all import PcapReader, IP, TCP
 
     packets = PcapReader(src_trace_path)
     data = []
     count = 0
 
+    ## Columnar output is written chunk by chunk instead of being held in memory
+    writer = None
+    if out_format == "columnar":
+        writer = ColumnarTraceWriter(dst_trace_path)
+    elif out_format != "pickle":
+        raise Exception("Unknown output format: {}".format(out_format))
+
     for i, packet in enumerate(packets):
     
         if TCP in packet:
             us_time  = int((float(packet.time) - int(packet.time)) * 1000000)
-            pkt_time = datetime.fromtimestamp(int(packet.time)) + timedelta(microseconds=us_time)
+            ts_us    = int(packet.time) * 1000000 + us_time
             src_ip   = IPv4Address(packet[IP].src)
             dst_ip   = IPv4Address(packet[IP].dst)
             src_port = int(packet[TCP].sport)
@@ -44,11 +69,41 @@ def parse_trace(src_trace_path, dst_trace_path):
             ack_num  = int(packet[TCP].ack)
             tcp_len  = len(packet[TCP].payload)
 
-            data.append((count, pkt_time, src_ip, dst_ip, src_port, dst_port, tcp_flgs, seq_num, ack_num, tcp_len))
+            if writer is not None:
+                writer.append(ts_us, int(src_ip), int(dst_ip), src_port, dst_port,
+                                flags_str_to_mask(tcp_flgs), seq_num, ack_num, tcp_len)
+            else:
+                ## The pickle layout keeps datetimes for the standalone analysis scripts
+                data.append((count, epoch_us_to_datetime(ts_us), src_ip, dst_ip, src_port, dst_port, tcp_flgs, seq_num, ack_num, tcp_len))
             count += 1
     
-    with open(dst_trace_path, "wb") as fp:
-        pickle.dump(data, fp)
+    if writer is not None:
+        writer.close()
+        label_trace_directions(dst_trace_path)
+    else:
+        with open(dst_trace_path, "wb") as fp:
+            pickle.dump(data, fp)
+
+    return
+
+########################################
+
+def parse_trace_fast(src_trace_path, dst_trace_path, out_format="pickle", num_workers=None):
+
+    ## Decode Ethernet/IPv4/TCP headers straight from the pcap bytes, in parallel shards
+    columns = parse_pcap_fast(src_trace_path, num_workers)
+
+    if out_format == "columnar":
+        writer = ColumnarTraceWriter(dst_trace_path)
+        writer.append_columns(columns)
+        writer.close()
+        label_trace_directions(dst_trace_path)
+    elif out_format == "pickle":
+        data = list(iter_columns_as_records([(0, columns)]))
+        with open(dst_trace_path, "wb") as fp:
+            pickle.dump(data, fp)
+    else:
+        raise Exception("Unknown output format: {}".format(out_format))
 
     return
 
@@ -61,8 +116,16 @@ def main():
     
     src_trace_path = sys.argv[1]
     dst_trace_path = sys.argv[2]
-
-    parse_trace(src_trace_path, dst_trace_path)
+    out_format     = sys.argv[3] if len(sys.argv) > 3 else "pickle"
+    parser         = sys.argv[4] if len(sys.argv) > 4 else "scapy"
+    num_workers    = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+    if parser == "fast":
+        parse_trace_fast(src_trace_path, dst_trace_path, out_format, num_workers)
+    elif parser == "scapy":
+        parse_trace(src_trace_path, dst_trace_path, out_format)
+    else:
+        raise Exception("Unknown parser: {}".format(parser))
 
     return
 
@@ -0,0 +1,107 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+
+########################################
+
+MANIFEST_FILE = "round_manifest.json"
+
+## Simulation params that do not affect a round's results
+VOLATILE_SIM_PARAMS = ["start_time", "sim_batch_dir", "combinations_count"]
+
+########################################
+
+def simulation_round_dir(sim_batch_dir, round_number, combinations_count):
+    ## Same naming as in Simulation
+    str_len = len(str(combinations_count))
+    return os.path.join(sim_batch_dir, "simulation_round_{}".format(str(round_number).zfill(str_len)))
+
+########################################
+
+def simulation_params_hash(simulation_params):
+
+    params = dict(simulation_params)
+    params["sim_params"] = {k: v for k, v in simulation_params["sim_params"].items() if k not in VOLATILE_SIM_PARAMS}
+    params_str = json.dumps(params, sort_keys=True)
+
+    return hashlib.sha256(params_str.encode()).hexdigest()
+
+########################################
+
+def _file_checksum(path):
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+########################################
+
+def _output_checksums(simulation_dir):
+
+    checksums = {}
+    for dirpath, _, filenames in os.walk(simulation_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, simulation_dir)
+            if relpath.startswith(MANIFEST_FILE):
+                continue
+            checksums[relpath] = _file_checksum(path)
+
+    return checksums
+
+########################################
+
+def write_round_manifest(simulation_dir, params_hash, wall_time_secs):
+    ## Written last, and atomically, so that its presence marks the round as complete
+
+    manifest = {
+                    "params_hash": params_hash,
+                    "wall_time_secs": wall_time_secs,
+                    "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "outputs": _output_checksums(simulation_dir),
+                }
+
+    manifest_path = os.path.join(simulation_dir, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+########################################
+
+def read_round_manifest(simulation_dir):
+
+    with open(os.path.join(simulation_dir, MANIFEST_FILE)) as fp:
+        return json.load(fp)
+
+########################################
+
+def check_round_manifest(simulation_dir, params_hash):
+    ## Returns None if the round is complete and intact, else the reason to rerun it
+
+    manifest_path = os.path.join(simulation_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return "no manifest"
+
+    try:
+        with open(manifest_path) as fp:
+            manifest = json.load(fp)
+    except ValueError:
+        return "unreadable manifest"
+
+    if manifest.get("params_hash") != params_hash:
+        return "parameters changed"
+
+    for relpath, checksum in manifest.get("outputs", {}).items():
+        path = os.path.join(simulation_dir, relpath)
+        if not os.path.exists(path):
+            return "missing output {}".format(relpath)
+        if _file_checksum(path) != checksum:
+            return "corrupt output {}".format(relpath)
+
+    return None
+
+########################################
@@ -15,6 +15,7 @@ def run_simulations_batch():
     tcptrace_data_paths = {
                             "p4rtt_simulations_dir": os.path.join(local_path, "dart_simulations"),
                             "part_pkts_pickle": os.path.join(local_path, "smallFlows.pickle"),
+                            # "part_pkts_columnar": os.path.join(local_path, "smallFlows.columnar"),
                             "part_pkts_count": 1,
                             "total_packets_count": 14261,
                         }
@@ -63,10 +64,25 @@ def run_simulations_batch():
                             "sampling_rate": [1.0, ],
                             "log_interval": [10000, ]
                         }
+
+    sim_options = {
+                    # "storage_backend": "array", # ["tuple", "array"]
+                    # "shared_trace": True, # Convert the pickle once to a columnar trace in /dev/shm that all rounds memory-map (removed when the rounds finish)
+                    # "no_plots": True, # Headless rounds: skip the tcptrace_const plots and never import matplotlib
+                    # "snapshot_format": "npz", # ["text", "npz"]; npz writes one snapshots.npz per table instead of ~50 text files
+                    # "distribution_mode": "histogram", # ["samples", "histogram"]; fixed-size log-bucketed eviction duration histograms
+                    # "tcptrace_idle_timeout": 600000, # ms; tcptrace_const forgets flows idle for that long (bounded memory on long captures)
+                    # "direction_filter": "any", # DEFINED_SUBNETS category; only handle packets leaving (SEQ) or entering (ACK) its subnets
+                    # "profile": True, # Write per-component latencies and packets per second of every round to profile.json
+                    # "rtt_sink": True, # Stream RTT samples to binary columns instead of keeping them in memory; text via RTTSampleSink.py
+                    # "tcptrace_baseline": True, # Simulate tcptrace_const once per trace (cached in "tcptrace_baseline_dir") instead of in every round
+                    # "tcptrace_baseline_workers": 8, # Processes the batch shards the tcptrace_const baseline across, by connection
+                }
         
     simulation_batch = SimulationBatch(tcptrace_data_paths = tcptrace_data_paths, flowtab_params = flowtab_params,
-                                        packettab_params = packettab_params, apxflowtab_params = apxflowtab_params, test = IS_TEST)
-    simulation_batch.p4rtt_simulate_batch()
+                                        packettab_params = packettab_params, apxflowtab_params = apxflowtab_params, test = IS_TEST,
+                                        sim_options = sim_options)
+    simulation_batch.p4rtt_simulate_batch(lockstep = True)
 
 ##################################################
 
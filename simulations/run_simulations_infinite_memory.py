@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from TCPTraceConst import TCPTraceConst
+from TCPTraceBaseline import TCPTraceBaseline, BASELINE_CACHE_NAME
+from TCPTraceConst import TCPTracePolicy
+from RTTSampleSink import write_rtt_samples_text
 import pickle
 import os
 
@@ -29,68 +31,19 @@ def main():
     print("Starting simulations at time: {}".format(t_start.strftime(t_format)))
 
     local_path = "/home/ubuntu/sigcomm22-paper67-artifacts/simulations/intermediate/dart_simulations_infmem"
-
-    tcptrace_const_syn   = TCPTraceConst(local_path, 2000)
-    tcptrace_const_nosyn = TCPTraceConst(local_path, 2000)
     
     process_packets_path = "/home/ubuntu/sigcomm22-paper67-artifacts/simulations/intermediate/smallFlows.pickle"
-    with open(process_packets_path, "rb") as packets_fp:
-        packets = pickle.load(packets_fp)
-    
-    packets_count = 0
-
-    for packet_data in packets:
-
-        packet = {}
-        packet["pktno"], packet["timestamp"], packet["ipsrc"], packet["ipdst"], packet["tcpsrc"], \
-            packet["tcpdst"], packet["tcpflags"], packet["seqno"], packet["ackno"], packet["pktsize"] = packet_data
-        packet["tcpflags"] = packet["tcpflags"][2:]
-
-        if packets_count == 0:
-            tcptrace_const_syn._firstEntryTime   = packet["timestamp"]
-            tcptrace_const_nosyn._firstEntryTime = packet["timestamp"]
-            
-        tcptrace_const_syn.process_tcptrace_SEQ(packet, allow_syn=True)
-        tcptrace_const_nosyn.process_tcptrace_SEQ(packet, allow_syn=False)
-
-        tcptrace_const_syn.process_tcptrace_ACK(packet, allow_syn=True)
-        tcptrace_const_nosyn.process_tcptrace_ACK(packet, allow_syn=False)
-
-        # print("tcptrace with SYN:")
-        # print(tcptrace_const_syn._tcptrace_flow_table)
-        # print(tcptrace_const_syn._tcptrace_packet_table)
-        # print(tcptrace_const_syn._tcptrace_sample_count)
-        # print(tcptrace_const_syn._tcptrace_rtt_samples)
-
-        # print("tcptrace with no SYN:")
-        # print(tcptrace_const_nosyn._tcptrace_flow_table)
-        # print(tcptrace_const_nosyn._tcptrace_packet_table)
-        # print(tcptrace_const_nosyn._tcptrace_sample_count)
-        # print(tcptrace_const_nosyn._tcptrace_rtt_samples)
-
-        # if packets_count == 10:
-        #     break
-            
-        packets_count += 1
-    
-    tcptrace_const_syn.concludeRTTDict()
-    tcptrace_const_nosyn.concludeRTTDict()
+    tcptrace_data_paths  = {"part_pkts_pickle": process_packets_path, "part_pkts_count": 1}
 
-    tcptrace_syn_rtt_all = []
-    for flow_key in tcptrace_const_syn._tcptrace_rtt_samples:
-        tcptrace_syn_rtt_all.extend([t[1] for t in tcptrace_const_syn._tcptrace_rtt_samples[flow_key]])
-    
-    tcptrace_nosyn_rtt_all = []
-    for flow_key in tcptrace_const_nosyn._tcptrace_rtt_samples:
-        tcptrace_nosyn_rtt_all.extend([t[1] for t in tcptrace_const_nosyn._tcptrace_rtt_samples[flow_key]])
+    ## All policy variants are simulated in one pass and cached, so reruns (and rounds with the same options) reuse them; the
+    ## connections of the trace are sharded across all usable CPUs
+    tcptrace_baseline = TCPTraceBaseline(os.path.join(local_path, BASELINE_CACHE_NAME))
+    options = {"log_interval": 2000, "direction_filter": None, "idle_timeout": None}
+    policies = {"syn": TCPTracePolicy(allow_syn=True), "nosyn": TCPTracePolicy(allow_syn=False)}
+    keys = tcptrace_baseline.compute(tcptrace_data_paths, options, policies=list(policies.values()), workers=len(os.sched_getaffinity(0)))
 
-    with open(os.path.join(local_path, "rtt_samples_tcptrace_const_syn.txt"), "w") as fp:
-        lines = ["{}".format(point) for point in tcptrace_syn_rtt_all]
-        fp.write("\n".join(lines))
-    
-    with open(os.path.join(local_path, "rtt_samples_tcptrace_const_nosyn.txt"), "w") as fp:
-        lines = ["{}".format(point) for point in tcptrace_nosyn_rtt_all]
-        fp.write("\n".join(lines))
+    for name, policy in policies.items():
+        write_rtt_samples_text(tcptrace_baseline.rtt_sink_dir(keys[policy]), os.path.join(local_path, "rtt_samples_tcptrace_const_{}.txt".format(name)))
 
     t_end = datetime.now()
     t_elapsed = round((t_end - t_start)/timedelta(minutes=1), 2)
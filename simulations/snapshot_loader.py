@@ -0,0 +1,107 @@
+from Accountant import SNAPSHOT_FILES, SNAPSHOT_NPZ_FILE
+from LogHistogram import LogHistogram
+import numpy as np
+import os
+
+########################################
+
+## Distribution files of the text export, in the cumulative_data directory
+DISTRIBUTION_FILES = ["distribution_valid_evictions_duration", "distribution_reinsertions_duration"]
+
+########################################
+
+def _load_series_txt(path):
+
+    with open(path) as fp:
+        lines = [line.split(",") for line in fp.read().split("\n") if line != ""]
+
+    return [float(t) for t, _ in lines], [float(point) for _, point in lines]
+
+########################################
+
+def load_table_snapshots(table_dir):
+    ## Snapshot series and distributions of one table as {name: np.ndarray}, names as in SNAPSHOT_FILES plus "time";
+    ## reads snapshots.npz if the round was exported with snapshot_format "npz", else the text files
+
+    npz_path = os.path.join(table_dir, SNAPSHOT_NPZ_FILE)
+    if os.path.exists(npz_path):
+        with np.load(npz_path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    snapshots = {}
+    for data_dir, filename, _ in SNAPSHOT_FILES:
+        time, points = _load_series_txt(os.path.join(table_dir, data_dir, filename + ".txt"))
+        snapshots["time"] = np.array(time, dtype=np.float64)
+        snapshots[filename] = np.array(points, dtype=np.float64 if "_rate_" in filename else np.int64)
+    for filename in DISTRIBUTION_FILES:
+        ## Rounds with distribution_mode "histogram" have [bucket lower bound, count] rows instead of samples
+        histogram_path = os.path.join(table_dir, "cumulative_data", filename + "_histogram.txt")
+        if os.path.exists(histogram_path):
+            with open(histogram_path) as fp:
+                rows = [[int(v) for v in line.split(",")] for line in fp.read().split("\n") if line != ""]
+            snapshots[filename + "_histogram"] = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            continue
+        with open(os.path.join(table_dir, "cumulative_data", filename + ".txt")) as fp:
+            snapshots[filename] = np.array([int(line) for line in fp.read().split("\n") if line != ""], dtype=np.int64)
+
+    return snapshots
+
+########################################
+
+def load_distribution(snapshots, name):
+    ## LogHistogram of a duration distribution (e.g., "distribution_valid_evictions_duration") of loaded table snapshots,
+    ## whether the round saved samples or a histogram; None if the table has no such distribution
+
+    if name + "_histogram" in snapshots:
+        return LogHistogram.from_array(snapshots[name + "_histogram"])
+    if name in snapshots:
+        return LogHistogram.from_samples(snapshots[name].tolist())
+
+    return None
+
+########################################
+
+def merge_distributions(snapshots_list, name):
+    ## One LogHistogram of a distribution over several tables and/or rounds, e.g.
+    ## merge_distributions([round_snapshots["packet"] for round_snapshots in load_batch_snapshots(d).values()], name)
+
+    merged = LogHistogram()
+    for snapshots in snapshots_list:
+        histogram = load_distribution(snapshots, name)
+        if histogram is not None:
+            merged.merge(histogram)
+
+    return merged
+
+########################################
+
+def load_round_snapshots(round_dir, tab_types=None):
+    ## {tab_type: snapshots} for all (or the given) tables of a simulation round
+
+    if tab_types is None:
+        tab_types = sorted([d[:-len("_table")] for d in os.listdir(round_dir)
+                                if d.endswith("_table") and os.path.isdir(os.path.join(round_dir, d))])
+
+    round_snapshots = {}
+    for tab_type in tab_types:
+        table_dir = os.path.join(round_dir, tab_type + "_table")
+        if os.path.exists(os.path.join(table_dir, SNAPSHOT_NPZ_FILE)) or os.path.exists(os.path.join(table_dir, "cumulative_data")):
+            round_snapshots[tab_type] = load_table_snapshots(table_dir)
+
+    return round_snapshots
+
+########################################
+
+def load_batch_snapshots(sim_batch_dir, tab_types=None):
+    ## {round_number: {tab_type: snapshots}} for all rounds of a simulation batch
+
+    batch_snapshots = {}
+    for round_dirname in sorted(os.listdir(sim_batch_dir)):
+        round_dir = os.path.join(sim_batch_dir, round_dirname)
+        if not round_dirname.startswith("simulation_round_") or not os.path.isdir(round_dir):
+            continue
+        batch_snapshots[int(round_dirname[len("simulation_round_"):])] = load_round_snapshots(round_dir, tab_types)
+
+    return batch_snapshots
+
+########################################